@@ -0,0 +1,211 @@
+# E:\Diet Chatbot\agents\answer_cache.py
+import os
+import re
+import math
+import time
+import sqlite3
+import operator
+import threading
+from array import array
+from collections import OrderedDict
+
+from rag.retrieval_cache import normalize_query
+
+# Follow-ups like "make it gluten-free" or "what about lunch?" only make sense next to the
+# previous answer, so they are never served from (or stored in) the cache.
+CONTEXT_WORDS = {"it", "its", "that", "this", "those", "these", "them", "same", "another", "more", "instead",
+                 "also", "too", "else", "again", "previous", "above"}
+CONTEXT_OPENERS = ("and ", "what about", "how about", "but ", "ok ", "okay ")
+
+
+def is_context_dependent(query: str) -> bool:
+    normalized = normalize_query(query)
+    if normalized.startswith(CONTEXT_OPENERS):
+        return True
+    return any(word in CONTEXT_WORDS for word in re.findall(r"[a-z']+", normalized))
+
+
+def _normalize(vector):
+    norm = math.sqrt(sum(x * x for x in vector))
+    return array("f", (x / norm for x in vector)) if norm else array("f", vector)
+
+
+class SemanticAnswerCache:
+    """
+    Caches specialist answers so near-duplicate questions skip the agent run entirely.
+
+    An answer is reused only for the same scope (routed agent, dietary preference, goal,
+    allergies and meal type) and a question whose embedding has cosine similarity of at
+    least `min_similarity` with the cached one; an identical normalized question matches
+    without embedding at all. At most `max_entries` answers are kept, least recently used
+    evicted first, and entries older than `ttl_seconds` are ignored.
+
+    Entries are stored in SQLite so they survive restarts, tagged with the knowledge base
+    version they were answered from; `set_knowledge_version()` drops everything when that
+    changes (main.py wires it to KnowledgeBase.add_change_listener).
+    """
+
+    def __init__(self, embeddings, cache_path: str, max_entries: int = 1000, min_similarity: float = 0.95,
+                 ttl_seconds: float = 7 * 86400):
+        self.embeddings = embeddings
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self.min_similarity = min_similarity
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # id -> (scope, normalized query, unit vector, answer, created_at); LRU order
+        self._scopes = {} # scope -> set of ids
+        self._touched = {} # id -> last used; written back lazily with the next store()
+        self.knowledge_version = None
+        self.hits = 0
+        self.exact_hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.evictions = 0
+        self.invalidations = 0
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers (id INTEGER PRIMARY KEY AUTOINCREMENT, scope TEXT NOT NULL, "
+            "query TEXT NOT NULL, vector BLOB NOT NULL, answer TEXT NOT NULL, created_at REAL NOT NULL, "
+            "last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+        self._load()
+
+    @staticmethod
+    def make_scope(agent: str, dietary_preference: str = "", dietary_goal: str = "", allergies=(), meal_type: str = "") -> str:
+        allergy_key = ",".join(sorted({a.strip().lower() for a in allergies or () if a and a.strip()}))
+        parts = (agent, dietary_preference, dietary_goal, allergy_key, meal_type)
+        return "|".join((part or "").strip().lower() for part in parts)
+
+    def _load(self):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'knowledge_version'").fetchone()
+            self.knowledge_version = row[0] if row else None
+            rows = self._conn.execute(
+                "SELECT id, scope, query, vector, answer, created_at FROM answers ORDER BY last_used"
+            ).fetchall()
+            for entry_id, scope, query, blob, answer, created_at in rows:
+                self._entries[entry_id] = (scope, query, array("f", blob), answer, created_at)
+                self._scopes.setdefault(scope, set()).add(entry_id)
+
+    def _expired(self, entry) -> bool:
+        return entry[4] + self.ttl_seconds < time.time()
+
+    def _find(self, scope: str, query: str, vector=None):
+        """Returns (entry id, similarity) of the best match in `scope`, or (None, 0). Caller holds the lock."""
+        best_id, best_score = None, 0.0
+        for entry_id in self._scopes.get(scope, ()):
+            entry = self._entries[entry_id]
+            if self._expired(entry):
+                continue
+            if entry[1] == query:
+                return entry_id, 1.0
+            if vector is not None:
+                score = sum(map(operator.mul, vector, entry[2]))
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+        return best_id, best_score
+
+    def _hit(self, entry_id, exact: bool):
+        self._entries.move_to_end(entry_id)
+        self._touched[entry_id] = time.time()
+        self.hits += 1
+        if exact:
+            self.exact_hits += 1
+        return self._entries[entry_id][3]
+
+    def lookup(self, scope: str, query: str):
+        """
+        Returns (answer, vector). `answer` is None on a miss; pass `vector` back to store() so
+        the question is embedded only once.
+        """
+        if is_context_dependent(query):
+            with self._lock:
+                self.skipped += 1
+            return None, None
+        normalized = normalize_query(query)
+        with self._lock:
+            entry_id, _ = self._find(scope, normalized)
+            if entry_id is not None:
+                return self._hit(entry_id, exact=True), None
+            if not self._scopes.get(scope):
+                self.misses += 1
+                return None, None
+        # Embedding may hit the network (or the embedding cache on disk); not under the lock.
+        vector = _normalize(self.embeddings.embed_query(normalized))
+        with self._lock:
+            entry_id, score = self._find(scope, normalized, vector)
+            if entry_id is not None and score >= self.min_similarity:
+                return self._hit(entry_id, exact=False), vector
+            self.misses += 1
+        return None, vector
+
+    def store(self, scope: str, query: str, answer: str, vector=None):
+        if self.max_entries <= 0 or not answer or is_context_dependent(query):
+            return
+        normalized = normalize_query(query)
+        if vector is None:
+            vector = _normalize(self.embeddings.embed_query(normalized))
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO answers (scope, query, vector, answer, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (scope, normalized, vector.tobytes(), answer, now, now)
+            )
+            entry_id = cursor.lastrowid
+            self._entries[entry_id] = (scope, normalized, vector, answer, now)
+            self._scopes.setdefault(scope, set()).add(entry_id)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                old_id, old_entry = self._entries.popitem(last=False)
+                self._scopes[old_entry[0]].discard(old_id)
+                self._touched.pop(old_id, None)
+                evicted.append((old_id,))
+            self.evictions += len(evicted)
+            self._conn.executemany("DELETE FROM answers WHERE id = ?", evicted)
+            self._conn.executemany("UPDATE answers SET last_used = ? WHERE id = ?",
+                                   [(used, touched_id) for touched_id, used in self._touched.items()])
+            self._touched.clear()
+            self._conn.commit()
+
+    def set_knowledge_version(self, version: str):
+        """Drops every cached answer if the knowledge base changed since they were stored."""
+        with self._lock:
+            if version == self.knowledge_version:
+                return
+            if self._entries:
+                print(f"Knowledge base changed; dropping {len(self._entries)} cached answers.")
+                self._clear_locked()
+            self.knowledge_version = version
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('knowledge_version', ?)", (version,))
+            self._conn.commit()
+
+    def _clear_locked(self):
+        self._entries.clear()
+        self._scopes.clear()
+        self._touched.clear()
+        self._conn.execute("DELETE FROM answers")
+        self._conn.commit()
+        self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._clear_locked()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "exact_hits": self.exact_hits,
+                "misses": self.misses,
+                "skipped_follow_ups": self.skipped,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
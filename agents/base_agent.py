@@ -4,20 +4,28 @@
 
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.agents import AgentExecutor, create_tool_calling_agent
+from langchain.agents import create_tool_calling_agent
 from langchain_core.messages import BaseMessage
 from typing import List
+from .common_tools import retrieval_exclusions
+from .parallel_executor import ParallelToolAgentExecutor
 # E:\Diet Chatbot\agents\base_agent.py
 
 # ... (existing imports) ...
 from langchain.agents import create_tool_calling_agent # Ensure this is present
-from langchain.agents import AgentExecutor # Keep this if you want AgentExecutor for now, but we'll modify usage
 
 class BaseDietAgent:
+    # Always filtered out of knowledge base results for this kind of agent, on top of the user's
+    # allergies. Kept on the class so main.py can filter prefetched retrievals without building the agent.
+    EXCLUDED_INGREDIENTS: List[str] = []
+
     def __init__(self, name: str, system_message: str, tools: List,
-                 google_api_key: str, gemini_model: str, temperature: float):
+                 google_api_key: str, gemini_model: str, temperature: float, llm=None,
+                 excluded_ingredients: List[str] = None, verbose: bool = False):
         self.name = name
-        self.llm = ChatGoogleGenerativeAI(
+        self.excluded_ingredients = list(self.EXCLUDED_INGREDIENTS if excluded_ingredients is None else excluded_ingredients)
+        # `llm` lets callers (benchmarks, offline runs) supply any tool-calling chat model instead of Gemini
+        self.llm = llm or ChatGoogleGenerativeAI(
             model=gemini_model,
             google_api_key=google_api_key,
             temperature=temperature
@@ -28,7 +36,11 @@ class BaseDietAgent:
         self.agent = self._create_runnable_agent() # <--- CHANGE THIS LINE
         # We might not even need agent_executor if we invoke self.agent directly
         # For simplicity, let's keep a wrapper if you prefer the AgentExecutor interface for now
-        self.agent_executor = AgentExecutor(agent=self.agent, tools=self.tools, verbose=True) # <--- Keep this if needed elsewhere
+        # verbose=True prints every agent step; timings are in metrics.py instead
+        # Runs the independent tool calls of one step concurrently, each with a timeout.
+        # A subclass that routes without the tool loop returns no agent and gets no executor.
+        self.agent_executor = (ParallelToolAgentExecutor(agent=self.agent, tools=self.tools, verbose=verbose)
+                               if self.agent is not None else None)
 
     def _create_runnable_agent(self): # <--- CHANGE METHOD NAME
         prompt = ChatPromptTemplate.from_messages(
@@ -42,11 +54,28 @@ class BaseDietAgent:
         # This returns a Runnable
         return create_tool_calling_agent(self.llm, self.tools, prompt)
 
+    def exclusions_for(self, state) -> List[str]:
+        """The user's allergies plus this agent's own excluded ingredients."""
+        return list(state.get("allergies") or []) + self.excluded_ingredients
+
+    @classmethod
+    def default_exclusions(cls, state) -> List[str]:
+        """exclusions_for() of an agent of this class built with the default exclusions."""
+        return list(state.get("allergies") or []) + list(cls.EXCLUDED_INGREDIENTS)
+
     def run(self, state):
         # This method uses agent_executor, which is fine if it works.
         # If the problem persists, we might switch this to self.agent.invoke directly.
         input_message = state["messages"][-1].content
         chat_history = state["messages"][:-1]
-        result = self.agent_executor.invoke({"input": input_message, "chat_history": chat_history})
+        with retrieval_exclusions(self.exclusions_for(state)):
+            result = self.agent_executor.invoke({"input": input_message, "chat_history": chat_history})
         return result["output"]
 
+    async def arun(self, state):
+        # Async twin of run(): awaits the LLM and tools so one event loop can serve many conversations.
+        input_message = state["messages"][-1].content
+        chat_history = state["messages"][:-1]
+        with retrieval_exclusions(self.exclusions_for(state)):
+            result = await self.agent_executor.ainvoke({"input": input_message, "chat_history": chat_history})
+        return result["output"]
@@ -1,15 +1,39 @@
 # E:\Diet Chatbot\agents\common_tools.py
+import asyncio
+import threading
+import contextvars
+from contextlib import contextmanager
 from langchain_community.tools.tavily_search import TavilySearchResults
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool
 
 
 # We will use the helper functions from rag.retriever to get the current retriever
 from rag.retriever import get_rag_retriever
+from rag.retrieval_cache import RetrievalCache
+from rag.context_packer import pack_context, estimate_tokens
+from app_config import RETRIEVAL_CACHE_SIZE, RETRIEVAL_CACHE_TTL_SECONDS
+from app_config import CONTEXT_PACKING_ENABLED, CONTEXT_TOKEN_BUDGET, CONTEXT_MMR_LAMBDA, CONTEXT_DUPLICATE_THRESHOLD
+from metrics import get_metrics, traced
 
 # --- Global holders for initialized tools ---
 # These will be set by main.py
 _tavily_search_tool = None
 _rag_retriever_instance = None
+# Optional zero-argument factories, so main.py can defer building the knowledge base or the
+# Tavily client until a tool actually needs them.
+_tavily_tool_factory = None
+_rag_retriever_factory = None
+# Optional on-disk web search cache (agents/search_cache.py); without one every search goes upstream.
+_search_cache = None
+_search_cache_factory = None
+_init_lock = threading.Lock()
+# Repeat retrievals (same normalized query + filter) skip the embedding call and vector search.
+_retrieval_cache = RetrievalCache(max_size=RETRIEVAL_CACHE_SIZE, ttl_seconds=RETRIEVAL_CACHE_TTL_SECONDS)
+# Allergens/ingredients the current conversation must never be shown (AgentState.allergies plus
+# the agent's own exclusions). Set by the graph nodes, not by the LLM, so exclusions are enforced
+# no matter what arguments the model passes to the tool. Context-local, so concurrent sessions
+# don't see each other's exclusions.
+_retrieval_exclusions = contextvars.ContextVar("retrieval_exclusions", default=())
 
 def set_global_tavily_tool(tool_instance):
     global _tavily_search_tool
@@ -18,69 +42,213 @@ def set_global_tavily_tool(tool_instance):
 def set_global_rag_retriever(retriever_instance):
     global _rag_retriever_instance
     _rag_retriever_instance = retriever_instance
+    _retrieval_cache.clear()
+
+def set_global_tavily_tool_factory(factory):
+    global _tavily_tool_factory
+    _tavily_tool_factory = factory
+
+def set_global_rag_retriever_factory(factory):
+    global _rag_retriever_factory
+    _rag_retriever_factory = factory
+
+def set_global_search_cache(cache_instance):
+    global _search_cache
+    _search_cache = cache_instance
+
+def set_global_search_cache_factory(factory):
+    global _search_cache_factory
+    _search_cache_factory = factory
+
+def get_search_cache():
+    global _search_cache_factory
+    if _search_cache is None and _search_cache_factory is not None:
+        with _init_lock:
+            if _search_cache is None and _search_cache_factory is not None:
+                set_global_search_cache(_search_cache_factory())
+                _search_cache_factory = None
+    return _search_cache
+
+def get_retrieval_cache():
+    return _retrieval_cache
+
+@contextmanager
+def retrieval_exclusions(terms):
+    """Within this block, knowledge base retrievals drop recipes containing any of `terms`."""
+    token = _retrieval_exclusions.set(tuple(term for term in terms or () if term))
+    try:
+        yield
+    finally:
+        _retrieval_exclusions.reset(token)
+
+def get_retrieval_exclusions():
+    return _retrieval_exclusions.get()
+
+def _get_tavily_tool():
+    global _tavily_tool_factory
+    if _tavily_search_tool is None and _tavily_tool_factory is not None:
+        with _init_lock:
+            if _tavily_search_tool is None and _tavily_tool_factory is not None:
+                set_global_tavily_tool(_tavily_tool_factory())
+                _tavily_tool_factory = None
+    if _tavily_search_tool is None:
+        raise RuntimeError("Tavily search tool not initialized. Call set_global_tavily_tool from main.py first.")
+    return _tavily_search_tool
+
+def _get_rag_retriever():
+    global _rag_retriever_factory
+    if _rag_retriever_instance is None and _rag_retriever_factory is not None:
+        with _init_lock:
+            if _rag_retriever_instance is None and _rag_retriever_factory is not None:
+                set_global_rag_retriever(_rag_retriever_factory())
+                _rag_retriever_factory = None
+    if _rag_retriever_instance is None:
+        raise RuntimeError("RAG retriever not initialized. Call set_global_rag_retriever from main.py first.")
+    return _rag_retriever_instance
 
 # --- Shared Tools Definitions ---
-
-@tool
-def tavily_search(query: str) -> str:
+# Each tool has a sync body and an async twin so agents can be driven with either
+# invoke() or ainvoke() without blocking the event loop on network I/O.
+
+@traced("web_search_upstream")
+def _fetch_web_results(query: str):
+    search_tool = _get_tavily_tool()
+    return search_tool.invoke({"query": query})
+
+@traced("web_search_upstream")
+async def _afetch_web_results(query: str):
+    # Building the client is quick; the first call is the expensive part.
+    search_tool = _get_tavily_tool()
+    return await search_tool.ainvoke({"query": query})
+
+@traced("tool", tool="tavily_search")
+def _tavily_search(query: str) -> str:
     """Use this tool to perform a general web search for information.
     Useful for looking up current events, general facts, or things not in the internal knowledge base.
     """
-    if _tavily_search_tool is None:
-        raise RuntimeError("Tavily search tool not initialized. Call set_global_tavily_tool from main.py first.")
-    print(f"Performing Tavily search for: {query}")
-    return _tavily_search_tool.invoke({"query": query})
-
-# E:\Diet Chatbot\agents\common_tools.py
-
-# ... (existing imports) ...
-
-@tool
-def retrieve_from_knowledge_base(query: str, dietary_filter: str = "") -> str:
+    search_cache = get_search_cache()
+    if search_cache is None:
+        return _fetch_web_results(query)
+    # Served from disk when fresh; identical in-flight searches share one upstream call.
+    return search_cache.get_or_fetch(query, _fetch_web_results)
+
+@traced("tool", tool="tavily_search")
+async def _atavily_search(query: str) -> str:
+    search_cache = await asyncio.to_thread(get_search_cache)
+    if search_cache is None:
+        return await _afetch_web_results(query)
+    return await search_cache.aget_or_fetch(query, _afetch_web_results)
+
+tavily_search = StructuredTool.from_function(
+    func=_tavily_search, coroutine=_atavily_search, name="tavily_search"
+)
+
+
+@traced("tool", tool="retrieve_from_knowledge_base")
+def _retrieve_from_knowledge_base(query: str, dietary_filter: str = "") -> str:
     """
     Retrieves relevant information from the diet knowledge base based on the query and an optional dietary filter.
     Useful for finding recipes, nutritional facts, diet plans, etc.
     The dietary_filter should be 'vegetarian', 'non_vegetarian', or 'vegan' if applicable.
     Example: retrieve_from_knowledge_base(query="chicken breast recipes", dietary_filter="non_vegetarian")
     Example: retrieve_from_knowledge_base(query="benefits of mediterranean diet")
+    Results are numbered passages, each headed by its source (book, page, recipe); cite them as [1], [2].
     """
-    global _rag_retriever_instance
-    if _rag_retriever_instance is None:
-        raise RuntimeError("RAG retriever not initialized. Call set_global_rag_retriever from main.py first.")
+    cache_key = RetrievalCache.make_key(query, dietary_filter, get_retrieval_exclusions())
+    docs = _retrieval_cache.get(cache_key)
+    if docs is None:
+        docs = _search_knowledge_base(query, cache_key[1], cache_key[2])
+        _retrieval_cache.put(cache_key, docs)
+        _record_retrieval(docs, cache_key[1], cached=False)
+    else:
+        _record_retrieval(docs, cache_key[1], cached=True)
+    return _format_docs(docs)
+
+@traced("tool", tool="retrieve_from_knowledge_base")
+async def _aretrieve_from_knowledge_base(query: str, dietary_filter: str = "") -> str:
+    cache_key = RetrievalCache.make_key(query, dietary_filter, get_retrieval_exclusions())
+    docs = _retrieval_cache.get(cache_key)
+    if docs is None:
+        # The first call may build the knowledge base; keep that off the event loop.
+        retriever = await asyncio.to_thread(_get_rag_retriever)
+        with get_metrics().span("retrieval_search"):
+            docs = await retriever.ainvoke(query, **_build_search_kwargs(cache_key[1], cache_key[2]))
+        _retrieval_cache.put(cache_key, docs)
+        _record_retrieval(docs, cache_key[1], cached=False)
+    else:
+        _record_retrieval(docs, cache_key[1], cached=True)
+    return _format_docs(docs)
+
+retrieve_from_knowledge_base = StructuredTool.from_function(
+    func=_retrieve_from_knowledge_base, coroutine=_aretrieve_from_knowledge_base,
+    name="retrieve_from_knowledge_base"
+)
+
+
+def _format_docs(docs) -> str:
+    if not docs:
+        return "No relevant information found in the knowledge base."
+
+    if not CONTEXT_PACKING_ENABLED:
+        # Concatenate document content
+        return "\n\n".join([doc.page_content for doc in docs])
+    # The tool output is re-sent on every later step of the agent loop, so keep it tight:
+    # no splitter overlap or near-duplicates, diverse passages first, capped at a token budget.
+    content = pack_context(docs, token_budget=CONTEXT_TOKEN_BUDGET, mmr_lambda=CONTEXT_MMR_LAMBDA,
+                           duplicate_threshold=CONTEXT_DUPLICATE_THRESHOLD)
+    metrics = get_metrics()
+    metrics.observe("context_tokens", estimate_tokens(content))
+    metrics.observe("context_tokens_saved", max(0, sum(estimate_tokens(doc.page_content) for doc in docs)
+                                               - estimate_tokens(content)))
+    return content
+
+
+def format_retrieved_docs(docs) -> str:
+    """Documents in the same packed, cited form the retrieval tool returns them."""
+    return _format_docs(docs)
 
-    where_clauses = {}
-    # Always try to filter by 'doc_type' if you expect it from a specific document.
-    # Assuming your loaded documents have this metadata field.
-    # Ensure this matches the metadata you added when ingesting documents.
-    where_clauses["doc_type"] = "recipe_book_pdf" # Assuming all recipes are from this source
 
+def exclusion_key(exclusions):
+    """Normalized form of an exclusion list, as used in retrieval cache keys."""
+    return RetrievalCache.make_key("", "", exclusions)[2]
+
+
+def retrieve_for_prefetch(query: str, dietary_filter: str = "", exclusions=()):
+    """
+    Knowledge base retrieval outside the agent loop (agents/prefetch.py). Shares the tool's
+    retrieval cache, so a later tool call with the same query is a cache hit. Returns the
+    documents and the exclusion key they were filtered with.
+    """
+    cache_key = RetrievalCache.make_key(query, dietary_filter, exclusions)
+    docs = _retrieval_cache.get(cache_key)
+    if docs is None:
+        docs = _search_knowledge_base(query, cache_key[1], cache_key[2])
+        _retrieval_cache.put(cache_key, docs)
+    return docs, cache_key[2]
+
+
+def _build_search_kwargs(dietary_filter: str = "", exclusions=()):
+    # Every recipe chunk is tagged with this doc_type at ingestion time.
+    search_kwargs = {"filter": {"doc_type": "recipe_book_pdf"}}
     if dietary_filter:
-        # For an exact match on a metadata field, Chroma expects: {"field_name": "value"}
-        # For multiple conditions, you must use "$and" or "$or"
-        where_clauses["dietary_type"] = dietary_filter # This will be added to the existing dict
-
-    # Now, combine the conditions using "$and" if there's more than one.
-    # ChromaDB's where clause expects a single key, which can be an operator like "$and"
-    final_where_clause = {}
-    if len(where_clauses) > 1: # If both doc_type and dietary_type are present
-        final_where_clause["$and"] = []
-        for key, value in where_clauses.items():
-            final_where_clause["$and"].append({key: value})
-    elif len(where_clauses) == 1: # If only one condition (e.g., just doc_type or just dietary_type)
-        final_where_clause = where_clauses # Use the single condition directly
-    else: # No filters
-        final_where_clause = {} # No filters applied
-
-    print(f"Retrieving from knowledge base for: '{query}' with filter: {final_where_clause}")
-
-    # Pass the correctly formatted filter to the retriever
-    # Note: `get_relevant_documents` is deprecated, but we'll stick to it for now
-    # until the main issues are resolved.
-    docs = _rag_retriever_instance.get_relevant_documents(query, **({'filter': final_where_clause} if final_where_clause else {}))
+        # Each dietary type has its own partition, so the filter picks the index to search
+        # instead of narrowing one shared index; no dietary filter searches them all.
+        search_kwargs["dietary_type"] = dietary_filter
+    if exclusions:
+        # Whole recipes containing these allergens/ingredients are dropped before the LLM sees them.
+        search_kwargs["exclude"] = list(exclusions)
+    return search_kwargs
 
-    if not docs:
-        return "No relevant information found in the knowledge base."
 
-    # Concatenate document content
-    content = "\n\n".join([doc.page_content for doc in docs])
-    return content
\ No newline at end of file
+@traced("retrieval_search")
+def _search_knowledge_base(query: str, dietary_filter: str = "", exclusions=()):
+    return _get_rag_retriever().invoke(query, **_build_search_kwargs(dietary_filter, exclusions))
+
+
+def _record_retrieval(docs, dietary_filter: str, cached: bool):
+    metrics = get_metrics()
+    partition = dietary_filter or "all"
+    metrics.incr("retrieval_cache_total", result="hit" if cached else "miss")
+    metrics.observe("retrieval_hits", len(docs), partition=partition)
+    if not docs:
+        metrics.incr("retrieval_empty_total", partition=partition)
@@ -0,0 +1,149 @@
+# E:\Diet Chatbot\agents\history.py
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+from langchain_core.messages import BaseMessage, HumanMessage
+
+# main.py tags the orchestrator's "Routing you to the ... agent" messages with this name.
+ROUTING_MESSAGE_NAME = "routing"
+_ROUTING_PREFIXES = ("Routing you to the ", "Processing your general query:")
+SUMMARY_PREFIX = "[Summary of our earlier conversation] "
+# Tag (and metadata flag) on internal LLM calls whose tokens must never reach the user; server.py drops them.
+NO_STREAM_TAG = "nostream"
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting and needs no tokenizer.
+    return max(1, len(text) // 4)
+
+
+def _message_text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return " ".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+
+
+def is_routing_message(message: BaseMessage) -> bool:
+    if getattr(message, "name", None) == ROUTING_MESSAGE_NAME:
+        return True
+    return message.type == "ai" and _message_text(message).startswith(_ROUTING_PREFIXES)
+
+
+def make_llm_summarizer(llm, max_tokens: int = 300) -> Callable[[str, List[BaseMessage]], str]:
+    """Builds a summarizer that folds `messages` into `previous_summary` with one LLM call."""
+    def summarize(previous_summary: str, messages: List[BaseMessage]) -> str:
+        transcript = "\n".join(f"{m.type}: {_message_text(m)}" for m in messages)
+        prompt = (
+            "You maintain a running summary of a conversation between a user and a diet assistant. "
+            "Keep the user's dietary preference, goals, allergies, meal types and any recipes already "
+            f"suggested. Reply with the updated summary only, in under {max_tokens * 3} characters.\n\n"
+            f"Current summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"
+        )
+        # Runs inside a specialist node: without its own callbacks the graph's "messages" stream
+        # would pick up the summary tokens and send them to the user as part of the answer.
+        result = llm.invoke([HumanMessage(content=prompt)], config={
+            "callbacks": [], "tags": [NO_STREAM_TAG], "metadata": {NO_STREAM_TAG: True}
+        })
+        return _message_text(result).strip()
+    return summarize
+
+
+class HistoryManager:
+    """
+    Keeps the chat history passed to agents flat in size, however long the conversation runs.
+
+    Internal routing chatter is dropped. The newest turns (a human message plus the replies
+    after it) are kept verbatim, at most `max_turns` of them and within `max_tokens`. Older
+    turns are folded into a rolling summary. Summaries are cached by a hash of the turns they
+    cover, so the summarizer only runs on turns that have just fallen out of the window.
+    """
+
+    def __init__(self, summarizer: Optional[Callable[[str, List[BaseMessage]], str]] = None,
+                 max_turns: int = 6, max_tokens: int = 2000, cache_size: int = 512):
+        self.summarizer = summarizer
+        self.max_turns = max(1, max_turns)
+        self.max_tokens = max_tokens
+        self.cache_size = cache_size
+        self._summaries = OrderedDict() # hash of summarized turns -> summary text
+        self._lock = threading.Lock()
+        self.summarizer_calls = 0
+
+    @staticmethod
+    def _split_turns(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+        turns = []
+        for message in messages:
+            if message.type == "human" or not turns:
+                turns.append([])
+            turns[-1].append(message)
+        return turns
+
+    @staticmethod
+    def _turn_hash(previous_hash: str, turn: List[BaseMessage]) -> str:
+        digest = hashlib.sha256(previous_hash.encode("utf-8"))
+        for message in turn:
+            digest.update(f"\0{message.type}\0{_message_text(message)}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _cached(self, key: str):
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is not None:
+                self._summaries.move_to_end(key)
+            return summary
+
+    def _remember(self, key: str, summary: str):
+        with self._lock:
+            self._summaries[key] = summary
+            self._summaries.move_to_end(key)
+            while len(self._summaries) > self.cache_size:
+                self._summaries.popitem(last=False)
+
+    def _summarize(self, old_turns: List[List[BaseMessage]]) -> str:
+        # Running hashes: prefix_hashes[k] identifies old_turns[:k].
+        prefix_hashes = [""]
+        for turn in old_turns:
+            prefix_hashes.append(self._turn_hash(prefix_hashes[-1], turn))
+
+        # Start from the longest prefix we have already summarized.
+        start, summary = 0, ""
+        for k in range(len(old_turns), 0, -1):
+            cached = self._cached(prefix_hashes[k])
+            if cached is not None:
+                start, summary = k, cached
+                break
+        if start == len(old_turns):
+            return summary
+
+        new_messages = [m for turn in old_turns[start:] for m in turn]
+        if self.summarizer is None:
+            # No summarizer configured: keep a clipped transcript instead.
+            summary = (summary + " " + " ".join(_message_text(m)[:200] for m in new_messages)).strip()
+        else:
+            self.summarizer_calls += 1
+            summary = self.summarizer(summary, new_messages)
+        self._remember(prefix_hashes[-1], summary)
+        return summary
+
+    def window(self, messages: List[BaseMessage]) -> List[BaseMessage]:
+        """Returns the chat history to hand to an agent for `messages`."""
+        messages = [m for m in messages if not is_routing_message(m)]
+        turns = self._split_turns(messages)
+
+        kept, used = [], 0
+        for turn in reversed(turns):
+            cost = sum(estimate_tokens(_message_text(m)) for m in turn)
+            if kept and (len(kept) >= self.max_turns or used + cost > self.max_tokens):
+                break
+            kept.insert(0, turn)
+            used += cost
+
+        old_turns = turns[:len(turns) - len(kept)]
+        recent = [m for turn in kept for m in turn]
+        if not old_turns:
+            return recent
+        summary = self._summarize(old_turns)
+        # Gemini only accepts a system message at the very start, so the summary rides as a human message.
+        return [HumanMessage(content=SUMMARY_PREFIX + summary)] + recent
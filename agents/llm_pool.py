@@ -0,0 +1,337 @@
+# E:\Diet Chatbot\agents\llm_pool.py
+import re
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Optional
+
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from metrics import get_metrics
+
+
+_RATE_LIMIT_MESSAGE_RE = re.compile(r"\b429\b|resource exhausted|rate limit|quota")
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True for upstream 429 / quota errors, however the client library wrapped them."""
+    # Only explicit wrapping (`raise ... from e`) is followed: an unrelated error raised while
+    # handling an earlier 429 carries it as __context__ and must not be retried.
+    current = error
+    while current is not None:
+        if type(current).__name__ in ("ResourceExhausted", "TooManyRequests", "RateLimitError"):
+            return True
+        if getattr(current, "code", None) == 429 or getattr(current, "status_code", None) == 429:
+            return True
+        if _RATE_LIMIT_MESSAGE_RE.search(str(current).lower()):
+            return True
+        current = current.__cause__
+    return False
+
+
+def _token_usage(output):
+    """(prompt, completion) tokens from a message's usage_metadata; (0, 0) when the provider sent none."""
+    if isinstance(output, dict) and "raw" in output:
+        output = output["raw"] # with_structured_output(include_raw=True)
+    usage = getattr(output, "usage_metadata", None) or {}
+    return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+
+
+class TokenBucket:
+    """Classic token bucket: refills `rate` tokens per second up to `capacity`; each request takes one."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _try_take(self) -> float:
+        """Takes a token and returns 0, or returns how long to wait before one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            wait = self._try_take()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def aacquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            wait = self._try_take()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+
+class _ConcurrencyLimit:
+    """
+    A bounded semaphore shared by threads and event loops. Slots are handed to waiters in
+    arrival order. A coroutine waits on a future of its own loop, which release() resolves
+    through call_soon_threadsafe, so waiting neither blocks nor polls the loop.
+    """
+
+    def __init__(self, limit: int):
+        self._limit = max(1, limit)
+        self._available = self._limit
+        self._lock = threading.Lock()
+        self._waiters = deque() # threading.Event for threads, (loop, future) for coroutines
+
+    def acquire(self):
+        with self._lock:
+            if self._available and not self._waiters:
+                self._available -= 1
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+        event.wait() # release() hands its slot straight to us
+
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._available and not self._waiters:
+                self._available -= 1
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                queued = waiter in self._waiters
+                if queued:
+                    self._waiters.remove(waiter)
+            if not queued and not waiter[1].cancelled():
+                self.release() # Handed a slot just as we were cancelled; pass it on
+            raise
+
+    def _hand_over(self, future):
+        # Runs on the waiter's loop. If it was cancelled in the meantime, the slot goes to the next waiter.
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                    return
+                loop, future = waiter
+                try:
+                    loop.call_soon_threadsafe(self._hand_over, future)
+                    return
+                except RuntimeError:
+                    continue # Its loop is closed; nobody is waiting there any more
+            if self._available >= self._limit:
+                raise ValueError("Concurrency limit released too many times")
+            self._available += 1
+
+
+class PooledRunnable(Runnable):
+    """
+    Wraps a chat model (or a tool-bound / structured-output binding of one) so every call
+    goes through the pool's concurrency limit and token bucket, and rate-limit errors are
+    retried with jittered exponential backoff. Streams are retried only before the first chunk.
+    """
+
+    def __init__(self, inner: Runnable, pool: "LLMClientPool"):
+        self.inner = inner
+        self.pool = pool
+
+    # create_tool_calling_agent / with_structured_output keep working on the wrapped model.
+    def bind_tools(self, tools, **kwargs):
+        return PooledRunnable(self.inner.bind_tools(tools, **kwargs), self.pool)
+
+    def with_structured_output(self, schema, **kwargs):
+        return PooledRunnable(self.inner.with_structured_output(schema, **kwargs), self.pool)
+
+    @property
+    def InputType(self):
+        return self.inner.InputType
+
+    @property
+    def OutputType(self):
+        return self.inner.OutputType
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any):
+        for attempt in self.pool.attempts():
+            with self.pool.slot():
+                try:
+                    # Timed inside the slot: waiting for the pool is not model latency.
+                    with get_metrics().span("llm_call"):
+                        output = self.inner.invoke(input, config, **kwargs)
+                    get_metrics().record_llm_call(*_token_usage(output))
+                    return output
+                except Exception as e:
+                    self.pool.raise_unless_retryable(e, attempt)
+            self.pool.backoff(attempt)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any):
+        for attempt in self.pool.attempts():
+            async with self.pool.aslot():
+                try:
+                    with get_metrics().span("llm_call"):
+                        output = await self.inner.ainvoke(input, config, **kwargs)
+                    get_metrics().record_llm_call(*_token_usage(output))
+                    return output
+                except Exception as e:
+                    self.pool.raise_unless_retryable(e, attempt)
+            await self.pool.abackoff(attempt)
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any):
+        for attempt in self.pool.attempts():
+            started = False
+            with self.pool.slot():
+                prompt_tokens = completion_tokens = 0
+                try:
+                    with get_metrics().span("llm_call"):
+                        for chunk in self.inner.stream(input, config, **kwargs):
+                            started = True
+                            chunk_prompt, chunk_completion = _token_usage(chunk)
+                            prompt_tokens += chunk_prompt
+                            completion_tokens += chunk_completion
+                            yield chunk
+                    get_metrics().record_llm_call(prompt_tokens, completion_tokens)
+                    return
+                except Exception as e:
+                    if started:
+                        raise
+                    self.pool.raise_unless_retryable(e, attempt)
+            self.pool.backoff(attempt)
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any):
+        for attempt in self.pool.attempts():
+            started = False
+            async with self.pool.aslot():
+                prompt_tokens = completion_tokens = 0
+                try:
+                    with get_metrics().span("llm_call"):
+                        async for chunk in self.inner.astream(input, config, **kwargs):
+                            started = True
+                            chunk_prompt, chunk_completion = _token_usage(chunk)
+                            prompt_tokens += chunk_prompt
+                            completion_tokens += chunk_completion
+                            yield chunk
+                    get_metrics().record_llm_call(prompt_tokens, completion_tokens)
+                    return
+                except Exception as e:
+                    if started:
+                        raise
+                    self.pool.raise_unless_retryable(e, attempt)
+            await self.pool.abackoff(attempt)
+
+
+class _Slot:
+    def __init__(self, pool: "LLMClientPool"):
+        self.pool = pool
+
+    def __enter__(self):
+        self.pool._limit.acquire()
+        try:
+            self.pool._bucket.acquire()
+        except BaseException:
+            self.pool._limit.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        self.pool._limit.release()
+
+    async def __aenter__(self):
+        await self.pool._limit.aacquire()
+        try:
+            await self.pool._bucket.aacquire()
+        except BaseException:
+            self.pool._limit.release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc):
+        self.pool._limit.release()
+
+
+class LLMClientPool:
+    """
+    Shared LLM client provider for all BaseDietAgent instances.
+
+    One ChatGoogleGenerativeAI is created per (model, temperature) and reused by every agent,
+    so they share its transport and connections. All calls through `get_chat_model()` share one
+    concurrency limit and one token bucket (`requests_per_second`, bursting to `burst`), and
+    429/quota errors are retried with full-jitter exponential backoff up to `max_retries` times.
+    """
+
+    def __init__(self, google_api_key: str, max_concurrency: int = 8, requests_per_second: float = 2.0,
+                 burst: int = 4, max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 30.0):
+        self.google_api_key = google_api_key
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._limit = _ConcurrencyLimit(max_concurrency)
+        self._bucket = TokenBucket(rate=requests_per_second, capacity=burst)
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+        self.retries = 0
+
+    def get_chat_model(self, gemini_model: str, temperature: float) -> PooledRunnable:
+        key = (gemini_model, temperature)
+        with self._clients_lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = ChatGoogleGenerativeAI(
+                    model=gemini_model,
+                    google_api_key=self.google_api_key,
+                    temperature=temperature,
+                    max_retries=1 # Retries happen here, with jitter, not inside the client
+                )
+                self._clients[key] = client
+        return PooledRunnable(client, self)
+
+    def wrap(self, runnable: Runnable) -> PooledRunnable:
+        """Puts any chat model (e.g. a local fake) behind this pool's limits."""
+        return PooledRunnable(runnable, self)
+
+    # --- helpers used by PooledRunnable ---
+    def attempts(self):
+        return range(self.max_retries + 1)
+
+    def slot(self):
+        return _Slot(self)
+
+    def aslot(self):
+        return _Slot(self)
+
+    def raise_unless_retryable(self, error: Exception, attempt: int):
+        if attempt >= self.max_retries or not is_rate_limit_error(error):
+            raise error
+        self.retries += 1
+        get_metrics().incr("llm_rate_limited_total")
+        print(f"LLM rate limited (attempt {attempt + 1}/{self.max_retries + 1}), backing off: {error}")
+
+    def _delay(self, attempt: int) -> float:
+        # "Full jitter": spreads retries out so agents that were throttled together don't retry together.
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def backoff(self, attempt: int):
+        time.sleep(self._delay(attempt))
+
+    async def abackoff(self, attempt: int):
+        await asyncio.sleep(self._delay(attempt))
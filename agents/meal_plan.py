@@ -0,0 +1,193 @@
+# E:\Diet Chatbot\agents\meal_plan.py
+import re
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import get_metrics
+from .router import MEAL_KEYWORDS, _find_labels
+
+DEFAULT_MEAL_TYPES = ["breakfast", "lunch", "dinner"]
+# Put in every slot prompt (benchmarks/fakes.py looks for it to answer with a dish name first).
+SLOT_INSTRUCTIONS = ("Suggest exactly one dish. Put only the dish name on the first line, "
+                     "then the ingredients with quantities and short steps.")
+
+_PLAN_RE = re.compile(r"\b(?:meal|diet|food|menu|eating)[ -]?plans?\b|\bmenu\b|\bplan (?:my|our) meals\b")
+_NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+                 "eight": 8, "nine": 9, "ten": 10, "fourteen": 14}
+_DAYS_RE = re.compile(r"\b(\d+|" + "|".join(_NUMBER_WORDS) + r")[ -]days?\b")
+_WEEKS_RE = re.compile(r"\b(\d+|two|three|four)[ -]weeks?\b")
+_WEEK_RE = re.compile(r"\b(?:a|one|the|this|next|whole|full|entire) week\b|\bweekly\b|\bweek[- ]long\b")
+
+
+def parse_meal_plan_request(text: str, max_days: int = 7):
+    """
+    {"days": n, "meal_types": [...]} when the message asks for a plan over several days
+    ("a 7-day vegan meal plan", "weekly menu with snacks"), else None. Lunch and dinner
+    only if those are the only meals named; snacks are added to the default three.
+    """
+    text = (text or "").lower()
+    if not _PLAN_RE.search(text):
+        return None
+    match = _DAYS_RE.search(text)
+    if match:
+        days = int(match.group(1)) if match.group(1).isdigit() else _NUMBER_WORDS[match.group(1)]
+    elif _WEEKS_RE.search(text):
+        weeks = _WEEKS_RE.search(text).group(1)
+        days = 7 * (int(weeks) if weeks.isdigit() else _NUMBER_WORDS[weeks])
+    elif _WEEK_RE.search(text):
+        days = 7
+    else:
+        return None # "What is a good meal plan for diabetics?" is a question, not a plan
+    if days < 1:
+        return None
+    meals = _find_labels(text, MEAL_KEYWORDS)
+    if not meals or meals == ["snack"]:
+        meals = DEFAULT_MEAL_TYPES + meals
+    return {"days": min(days, max_days), "meal_types": meals}
+
+
+def dish_key(name: str) -> str:
+    """Normalized dish name for spotting repeats: "**Chickpea Curry!**" and "chickpea curry" match."""
+    return " ".join(re.findall(r"[a-z0-9]+", (name or "").lower()))
+
+
+class MealPlanner:
+    """
+    Builds a multi-day meal plan as one small sub-task per (day, meal type) instead of one
+    long agent run. `run(plan, solve)` calls `solve(slot, prompt)` for every slot at once,
+    at most `max_concurrency` at a time, so a week of three meals takes about as long as
+    the slowest meal rather than the sum of 21. Each call runs in a copy of the caller's
+    context, so retrieval exclusions and metrics still apply. `arun(plan, asolve)` is the
+    async twin.
+
+    The slots are planned independently, so the merge checks for repeats: every slot whose
+    dish was already used earlier in the week (by normalized name) is asked again, in
+    parallel, with the plan's dishes listed as ones to avoid. That happens up to
+    `dedupe_attempts` times; anything still repeated is kept and counted. A slot that
+    fails is reported in the plan rather than failing it.
+    """
+
+    def __init__(self, max_concurrency: int = 21, dedupe_attempts: int = 1):
+        self.max_concurrency = max(1, max_concurrency)
+        self.dedupe_attempts = dedupe_attempts
+
+    @staticmethod
+    def slots(plan: dict):
+        return [(day, meal_type) for day in range(1, plan["days"] + 1) for meal_type in plan["meal_types"]]
+
+    @staticmethod
+    def slot_prompt(plan: dict, slot, profile: str, avoid=()) -> str:
+        day, meal_type = slot
+        prompt = (f"Plan {meal_type} for day {day} of a {plan['days']}-day meal plan ({profile}). "
+                  f"The other meals are planned separately, so choose something distinctive. {SLOT_INSTRUCTIONS}")
+        if avoid:
+            prompt += f" Do not suggest any of these dishes, already in the plan: {'; '.join(sorted(avoid))}."
+        return prompt
+
+    @staticmethod
+    def dish_name(answer: str) -> str:
+        for line in (answer or "").splitlines():
+            # Drop markdown and labels the model likes to add: "## Dish: Tofu Scramble (serves 2)"
+            line = re.sub(r"^[\s#>*_\-\d.]*(?:dish(?: name)?\s*:\s*)?", "", line, flags=re.IGNORECASE)
+            line = re.sub(r"[*_`]+", "", line).strip(" :")
+            if line:
+                return line[:80]
+        return ""
+
+    def _failed(self, slot, error: BaseException) -> str:
+        get_metrics().incr("meal_plan_slots_total", result="failed")
+        print(f"Meal plan slot day {slot[0]} {slot[1]} failed: {type(error).__name__}: {error}")
+        return ""
+
+    def _attempt(self, solve, slot, prompt: str) -> str:
+        try:
+            answer = solve(slot, prompt)
+        except Exception as e:
+            return self._failed(slot, e)
+        get_metrics().incr("meal_plan_slots_total", result="ok")
+        return answer
+
+    async def _aattempt(self, asolve, semaphore: asyncio.Semaphore, slot, prompt: str) -> str:
+        async with semaphore:
+            try:
+                answer = await asolve(slot, prompt)
+            except Exception as e:
+                return self._failed(slot, e)
+        get_metrics().incr("meal_plan_slots_total", result="ok")
+        return answer
+
+    def _repeats(self, answers: dict):
+        """Slots whose dish already appears earlier in the plan, and the dishes to steer them away from."""
+        seen, repeats = {}, []
+        for slot, answer in answers.items():
+            key = dish_key(self.dish_name(answer))
+            if not key:
+                continue
+            if key in seen:
+                repeats.append(slot)
+            else:
+                seen[key] = self.dish_name(answer)
+        return repeats, set(seen.values())
+
+    def _count_kept(self, answers: dict):
+        repeats, _ = self._repeats(answers)
+        if repeats:
+            get_metrics().incr("meal_plan_duplicates_total", value=len(repeats), result="kept")
+
+    @staticmethod
+    def _merge_retries(answers: dict, slots, retried):
+        # A retry that failed keeps the repeated dish rather than leaving the slot empty.
+        answers.update((slot, answer) for slot, answer in zip(slots, retried) if answer)
+
+    def _map(self, solve, jobs):
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(jobs)), thread_name_prefix="meal-plan") as pool:
+            # One context copy per job; a Context can't be entered by two threads at once.
+            futures = [pool.submit(contextvars.copy_context().run, self._attempt, solve, slot, prompt)
+                       for slot, prompt in jobs]
+            return [future.result() for future in futures]
+
+    def run(self, plan: dict, profile: str, solve) -> dict:
+        """Answers for every slot, in day and meal order: {(day, meal_type): answer text}."""
+        slots = self.slots(plan)
+        get_metrics().observe("meal_plan_slots", len(slots))
+        answers = dict(zip(slots, self._map(solve, [(slot, self.slot_prompt(plan, slot, profile)) for slot in slots])))
+        for _ in range(self.dedupe_attempts):
+            repeats, used = self._repeats(answers)
+            if not repeats:
+                break
+            get_metrics().incr("meal_plan_duplicates_total", value=len(repeats), result="retried")
+            jobs = [(slot, self.slot_prompt(plan, slot, profile, used)) for slot in repeats]
+            self._merge_retries(answers, repeats, self._map(solve, jobs))
+        self._count_kept(answers)
+        return answers
+
+    async def arun(self, plan: dict, profile: str, asolve) -> dict:
+        slots = self.slots(plan)
+        get_metrics().observe("meal_plan_slots", len(slots))
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        answers = dict(zip(slots, await asyncio.gather(*(
+            self._aattempt(asolve, semaphore, slot, self.slot_prompt(plan, slot, profile)) for slot in slots
+        ))))
+        for _ in range(self.dedupe_attempts):
+            repeats, used = self._repeats(answers)
+            if not repeats:
+                break
+            get_metrics().incr("meal_plan_duplicates_total", value=len(repeats), result="retried")
+            self._merge_retries(answers, repeats, await asyncio.gather(*(
+                self._aattempt(asolve, semaphore, slot, self.slot_prompt(plan, slot, profile, used))
+                for slot in repeats
+            )))
+        self._count_kept(answers)
+        return answers
+
+    def format_plan(self, plan: dict, profile: str, answers: dict) -> str:
+        lines = [f"Here is your {plan['days']}-day meal plan ({profile})."]
+        for day in range(1, plan["days"] + 1):
+            lines.append(f"\n## Day {day}")
+            for meal_type in plan["meal_types"]:
+                answer = (answers.get((day, meal_type)) or "").strip()
+                if not answer:
+                    answer = "No suggestion this time (the request failed); ask me for this meal again."
+                lines.append(f"\n### {meal_type.capitalize()}\n{answer}")
+        return "\n".join(lines)
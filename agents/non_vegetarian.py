@@ -2,7 +2,10 @@ from .base_agent import BaseDietAgent
 from .common_tools import retrieve_from_knowledge_base, tavily_search
 
 class NonVegetarianDietAgent(BaseDietAgent):
-    def __init__(self, google_api_key: str, gemini_model: str, temperature: float):
+    # Enforced at retrieval time as well, so pork/beef recipes never reach the prompt
+    EXCLUDED_INGREDIENTS = ["pork", "beef"]
+
+    def __init__(self, google_api_key: str, gemini_model: str, temperature: float, llm=None, verbose: bool = False):
         system_message = """You are an expert in non-vegetarian nutrition and meal planning.
         Your goal is to provide delicious, balanced, and healthy meal suggestions or recipes that may include meat, poultry, or fish.
         Ensure suggestions are appropriate for a non-vegetarian diet.
@@ -18,5 +21,7 @@ class NonVegetarianDietAgent(BaseDietAgent):
             tools=tools,
             google_api_key=google_api_key, # Pass this
             gemini_model=gemini_model,     # Pass this
-            temperature=temperature        # Pass this
+            temperature=temperature,       # Pass this
+            llm=llm,
+            verbose=verbose
         )
\ No newline at end of file
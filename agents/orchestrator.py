@@ -7,6 +7,7 @@ from .common_tools import tavily_search, retrieve_from_knowledge_base # CORRECT:
 from pydantic import BaseModel, Field # <--- UPDATED IMPORT for Pydantic
 
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.messages import HumanMessage
 
 # ADD THIS IMPORT: create_tool_calling_agent
 from langchain.agents import create_tool_calling_agent # <--- ADDED THIS LINE
@@ -19,11 +20,15 @@ from langchain_core.output_parsers import JsonOutputParser # Keep this if it's u
 
 from pydantic import BaseModel, Field
 # Use Optional for fields that can be None (i.e., null from JSON)
-from typing import Optional # <--- ADD THIS IMPORT
+from typing import Optional, Literal # <--- ADD THIS IMPORT
+import json
+
+from metrics import get_metrics
 
 # Define a Pydantic model for structured output from the orchestrator
 class RouteDecision(BaseModel):
-    next_agent: str = Field(description="The name of the next agent to route to (e.g., 'vegetarian', 'non_vegetarian', 'vegan', 'general').")
+    # A Literal, so schema-constrained output can only name an agent the graph has
+    next_agent: Literal["vegetarian", "non_vegetarian", "vegan", "general"] = Field(description="The name of the next agent to route to (e.g., 'vegetarian', 'non_vegetarian', 'vegan', 'general').")
     # Make these fields Optional[str]
     dietary_preference: Optional[str] = Field(default=None, description="Extracted dietary preference from the user's query (e.g., 'vegetarian', 'vegan', 'non_vegetarian', 'keto').")
     dietary_goal: Optional[str] = Field(default=None, description="Extracted dietary goal (e.g., 'weight loss', 'muscle gain', 'general health').")
@@ -33,9 +38,8 @@ class RouteDecision(BaseModel):
 
 # ... (rest of OrchestratorAgent class) ...
 
-class OrchestratorAgent(BaseDietAgent):
-    def __init__(self, google_api_key: str, gemini_model: str, temperature: float):
-        system_message = """You are the central routing agent for a diet suggestion chatbot.
+# Shared by both routing modes. No braces in here: it is used as a prompt template.
+ROUTING_INSTRUCTIONS = """You are the central routing agent for a diet suggestion chatbot.
         Your main task is to analyze the user's query and determine the most appropriate specialized diet agent (e.g., 'vegetarian', 'non_vegetarian', 'vegan') or
         if the request is general enough to be handled by general tools (like Tavily search for general facts).
 
@@ -47,7 +51,7 @@ class OrchestratorAgent(BaseDietAgent):
         - Any allergies or restrictions (e.g., gluten-free, dairy-free)
         - Type of meal (e.g., breakfast, lunch, dinner, snack)
 
-        Based on this analysis, you will output a JSON object indicating:
+        Based on this analysis, you will return a routing decision indicating:
         1. The `next_agent` to route to ('vegetarian', 'non_vegetarian', 'vegan', 'general').
            - Use 'vegetarian' if the user explicitly states they are vegetarian or implies it.
            - Use 'vegan' if the user explicitly states they are vegan.
@@ -60,7 +64,12 @@ class OrchestratorAgent(BaseDietAgent):
         6. A `query_for_agent` which is a concise restatement of the user's core request to pass to the next agent.
 
         Always provide a `query_for_agent`.
-        If you need to ask for clarification, ensure your response is a question to the user and the `next_agent` is 'general' for that turn, then the user's follow-up will re-enter the orchestrator.
+        If you need to ask for clarification, put your question to the user in `query_for_agent` and set `next_agent` to 'general' for that turn, then the user's follow-up will re-enter the orchestrator.
+        """
+
+# Only the "agent" mode needs the format spelled out; in "structured" mode the schema carries it.
+JSON_OUTPUT_INSTRUCTIONS = """
+        Reply with the decision as a JSON object.
 
         Example JSON output:
         {{
@@ -72,7 +81,35 @@ class OrchestratorAgent(BaseDietAgent):
             "query_for_agent": "vegetarian dinner ideas for weight loss"
         }}
         """
-        tools = [tavily_search, retrieve_from_knowledge_base]
+
+REPAIR_MESSAGE = ("Your routing decision could not be used: {error}\nYour reply was: {reply}\n"
+                  "Reply again with only the corrected routing decision.")
+
+
+class OrchestratorAgent(BaseDietAgent):
+    """
+    Decides which specialist handles a turn and extracts preference, goal, allergies and meal type.
+
+    In "structured" mode (the default) `route()` makes one schema-constrained model call
+    that returns a validated RouteDecision. No tools are offered, so the model can't wander
+    into searches first, and no tool schemas ride along in the prompt. A reply that still
+    doesn't validate is sent back with the error, at most `repair_attempts` times.
+
+    In "agent" mode the orchestrator is the original tool-calling AgentExecutor whose JSON
+    reply main.py parses itself. Only that mode builds the executor, its tools and the JSON
+    parser; in "structured" mode `agent_executor` is None.
+    """
+
+    def __init__(self, google_api_key: str, gemini_model: str, temperature: float, llm=None, verbose: bool = False,
+                 mode: str = "structured", repair_attempts: int = 1):
+        if mode not in ("structured", "agent"):
+            raise ValueError(f"Unknown orchestrator mode: {mode!r} (expected 'structured' or 'agent')")
+        self.mode = mode
+        self.repair_attempts = repair_attempts
+        # The tools, the JSON instructions and the parser only serve the "agent" mode's tool loop.
+        structured = mode == "structured"
+        system_message = ROUTING_INSTRUCTIONS if structured else ROUTING_INSTRUCTIONS + JSON_OUTPUT_INSTRUCTIONS
+        tools = [] if structured else [tavily_search, retrieve_from_knowledge_base]
 
         super().__init__(
             name="Orchestrator",
@@ -80,9 +117,73 @@ class OrchestratorAgent(BaseDietAgent):
             tools=tools,
             google_api_key=google_api_key,
             gemini_model=gemini_model,
-            temperature=temperature
+            temperature=temperature,
+            llm=llm,
+            verbose=verbose
         )
-        self.parser = JsonOutputParser(pydantic_object=RouteDecision)
+        self.parser = None if structured else JsonOutputParser(pydantic_object=RouteDecision)
+        if structured:
+            self.route_prompt = ChatPromptTemplate.from_messages(
+                [
+                    ("system", ROUTING_INSTRUCTIONS),
+                    MessagesPlaceholder(variable_name="chat_history", optional=True),
+                    ("human", "{input}"),
+                    MessagesPlaceholder(variable_name="repair", optional=True),
+                ]
+            )
+            # include_raw: on a validation failure we still get the reply to quote back.
+            self.route_llm = self.llm.with_structured_output(RouteDecision, include_raw=True)
+
+    @property
+    def structured(self) -> bool:
+        return self.mode == "structured"
+
+    def _create_runnable_agent(self):
+        # Called from BaseDietAgent.__init__; no agent means no AgentExecutor is built either.
+        return None if self.structured else super()._create_runnable_agent()
+
+    def _check(self, result: dict):
+        """(decision, repair messages): the decision if the reply validated, else what to send back."""
+        parsed = result.get("parsed")
+        if isinstance(parsed, RouteDecision):
+            return parsed, None
+        raw = result.get("raw")
+        if getattr(raw, "tool_calls", None):
+            reply = json.dumps(raw.tool_calls[0].get("args", {}))
+        else:
+            reply = str(getattr(raw, "content", raw))
+        error = result.get("parsing_error") or "the reply was not a routing decision"
+        return None, [HumanMessage(content=REPAIR_MESSAGE.format(error=error, reply=reply[:1000]))]
+
+    def _give_up(self, user_message: str) -> RouteDecision:
+        get_metrics().incr("orchestrator_repair_total", result="gave_up")
+        print(f"Orchestrator gave no valid routing decision after {self.repair_attempts} repair attempts.")
+        return RouteDecision(next_agent="general", query_for_agent=user_message)
+
+    def route(self, user_message: str, chat_history=None) -> RouteDecision:
+        """One model call (plus at most `repair_attempts` repairs) returning a validated RouteDecision."""
+        repair = []
+        for attempt in range(self.repair_attempts + 1):
+            prompt_value = self.route_prompt.invoke({"input": user_message, "chat_history": chat_history or [],
+                                                     "repair": repair})
+            decision, repair = self._check(self.route_llm.invoke(prompt_value))
+            if decision is not None:
+                if attempt:
+                    get_metrics().incr("orchestrator_repair_total", result="repaired")
+                return decision
+        return self._give_up(user_message)
+
+    async def aroute(self, user_message: str, chat_history=None) -> RouteDecision:
+        repair = []
+        for attempt in range(self.repair_attempts + 1):
+            prompt_value = await self.route_prompt.ainvoke({"input": user_message, "chat_history": chat_history or [],
+                                                            "repair": repair})
+            decision, repair = self._check(await self.route_llm.ainvoke(prompt_value))
+            if decision is not None:
+                if attempt:
+                    get_metrics().incr("orchestrator_repair_total", result="repaired")
+                return decision
+        return self._give_up(user_message)
 
 
 
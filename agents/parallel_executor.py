@@ -0,0 +1,108 @@
+# E:\Diet Chatbot\agents\parallel_executor.py
+import time
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Optional
+
+from langchain.agents import AgentExecutor
+from langchain_core.agents import AgentStep
+
+from app_config import TOOL_MAX_WORKERS, TOOL_TIMEOUT_SECONDS, TOOL_TIMEOUTS
+from metrics import get_metrics
+
+
+class _DeferredStep:
+    """A tool call the base loop asked for, to be run by ParallelToolAgentExecutor."""
+
+    def __init__(self, agent_action, run):
+        self.agent_action = agent_action
+        self.run = run
+
+
+class ParallelToolAgentExecutor(AgentExecutor):
+    """
+    AgentExecutor that runs the tool calls of one agent step concurrently.
+
+    When the model asks for several tools at once (say two `retrieve_from_knowledge_base`
+    filters and a `tavily_search`), the stock sync loop runs them back to back. Here they
+    go to a thread pool of at most `max_tool_workers` threads, so the step takes as long as
+    its slowest tool. Each thread gets a copy of the caller's context, so retrieval
+    exclusions and metrics still apply. Results are returned in the order the model asked
+    for them. The async loop already gathers tool calls; it gets the same timeouts.
+
+    Every call has a timeout (`tool_timeouts` per tool name, else `default_tool_timeout`).
+    A call that times out or raises becomes an observation saying so, and the model answers
+    from the other results; the turn is not aborted. A timed-out sync tool keeps running in
+    the background until it returns, but nothing waits for it.
+    """
+
+    max_tool_workers: int = TOOL_MAX_WORKERS
+    default_tool_timeout: Optional[float] = TOOL_TIMEOUT_SECONDS
+    tool_timeouts: Dict[str, float] = dict(TOOL_TIMEOUTS)
+
+    def _timeout_for(self, tool_name: str) -> Optional[float]:
+        return self.tool_timeouts.get(tool_name, self.default_tool_timeout)
+
+    @staticmethod
+    def _degraded_step(agent_action, error: BaseException, timeout: Optional[float]) -> AgentStep:
+        metrics = get_metrics()
+        if isinstance(error, (FutureTimeoutError, asyncio.TimeoutError)):
+            metrics.incr("tool_timeouts_total", tool=agent_action.tool)
+            observation = (f"The {agent_action.tool} tool timed out after {timeout:g}s and returned nothing. "
+                           "Answer from the other results or your own knowledge.")
+        else:
+            metrics.incr("tool_failures_total", tool=agent_action.tool)
+            print(f"Tool {agent_action.tool} failed: {type(error).__name__}: {error}")
+            observation = (f"The {agent_action.tool} tool failed ({type(error).__name__}) and returned nothing. "
+                           "Answer from the other results or your own knowledge.")
+        return AgentStep(action=agent_action, observation=observation)
+
+    # The base _iter_next_step() plans, yields the actions, then calls this once per action.
+    # Deferring the work lets _iter_next_step() below start all of them before waiting on any.
+    # That is a private detail of langchain 0.3 (pinned in requirements.txt), so
+    # tests/test_parallel_executor.py checks it still holds.
+    def _perform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None):
+        return _DeferredStep(agent_action, functools.partial(
+            super()._perform_agent_action, name_to_tool_map, color_mapping, agent_action, run_manager
+        ))
+
+    def _iter_next_step(self, name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager=None):
+        deferred = []
+        for item in super()._iter_next_step(name_to_tool_map, color_mapping, inputs, intermediate_steps,
+                                            run_manager):
+            if isinstance(item, _DeferredStep):
+                deferred.append(item)
+            else:
+                yield item
+        if not deferred:
+            return
+
+        get_metrics().observe("tool_calls_per_step", len(deferred))
+        # Not a `with` block: leaving it would wait for tools that already timed out.
+        pool = ThreadPoolExecutor(max_workers=max(1, min(self.max_tool_workers, len(deferred))),
+                                  thread_name_prefix="agent-tool")
+        try:
+            submitted = time.monotonic()
+            # One context copy per call; a Context can't be entered by two threads at once.
+            futures = [pool.submit(contextvars.copy_context().run, step.run) for step in deferred]
+            for step, future in zip(deferred, futures):
+                timeout = self._timeout_for(step.agent_action.tool)
+                remaining = None if timeout is None else max(0.0, submitted + timeout - time.monotonic())
+                try:
+                    yield future.result(timeout=remaining)
+                except Exception as e:
+                    yield self._degraded_step(step.agent_action, e, timeout)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _aperform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None):
+        timeout = self._timeout_for(agent_action.tool)
+        try:
+            return await asyncio.wait_for(
+                super()._aperform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager),
+                timeout
+            )
+        except Exception as e:
+            return self._degraded_step(agent_action, e, timeout)
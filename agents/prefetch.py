@@ -0,0 +1,181 @@
+# E:\Diet Chatbot\agents\prefetch.py
+import time
+import uuid
+import asyncio
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from metrics import get_metrics
+
+# Put in front of prefetched passages in the specialist's input (benchmarks/fakes.py looks for it).
+PREFETCHED_CONTEXT_HEADER = ("Knowledge base results already retrieved for this question "
+                             "(cite them as [n]; call retrieve_from_knowledge_base only if they don't cover it):")
+
+
+class _Prefetch:
+    """One speculative retrieval: the route it was made for and a Future of (docs, exclusion key)."""
+
+    def __init__(self, route: str):
+        self.route = route
+        self.future = Future()
+        self.seconds = None # How long the retrieval itself took
+
+
+class RetrievalPrefetcher:
+    """
+    Starts knowledge base retrievals for the likely routes of a turn while the orchestrator
+    is still deciding, so retrieval is off the critical path.
+
+    `start(query, routes, allergies)` queues one background job for the turn and returns its
+    batch id. The job first calls `warm(query)` (embedding the query once, so the routes share
+    it) and then `retrieve(query, route, allergies)` for each route in order. `retrieve`
+    returns the documents and the exclusion key they were filtered with.
+
+    The specialist node calls `take(batch_id, route, exclusion_key)`: it waits up to
+    `wait_seconds` for that route's result and cancels the routes that were not chosen
+    (retrievals already running finish and only warm the retrieval cache). A result
+    filtered with different exclusions than the specialist needs (say the orchestrator
+    found an allergy the prefetch didn't know about) is never used.
+
+    Every outcome is counted in `prefetch_total{result=...}`, and the retrieval time taken
+    off the critical path in `prefetch_seconds_saved`.
+    """
+
+    def __init__(self, retrieve, warm=None, max_workers: int = 4, wait_seconds: float = 2.0,
+                 max_batches: int = 256):
+        self.retrieve = retrieve
+        self.warm = warm
+        self.wait_seconds = wait_seconds
+        self.max_batches = max_batches
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._batches = OrderedDict() # batch id -> {route: _Prefetch}; batches that were never taken age out
+        self.outcomes = {}
+        self.seconds_saved = 0.0
+
+    def _count(self, result: str, route: str = None):
+        get_metrics().incr("prefetch_total", result=result, route=route)
+        with self._lock:
+            self.outcomes[result] = self.outcomes.get(result, 0) + 1
+
+    def start(self, query: str, routes, allergies=()) -> str:
+        routes = list(dict.fromkeys(routes))
+        if not query or not routes:
+            return ""
+        batch_id = uuid.uuid4().hex
+        batch = {route: _Prefetch(route) for route in routes}
+        with self._lock:
+            self._batches[batch_id] = batch
+            while len(self._batches) > self.max_batches:
+                self._cancel(self._batches.popitem(last=False)[1].values())
+        get_metrics().incr("prefetch_started_total", value=len(routes))
+        # The job runs in a copy of this context, so its spans land on the current turn.
+        self._pool.submit(contextvars.copy_context().run, self._run, query, batch, list(allergies or ()))
+        return batch_id
+
+    def _run(self, query: str, batch: dict, allergies):
+        if self.warm is not None:
+            try:
+                self.warm(query)
+            except Exception as e:
+                print(f"Prefetch could not embed the query, retrieving anyway: {e}")
+        for entry in batch.values():
+            if not entry.future.set_running_or_notify_cancel():
+                continue # The specialist already chose another route
+            started = time.perf_counter()
+            try:
+                with get_metrics().span("prefetch_retrieval", route=entry.route):
+                    result = self.retrieve(query, entry.route, allergies)
+            except Exception as e:
+                entry.future.set_exception(e)
+            else:
+                entry.future.set_result(result)
+            finally:
+                entry.seconds = time.perf_counter() - started
+
+    def _cancel(self, entries):
+        for entry in entries:
+            if entry.future.cancel():
+                self._count("cancelled", entry.route)
+            else:
+                self._count("wasted", entry.route) # Running or done, never used
+
+    def _claim(self, batch_id: str, route: str):
+        """Removes the batch, cancels the other routes and returns this route's entry (or None)."""
+        with self._lock:
+            batch = self._batches.pop(batch_id, None) if batch_id else None
+        if batch is None:
+            self._count("none", route)
+            return None
+        # The job may still be walking the batch, so read it without changing it.
+        entry = batch.get(route)
+        self._cancel(other for other_route, other in batch.items() if other_route != route)
+        if entry is None:
+            self._count("unpredicted", route)
+        return entry
+
+    def _accept(self, entry: _Prefetch, result, waited: float, exclusion_key):
+        docs, prefetched_key = result
+        if prefetched_key != exclusion_key:
+            self._count("stale", entry.route)
+            return None
+        self._count("used", entry.route)
+        saved = max(0.0, (entry.seconds or 0.0) - waited)
+        metrics = get_metrics()
+        metrics.observe("prefetch_wait_seconds", waited)
+        metrics.observe("prefetch_seconds_saved", saved)
+        with self._lock:
+            self.seconds_saved += saved
+        return docs
+
+    def _give_up(self, entry: _Prefetch, error: BaseException):
+        if isinstance(error, (FutureTimeoutError, asyncio.TimeoutError)):
+            entry.future.cancel()
+            self._count("late", entry.route)
+        else:
+            self._count("failed", entry.route)
+            print(f"Prefetched retrieval for {entry.route} failed: {type(error).__name__}: {error}")
+        return None
+
+    def take(self, batch_id: str, route: str, exclusion_key):
+        """The prefetched documents for `route`, or None if there are none usable; the tool path then applies."""
+        entry = self._claim(batch_id, route)
+        if entry is None:
+            return None
+        started = time.perf_counter()
+        try:
+            result = entry.future.result(timeout=self.wait_seconds)
+        except Exception as e:
+            return self._give_up(entry, e)
+        return self._accept(entry, result, time.perf_counter() - started, exclusion_key)
+
+    async def atake(self, batch_id: str, route: str, exclusion_key):
+        entry = self._claim(batch_id, route)
+        if entry is None:
+            return None
+        started = time.perf_counter()
+        try:
+            # shield(): timing out must not cancel the shared Future from inside the event loop.
+            result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(entry.future)), self.wait_seconds)
+        except Exception as e:
+            return self._give_up(entry, e)
+        return self._accept(entry, result, time.perf_counter() - started, exclusion_key)
+
+    def discard(self, batch_id: str):
+        """Cancels a batch whose turn no longer needs it (e.g. the answer came from the answer cache)."""
+        with self._lock:
+            batch = self._batches.pop(batch_id, None) if batch_id else None
+        if batch is not None:
+            self._cancel(batch.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            outcomes = dict(self.outcomes)
+            claimed = sum(outcomes.get(result, 0) for result in ("used", "late", "failed", "stale", "unpredicted"))
+            return {
+                **outcomes,
+                "use_rate": (outcomes.get("used", 0) / claimed) if claimed else 0.0,
+                "seconds_saved": round(self.seconds_saved, 3),
+            }
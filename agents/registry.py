@@ -0,0 +1,59 @@
+# E:\Diet Chatbot\agents\registry.py
+import time
+import threading
+
+
+class AgentRegistry:
+    """
+    Builds agents and shared components on first use instead of at import time.
+
+    Register a zero-argument factory per name; `get(name)` runs it exactly once, even when
+    several threads ask at the same time, and returns the cached instance afterwards.
+    Components that are never routed to are never built. `warmup()` builds them up front.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._locks = {}
+        self._registry_lock = threading.Lock()
+        self.build_seconds = {}
+
+    def register(self, name: str, factory):
+        with self._registry_lock:
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.Lock())
+
+    def override(self, name: str, instance):
+        """Replaces (or pre-seeds) a component, e.g. with a local fake in benchmarks."""
+        with self._registry_lock:
+            self._locks.setdefault(name, threading.Lock())
+            self._instances[name] = instance
+
+    def is_built(self, name: str) -> bool:
+        return name in self._instances
+
+    def get(self, name: str):
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        if name not in self._factories:
+            raise KeyError(f"No component registered under '{name}'.")
+        # One lock per component so building the knowledge base doesn't block building an agent.
+        with self._locks[name]:
+            instance = self._instances.get(name)
+            if instance is None:
+                start = time.perf_counter()
+                instance = self._factories[name]()
+                self.build_seconds[name] = time.perf_counter() - start
+                self._instances[name] = instance
+        return instance
+
+    def warmup(self, names=None):
+        """Builds the given components (all registered ones by default) and returns build times."""
+        for name in (names or list(self._factories.keys())):
+            self.get(name)
+        return dict(self.build_seconds)
+
+    def names(self):
+        return list(self._factories.keys())
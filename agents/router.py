@@ -0,0 +1,253 @@
+# E:\Diet Chatbot\agents\router.py
+import re
+import math
+import threading
+from typing import Optional
+
+from .orchestrator import RouteDecision
+
+# --- Keyword lexicon ---
+# Each entry maps a route to phrases that, on their own, settle the user's dietary preference.
+DIET_KEYWORDS = {
+    "vegan": ["vegan", "plant-based", "plant based"],
+    "vegetarian": ["vegetarian", "veggie", "lacto-ovo", "paneer"],
+    "non_vegetarian": ["non-vegetarian", "non vegetarian", "non-veg", "non veg", "nonveg"],
+}
+# Ingredients that point at a diet without settling it: "chicken recipes" is a non-vegetarian
+# request, "best meat substitutes for vegans" and "is fish oil healthy" are not.
+DIET_HINT_KEYWORDS = {
+    "non_vegetarian": ["chicken", "fish", "salmon", "tuna", "shrimp", "prawn", "mutton", "lamb", "turkey",
+                       "seafood", "meat"],
+}
+GOAL_KEYWORDS = {
+    "weight loss": ["weight loss", "lose weight", "losing weight", "fat loss", "cutting", "low calorie", "low-calorie"],
+    "muscle gain": ["muscle gain", "gain muscle", "build muscle", "bulking", "high protein", "high-protein"],
+    "general health": ["healthy", "general health", "balanced"],
+}
+MEAL_KEYWORDS = {
+    "breakfast": ["breakfast", "brunch"],
+    "lunch": ["lunch"],
+    "dinner": ["dinner", "supper"],
+    "snack": ["snack", "snacks"],
+}
+ALLERGY_PATTERNS = {
+    "gluten": [r"gluten[- ]free", r"gluten allerg", r"celiac", r"coeliac"],
+    "dairy": [r"dairy[- ]free", r"lactose", r"dairy allerg"],
+    "nuts": [r"nut[- ]free", r"nut allerg", r"allergic to (?:pea)?nuts"],
+    "soy": [r"soy[- ]free", r"soy allerg", r"allergic to soy"],
+    "eggs": [r"egg[- ]free", r"egg allerg", r"allergic to eggs?"],
+    "shellfish": [r"shellfish allerg", r"allergic to shellfish"],
+}
+# Any of these makes keyword matching unreliable ("vegan but not...", "no chicken"), so we defer.
+NEGATION_WORDS = {"no", "not", "without", "avoid", "except", "instead", "hate", "dont", "don't", "never"}
+# Words that make a message a request for food, as opposed to a question about nutrition.
+MEAL_INTENT_WORDS = {"recipe", "recipes", "meal", "meals", "dish", "dishes", "cook", "cooking", "make", "eat",
+                     "menu", "idea", "ideas", "suggest", "suggestion", "suggestions", "prepare", "another"}
+QUESTION_WORDS = {"what", "how", "is", "are", "why", "does", "do", "can", "should", "which", "when", "who"}
+
+# --- Labelled examples for the embedding nearest-centroid classifier ---
+LABELLED_EXAMPLES = {
+    "vegan": [
+        "vegan dinner for weight loss",
+        "plant based high protein breakfast",
+        "tofu and tempeh recipes",
+        "meals with lentils chickpeas and no animal products",
+    ],
+    "vegetarian": [
+        "vegetarian lunch ideas",
+        "paneer recipes for dinner",
+        "egg and cheese breakfast without meat",
+        "meatless meals with dairy",
+    ],
+    "non_vegetarian": [
+        "chicken recipes",
+        "grilled fish for dinner",
+        "high protein meals with eggs and chicken breast",
+        "healthy seafood lunch",
+    ],
+    "general": [
+        "benefits of mediterranean diet",
+        "how much protein do I need per day",
+        "is intermittent fasting healthy",
+        "what are good sources of fiber",
+    ],
+}
+
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def _find_labels(text: str, table: dict):
+    found = []
+    for label, phrases in table.items():
+        for phrase in phrases:
+            # The "non-" lookbehinds stop "non-vegetarian" from also counting as "vegetarian".
+            if re.search(rf"(?<![a-z])(?<!non-)(?<!non ){re.escape(phrase)}(?![a-z])", text):
+                found.append(label)
+                break
+    return found
+
+
+def detect_allergies(text: str):
+    """Allergies stated in the (lowercased) text, e.g. "gluten-free" -> ["gluten"]."""
+    return [name for name, patterns in ALLERGY_PATTERNS.items()
+            if any(re.search(pattern, text) for pattern in patterns)]
+
+
+def likely_diets(query: str):
+    """
+    Every dietary preference the keyword lexicon and the ingredient hints find in the query,
+    negated or not. Too loose to route on, but a free guess at which partitions are worth
+    prefetching.
+    """
+    text = (query or "").lower()
+    diets = _find_labels(text, DIET_KEYWORDS)
+    return diets + [diet for diet in _find_labels(text, DIET_HINT_KEYWORDS) if diet not in diets]
+
+
+def has_meal_intent(text: str) -> bool:
+    """True if the (lowercased) text asks for food: "chicken recipes", "what's for dinner", "make it spicier"."""
+    words = set(re.findall(r"[a-z']+", text))
+    return bool(words & MEAL_INTENT_WORDS) or bool(_find_labels(text, MEAL_KEYWORDS))
+
+
+def follow_up_signals(query: str):
+    """
+    For a message in a conversation whose diet is already known: the goal, meal type and
+    allergies the lexicon finds in it, or None if it needs the orchestrator because it names
+    a diet, negates something ("no tofu this time") or asks a general question rather than
+    for food ("how much protein do I need?").
+    """
+    text = (query or "").lower().strip()
+    words = re.findall(r"[a-z']+", text)
+    if not words or set(words) & NEGATION_WORDS or likely_diets(text):
+        return None
+    if (words[0] in QUESTION_WORDS or text.endswith("?")) and not has_meal_intent(text):
+        return None
+    goals = _find_labels(text, GOAL_KEYWORDS)
+    meals = _find_labels(text, MEAL_KEYWORDS)
+    return {
+        "dietary_goal": goals[0] if len(goals) == 1 else None,
+        "meal_type": meals[0] if len(meals) == 1 else None,
+        "allergies": detect_allergies(text),
+    }
+
+
+class FastPathRouter:
+    """
+    Routes unambiguous queries locally so they skip the orchestrator LLM round-trip.
+
+    First a keyword lexicon is tried: exactly one dietary preference and no negations means a
+    confident decision. Ingredient hints ("chicken", "fish") only count for a request for food
+    ("chicken recipes") and never against an explicit diet; anything else they appear in is
+    deferred. A query with neither, if an Embeddings object was given, is compared against
+    per-route centroids of LABELLED_EXAMPLES and accepted only when the best match clears
+    `min_similarity` and beats the runner-up by `min_margin`. Anything else returns None and
+    the caller falls back to the LLM orchestrator.
+
+    With `explicit_only` (the conversation's diet is already known) only an explicit diet word
+    routes: a hint or a nearest centroid is too weak to replace what the user told us earlier.
+    """
+
+    def __init__(self, embeddings=None, min_similarity: float = 0.82, min_margin: float = 0.05,
+                 labelled_examples: dict = None):
+        self.embeddings = embeddings
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.labelled_examples = labelled_examples or LABELLED_EXAMPLES
+        self._centroids = None
+        self._centroid_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.fast_path_hits = {"lexicon": 0, "embedding": 0}
+        self.llm_fallbacks = 0
+
+    def _get_centroids(self):
+        with self._centroid_lock:
+            if self._centroids is None:
+                centroids = {}
+                for route, examples in self.labelled_examples.items():
+                    vectors = self.embeddings.embed_documents(examples)
+                    centroids[route] = [sum(column) / len(vectors) for column in zip(*vectors)]
+                self._centroids = centroids
+            return self._centroids
+
+    def _classify_by_embedding(self, query: str):
+        if self.embeddings is None:
+            return None, 0.0
+        try:
+            query_vector = self.embeddings.embed_query(query)
+            scores = sorted(
+                ((_cosine(query_vector, centroid), route) for route, centroid in self._get_centroids().items()),
+                reverse=True
+            )
+        except Exception as e:
+            print(f"Fast-path embedding classifier failed, deferring to orchestrator: {e}")
+            return None, 0.0
+        best_score, best_route = scores[0]
+        runner_up = scores[1][0] if len(scores) > 1 else 0.0
+        if best_score >= self.min_similarity and best_score - runner_up >= self.min_margin:
+            return best_route, best_score
+        return None, best_score
+
+    def _record(self, source: Optional[str]):
+        with self._stats_lock:
+            if source is None:
+                self.llm_fallbacks += 1
+            else:
+                self.fast_path_hits[source] += 1
+
+    def route(self, query: str, explicit_only: bool = False) -> Optional[RouteDecision]:
+        text = (query or "").lower().strip()
+        if not text:
+            self._record(None)
+            return None
+
+        words = set(re.findall(r"[a-z']+", text))
+        negated = bool(words & NEGATION_WORDS)
+        diets = _find_labels(text, DIET_KEYWORDS)
+        hints = _find_labels(text, DIET_HINT_KEYWORDS)
+
+        route, source = None, None
+        if len(diets) == 1 and set(hints) <= set(diets) and not negated:
+            route, source = diets[0], "lexicon"
+        elif explicit_only:
+            pass
+        elif not diets and len(hints) == 1 and not negated and has_meal_intent(text):
+            route, source = hints[0], "lexicon"
+        elif not diets and not hints and not negated:
+            # Vague requests like "a dinner recipe" must reach the orchestrator so it can ask
+            # which diet the user follows; the similarity/margin thresholds keep them there.
+            route, _ = self._classify_by_embedding(query)
+            source = "embedding" if route else None
+
+        if route is None:
+            self._record(None)
+            return None
+
+        goals = _find_labels(text, GOAL_KEYWORDS)
+        meals = _find_labels(text, MEAL_KEYWORDS)
+        allergies = detect_allergies(text)
+        self._record(source)
+        return RouteDecision(
+            next_agent=route,
+            dietary_preference=route if route != "general" else None,
+            dietary_goal=goals[0] if len(goals) == 1 else None,
+            allergies=",".join(allergies) if allergies else None,
+            meal_type=meals[0] if len(meals) == 1 else None,
+            query_for_agent=query.strip(),
+        )
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            fast = sum(self.fast_path_hits.values())
+            total = fast + self.llm_fallbacks
+            return {
+                "fast_path": fast,
+                "fast_path_lexicon": self.fast_path_hits["lexicon"],
+                "fast_path_embedding": self.fast_path_hits["embedding"],
+                "llm_fallbacks": self.llm_fallbacks,
+                "fast_path_hit_rate": (fast / total) if total else 0.0,
+            }
@@ -0,0 +1,173 @@
+# E:\Diet Chatbot\agents\search_cache.py
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import threading
+from concurrent.futures import Future
+
+from rag.retrieval_cache import normalize_query
+
+
+class UpstreamSearchError(RuntimeError):
+    """The search tool answered with something other than a list of results, e.g. Tavily's repr(e) string."""
+
+
+class SearchCache:
+    """
+    On-disk TTL cache for web search results, shared by every agent and every session.
+
+    Results are stored as JSON in SQLite keyed by the normalized query, so they survive
+    restarts. Concurrent lookups of the same query are coalesced: the first caller fetches
+    from upstream and everyone else (threads or coroutines) waits on its result, so a burst
+    of identical searches costs one upstream call. Failures are never cached; that includes
+    a non-list answer, which is how TavilySearchResults reports errors instead of raising.
+
+    `stats()` reports hits, misses, coalesced waits and the upstream latency saved, using
+    the latency recorded when each cached result was fetched.
+    """
+
+    def __init__(self, cache_path: str, ttl_seconds: float = 86400):
+        self.cache_path = cache_path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock() # Guards the connection, the in-flight map and counters
+        self._in_flight = {} # key -> concurrent.futures.Future
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+        self.upstream_errors = 0
+        self.upstream_seconds = 0.0
+        self.saved_seconds = 0.0
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_results ("
+            "key TEXT PRIMARY KEY, result TEXT NOT NULL, fetched_at REAL NOT NULL, latency REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(query: str) -> str:
+        return normalize_query(query)
+
+    @staticmethod
+    def _checked(result):
+        if not isinstance(result, list):
+            raise UpstreamSearchError(f"Web search failed: {result}")
+        return result
+
+    def _lookup(self, key: str):
+        # Caller holds self._lock.
+        row = self._conn.execute(
+            "SELECT result, fetched_at, latency FROM search_results WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] + self.ttl_seconds < time.time():
+            return None
+        return json.loads(row[0]), row[2]
+
+    def _store(self, key: str, result, latency: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_results (key, result, fetched_at, latency) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(result), time.time(), latency)
+            )
+            self._conn.commit()
+
+    def _claim(self, key: str):
+        """Returns (cached_result, future, is_leader). Exactly one caller per key leads the fetch."""
+        # Store and in-flight map are checked under one lock, and _finish() stores before it
+        # unregisters, so a caller can't miss both and start a second fetch.
+        with self._lock:
+            cached = self._lookup(key)
+            if cached is not None:
+                self.hits += 1
+                self.saved_seconds += cached[1]
+                return cached[0], None, False
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return None, future, False
+            future = Future()
+            self._in_flight[key] = future
+            self.misses += 1
+            return None, future, True
+
+    def _finish(self, key: str, future: Future, result=None, error: BaseException = None, latency: float = 0.0):
+        # Store before leaving the in-flight map, so no caller can miss both and fetch again.
+        if error is None:
+            self._store(key, result, latency)
+        with self._lock:
+            self._in_flight.pop(key, None)
+            self.upstream_calls += 1
+            self.upstream_seconds += latency
+            if error is not None:
+                self.upstream_errors += 1
+        if error is None:
+            future.set_result((result, latency))
+        else:
+            future.set_exception(error)
+
+    def _record_wait(self, latency: float):
+        with self._lock:
+            self.saved_seconds += latency
+
+    def get_or_fetch(self, query: str, fetch):
+        """Returns the cached result for `query`, or calls `fetch(query)` once and caches it."""
+        key = self.make_key(query)
+        cached, future, is_leader = self._claim(key)
+        if future is None:
+            return cached
+        if not is_leader:
+            result, latency = future.result()
+            self._record_wait(latency)
+            return result
+        start = time.perf_counter()
+        try:
+            result = self._checked(fetch(query))
+        except BaseException as e:
+            self._finish(key, future, error=e, latency=time.perf_counter() - start)
+            raise
+        self._finish(key, future, result=result, latency=time.perf_counter() - start)
+        return result
+
+    async def aget_or_fetch(self, query: str, afetch):
+        """Async twin of get_or_fetch(); `afetch(query)` is awaited. Shares the in-flight map with sync callers."""
+        key = self.make_key(query)
+        # SQLite reads are local and quick, but keep them off the event loop all the same.
+        cached, future, is_leader = await asyncio.to_thread(self._claim, key)
+        if future is None:
+            return cached
+        if not is_leader:
+            result, latency = await asyncio.wrap_future(future)
+            self._record_wait(latency)
+            return result
+        start = time.perf_counter()
+        try:
+            result = self._checked(await afetch(query))
+        except BaseException as e:
+            self._finish(key, future, error=e, latency=time.perf_counter() - start)
+            raise
+        await asyncio.to_thread(self._finish, key, future, result, None, time.perf_counter() - start)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM search_results")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": ((self.hits + self.coalesced) / lookups) if lookups else 0.0,
+                "upstream_calls": self.upstream_calls,
+                "upstream_errors": self.upstream_errors,
+                "upstream_seconds": round(self.upstream_seconds, 3),
+                "saved_seconds": round(self.saved_seconds, 3),
+            }
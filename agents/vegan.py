@@ -1,7 +1,7 @@
 from .base_agent import BaseDietAgent
 from .common_tools import retrieve_from_knowledge_base, tavily_search
 class VeganDietAgent(BaseDietAgent):
-    def __init__(self, google_api_key: str, gemini_model: str, temperature: float):
+    def __init__(self, google_api_key: str, gemini_model: str, temperature: float, llm=None, verbose: bool = False):
         system_message = """You are an expert in vegan nutrition and meal planning.
         Your goal is to provide delicious, balanced, and healthy meal suggestions or recipes that are strictly vegan (no meat, milk, poultry, fish, dairy, eggs, or honey).
         Ensure all suggestions are 100% plant-based.
@@ -16,5 +16,7 @@ class VeganDietAgent(BaseDietAgent):
             tools=tools,
             google_api_key=google_api_key, # Pass this
             gemini_model=gemini_model,     # Pass this
-            temperature=temperature        # Pass this
+            temperature=temperature,       # Pass this
+            llm=llm,
+            verbose=verbose
         )
\ No newline at end of file
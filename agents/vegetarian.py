@@ -5,7 +5,7 @@ from .common_tools import retrieve_from_knowledge_base, tavily_search
 
 class VegetarianDietAgent(BaseDietAgent):
     # Add the config parameters to the __init__ signature
-    def __init__(self, google_api_key: str, gemini_model: str, temperature: float):
+    def __init__(self, google_api_key: str, gemini_model: str, temperature: float, llm=None, verbose: bool = False):
         system_message = """You are an expert vegetarian diet planning assistant.
         Provide healthy and delicious vegetarian meal ideas, recipes, and dietary advice.
         Focus on plant-based protein sources, balanced nutrition, and user preferences.
@@ -20,5 +20,7 @@ class VegetarianDietAgent(BaseDietAgent):
             tools=tools,
             google_api_key=google_api_key, # Pass this
             gemini_model=gemini_model,     # Pass this
-            temperature=temperature        # Pass this
+            temperature=temperature,       # Pass this
+            llm=llm,
+            verbose=verbose
         )
\ No newline at end of file
@@ -10,6 +10,82 @@ TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
 # LLM Configuration
 GEMINI_MODEL = "gemini-1.5-flash" 
 TEMPERATURE = 0.9 
+# Shared LLM client pool (all agents borrow the same clients and limits)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8)) # In-flight Gemini calls across all agents
+LLM_REQUESTS_PER_SECOND = float(os.getenv("LLM_REQUESTS_PER_SECOND", 2.0)) # Token bucket refill rate; set to your quota
+LLM_BURST = int(os.getenv("LLM_BURST", 4)) # Token bucket capacity
+LLM_MAX_RETRIES = 5 # Retries on 429/quota errors, with jittered exponential backoff
+# Chat history sent to agents: last N turns verbatim, older turns folded into a rolling summary
+HISTORY_MAX_TURNS = 6
+HISTORY_MAX_TOKENS = 2000 # Budget for the verbatim turns (estimated at ~4 characters per token)
+HISTORY_SUMMARY_MAX_TOKENS = 300
 
 # RAG Configuration
-VECTOR_DB_PATH = "./vector_db" # Path to store ChromaDB persistent collection
\ No newline at end of file
+EMBEDDING_MODEL = "models/embedding-001"
+VECTOR_DB_PATH = "./vector_db" # Path to store ChromaDB persistent collection
+RECIPE_PDF_PATH = "./data/recipe_pdfs" # One sub-folder per dietary type (vegetarian, vegan, non_vegetarian)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1)) # Processes used to parse and split PDFs
+EMBEDDING_CACHE_PATH = "./.cache/embeddings.sqlite3" # Kept outside vector_db so deleting the store doesn't lose it
+EMBEDDING_BATCH_SIZE = 100 # Texts per embedding request on a cache miss
+INGEST_BATCH_SIZE = 100 # Chunks embedded and written to the vector store per batch during ingestion
+INGEST_MAX_PENDING_FILES = None # PDFs parsed ahead of the embedding stage (None = twice INGEST_WORKERS)
+INGEST_CHECKPOINT_SECONDS = 30.0 # How often ingestion saves its progress; a rerun resumes from there
+INGEST_PROGRESS_SECONDS = 10.0 # How often ingestion prints files done, throughput, ETA and peak memory
+RETRIEVAL_CACHE_SIZE = 256 # Cached (query, dietary filter) retrievals kept in memory
+RETRIEVAL_CACHE_TTL_SECONDS = 600
+HYBRID_SEARCH_ENABLED = True # Fuse BM25 keyword search with vector search (exact dish/ingredient names)
+RETRIEVER_K = 4 # Chunks returned per retrieval
+HYBRID_FETCH_K = 20 # Candidates taken from each index before reciprocal rank fusion
+HYBRID_RRF_K = 60 # Reciprocal rank fusion constant; larger values flatten the rank weighting
+VECTOR_BACKEND = "chroma" # "mmap" = exact search over a memory-mapped NumPy copy of the vectors (rag/vector_index.py)
+VECTOR_INDEX_DTYPE = "float16" # Storage type of the mmap backend's vectors; "float32" doubles the size
+CONTEXT_PACKING_ENABLED = True # Dedupe, diversify and cite retrieved chunks before they reach the agent
+CONTEXT_TOKEN_BUDGET = 900 # Max tokens of knowledge base text per tool call (~4 characters per token)
+CONTEXT_MMR_LAMBDA = 0.7 # 1.0 = pure retrieval rank; lower values favour passages that add new content
+CONTEXT_DUPLICATE_THRESHOLD = 0.8 # Word 3-gram Jaccard above which a passage counts as a duplicate
+
+# Web Search Configuration
+SEARCH_CACHE_ENABLED = True # Cache Tavily results on disk and merge identical concurrent searches
+SEARCH_CACHE_PATH = "./.cache/search.sqlite3"
+SEARCH_CACHE_TTL_SECONDS = 24 * 3600 # Nutrition facts change slowly; lower this for news-like queries
+
+# Agent Tool Execution
+TOOL_MAX_WORKERS = 4 # Tool calls of one agent step run concurrently on up to this many threads
+TOOL_TIMEOUT_SECONDS = 30.0 # Default per-call timeout; a timed-out call is reported to the model, not raised
+TOOL_TIMEOUTS = {"tavily_search": 15.0, "retrieve_from_knowledge_base": 20.0} # Per-tool overrides
+
+# Speculative Retrieval Prefetch
+PREFETCH_ENABLED = True # Start knowledge base retrievals for the likely routes while the orchestrator decides
+PREFETCH_MAX_ROUTES = 4 # Routes prefetched per turn when nothing hints at the diet (most likely first)
+PREFETCH_WORKERS = 4 # Background threads for prefetching (one job per turn)
+PREFETCH_WAIT_SECONDS = 2.0 # How long a specialist waits for its prefetch before using the tool instead
+MEAL_PLAN_ENABLED = True # Build "7-day meal plan" requests as parallel per-day, per-meal sub-tasks
+MEAL_PLAN_MAX_DAYS = 7 # Longer plans are capped to this many days
+MEAL_PLAN_MAX_CONCURRENCY = 21 # Sub-tasks of one plan in flight at once (a week of three meals); the LLM pool limits still apply
+MEAL_PLAN_DEDUPE_ATTEMPTS = 1 # Times slots that repeat an earlier dish are asked again with the plan's dishes to avoid
+
+# Answer Cache Configuration
+ANSWER_CACHE_ENABLED = True # Reuse specialist answers for near-duplicate questions with the same preferences
+ANSWER_CACHE_PATH = "./.cache/answers.sqlite3"
+ANSWER_CACHE_SIZE = 1000 # Answers kept; least recently used are evicted
+ANSWER_CACHE_MIN_SIMILARITY = 0.95 # Cosine similarity between question embeddings needed for a hit
+ANSWER_CACHE_TTL_SECONDS = 7 * 24 * 3600 # General (web search) answers are never cached; knowledge base changes clear it anyway
+
+# Routing Configuration
+FAST_PATH_ROUTER_ENABLED = True # Route clear-cut queries locally instead of through the orchestrator LLM
+FAST_PATH_MIN_SIMILARITY = 0.82 # Embedding classifier: minimum cosine similarity to a route centroid
+FAST_PATH_MIN_MARGIN = 0.05 # Embedding classifier: required lead over the second-best route
+ORCHESTRATOR_MODE = "structured" # "structured": one schema-constrained call; "agent": the original tool-calling loop
+ORCHESTRATOR_REPAIR_ATTEMPTS = 1 # Structured mode: times an invalid decision is sent back for correction
+
+# Session Configuration
+SESSION_DB_PATH = "./.cache/sessions.sqlite3" # Conversation state persisted between turns and restarts
+SESSION_FLUSH_INTERVAL_SECONDS = 1.0 # Write-behind interval for the in-memory session cache
+SESSION_CACHE_SIZE = 1000 # Sessions kept in memory
+
+# Observability
+METRICS_ENABLED = True # Counters, latency histograms and per-turn traces (metrics.py); GET /metrics on the server
+METRICS_SAMPLE_RATE = float(os.getenv("METRICS_SAMPLE_RATE", 1.0)) # Fraction of turns timed and traced; counters are always kept
+METRICS_MAX_TRACES = 50 # Most recent sampled turn traces kept in memory
+METRICS_LOG_SPANS = False # Print every node/tool/LLM span as it finishes
+AGENT_VERBOSE = False # AgentExecutor step-by-step logging
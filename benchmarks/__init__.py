@@ -0,0 +1 @@
+# Offline benchmarks. Everything here runs against local stand-ins, never the real Gemini/Tavily APIs.
@@ -0,0 +1,52 @@
+# E:\Diet Chatbot\benchmarks\async_concurrency.py
+"""
+Measures how many conversations one event loop can keep in flight when every LLM call is
+stubbed to a fixed latency.
+
+    python -m benchmarks.async_concurrency --sessions 200 --latency 1.0
+"""
+import time
+import asyncio
+import argparse
+
+from langchain_core.messages import HumanMessage
+
+from agents.base_agent import BaseDietAgent
+from benchmarks.fakes import FakeChatModel
+
+
+def build_agent(latency: float) -> BaseDietAgent:
+    agent = BaseDietAgent(
+        name="Benchmark Agent",
+        system_message="You are a helpful diet assistant.",
+        tools=[],
+        google_api_key="", gemini_model="", temperature=0.0,
+        llm=FakeChatModel(latency=latency)
+    )
+    agent.agent_executor.verbose = False
+    return agent
+
+
+async def run_concurrent(agent: BaseDietAgent, sessions: int):
+    states = [{"messages": [HumanMessage(content=f"vegan breakfast idea #{i}")]} for i in range(sessions)]
+    start = time.perf_counter()
+    await asyncio.gather(*(agent.arun(state) for state in states))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=1.0, help="Stubbed seconds per LLM call")
+    args = parser.parse_args()
+
+    agent = build_agent(args.latency)
+    elapsed = asyncio.run(run_concurrent(agent, args.sessions))
+    sequential = args.sessions * args.latency
+    print(f"sessions={args.sessions} llm_latency={args.latency:.2f}s")
+    print(f"async wall clock: {elapsed:.2f}s (sequential would be ~{sequential:.0f}s)")
+    print(f"effective concurrency: {sequential / elapsed:.1f} in-flight sessions")
+
+
+if __name__ == "__main__":
+    main()
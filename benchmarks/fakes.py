@@ -0,0 +1,209 @@
+# E:\Diet Chatbot\benchmarks\fakes.py
+import re
+import json
+import time
+import asyncio
+import hashlib
+from typing import Any, List, Optional
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from agents.router import likely_diets
+from agents.prefetch import PREFETCHED_CONTEXT_HEADER
+from agents.meal_plan import SLOT_INSTRUCTIONS
+
+# Meal plan slots answer with one of these, picked by a hash of the prompt, so a week's plan
+# has some repeats for the merge to catch.
+FAKE_DISHES = ["Chickpea Curry", "Lentil Soup", "Tofu Scramble", "Quinoa Salad", "Vegetable Stir Fry",
+               "Oatmeal with Berries", "Black Bean Tacos", "Spinach Dal", "Peanut Noodles", "Mushroom Risotto",
+               "Stuffed Peppers", "Tempeh Bowl", "Minestrone", "Masala Oats", "Sweet Potato Hash",
+               "Rajma Rice", "Pasta Primavera", "Buddha Bowl", "Poha", "Veggie Wrap"]
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic stand-in for ChatGoogleGenerativeAI with a configurable per-call latency.
+    It never emits tool calls, so a tool-calling agent built on it finishes in one LLM step.
+    When streamed, `latency` is the time to first token and the reply arrives word by word.
+    Subclasses change what is said by overriding `_respond()`. Token usage is reported like
+    Gemini does, estimated at ~4 characters per token.
+    """
+
+    latency: float = 1.0
+    response: str = "Here is a simple, balanced meal suggestion."
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-latency-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _respond(self, messages: List[BaseMessage]) -> AIMessage:
+        return AIMessage(content=self.response)
+
+    @staticmethod
+    def _usage(messages: List[BaseMessage], message: AIMessage) -> dict:
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4 + 1
+        completion_tokens = (len(str(message.content)) + len(json.dumps(message.tool_calls))) // 4 + 1
+        return {"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    def _reply(self, messages: List[BaseMessage]) -> ChatResult:
+        message = self._respond(messages)
+        message.usage_metadata = self._usage(messages, message)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _chunks(self, messages: List[BaseMessage]):
+        message = self._respond(messages)
+        usage = self._usage(messages, message)
+        if message.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=usage, tool_call_chunks=[
+                {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+                for i, call in enumerate(message.tool_calls)
+            ]))
+            return
+        words = message.content.split(" ")
+        for i, word in enumerate(words):
+            # Usage arrives with the last chunk, as it does from Gemini.
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=word + " ", usage_metadata=usage if i == len(words) - 1 else None
+            ))
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return self._reply(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._reply(messages)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any):
+        time.sleep(self.latency)
+        for chunk in self._chunks(messages):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any):
+        await asyncio.sleep(self.latency)
+        for chunk in self._chunks(messages):
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+class ScriptedChatModel(FakeChatModel):
+    """
+    FakeChatModel that behaves enough like Gemini to drive the whole graph: as the
+    orchestrator it answers with RouteDecision JSON picked by keyword, and as a tool-calling
+    agent it calls one of its tools once per turn before answering, unless the input already
+    carries prefetched knowledge base results. That way load tests exercise the routing, the
+    specialists and the tools, not just one LLM call.
+    With `multi_tool_calls`, specialists ask for a knowledge base retrieval and a web search
+    in the same step, as Gemini often does.
+    """
+
+    tool_names: List[str] = []
+    multi_tool_calls: bool = False
+
+    def bind_tools(self, tools, **kwargs):
+        # Tools have a `name`; schemas bound by with_structured_output() are classes.
+        names = [getattr(tool, "name", None) or getattr(tool, "__name__", str(tool)) for tool in tools]
+        return self.model_copy(update={"tool_names": names})
+
+    def _respond(self, messages: List[BaseMessage]) -> AIMessage:
+        system = messages[0].content if messages and isinstance(messages[0], SystemMessage) else ""
+        human = [m for m in messages if isinstance(m, HumanMessage)]
+        query = human[-1].content if human else ""
+        if "central routing agent" in system:
+            diets = likely_diets(query)
+            route = diets[0] if len(diets) == 1 else "general"
+            decision = {
+                "next_agent": route,
+                "dietary_preference": route if route != "general" else None,
+                "query_for_agent": query,
+            }
+            if "RouteDecision" in self.tool_names:
+                # Structured mode: the decision comes back as a call of the schema "tool".
+                return AIMessage(content="", tool_calls=[{"name": "RouteDecision", "args": decision,
+                                                          "id": "call_route_" + str(len(messages))}])
+            return AIMessage(content=json.dumps(decision))
+        prefetched = PREFETCHED_CONTEXT_HEADER in query
+        if SLOT_INSTRUCTIONS in query and prefetched:
+            digest = int(hashlib.sha1(query.encode("utf-8")).hexdigest(), 16)
+            avoid = query.split("already in the plan:")[-1] if "already in the plan:" in query else ""
+            dishes = [dish for dish in FAKE_DISHES if dish not in avoid] or FAKE_DISHES
+            return AIMessage(content=f"{dishes[digest % len(dishes)]}\n{self.response}")
+        if self.tool_names and not prefetched and not isinstance(messages[-1], ToolMessage):
+            if "retrieve_from_knowledge_base" in self.tool_names and "general information" not in system:
+                # Specialist prompts say which filter to use, e.g. "dietary_filter='vegan'".
+                match = re.search(r"dietary_filter\s*=\s*['\"](\w+)['\"]", system)
+                diet = match.group(1) if match else ""
+                name, args = "retrieve_from_knowledge_base", {"query": query, "dietary_filter": diet}
+            else:
+                name = "tavily_search" if "tavily_search" in self.tool_names else self.tool_names[0]
+                args = {"query": query}
+            calls = [(name, args)]
+            if self.multi_tool_calls and name != "tavily_search" and "tavily_search" in self.tool_names:
+                calls.append(("tavily_search", {"query": query}))
+            return AIMessage(content="", tool_calls=[
+                {"name": name, "args": args,
+                 "id": "call_" + hashlib.sha1(f"{name}{query}{len(messages)}".encode("utf-8")).hexdigest()[:12]}
+                for name, args in calls
+            ])
+        return AIMessage(content=self.response)
+
+
+class FakeEmbeddings(DeterministicFakeEmbedding):
+    """DeterministicFakeEmbedding with a per-request latency, standing in for Gemini embeddings."""
+
+    latency: float = 0.0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return super().embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self.latency)
+        return super().embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self.latency)
+        return super().embed_query(text)
+
+
+class FakeSearchTool:
+    """
+    Local stand-in for TavilySearchResults: same invoke/ainvoke interface, a fixed per-call
+    latency and canned results. `calls` counts upstream calls, e.g. to check cache coalescing.
+    """
+
+    def __init__(self, latency: float = 0.5, results_per_query: int = 3):
+        self.latency = latency
+        self.results_per_query = results_per_query
+        self.calls = 0
+
+    def _results(self, query: str):
+        self.calls += 1
+        return [{"url": f"https://example.com/{i}", "content": f"Result {i + 1} about {query}."}
+                for i in range(self.results_per_query)]
+
+    def invoke(self, input, config=None, **kwargs):
+        time.sleep(self.latency)
+        return self._results(input["query"])
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self._results(input["query"])
@@ -0,0 +1,322 @@
+# E:\Diet Chatbot\benchmarks\load_test.py
+"""
+Replays multi-turn conversations against the compiled LangGraph `app` with Gemini chat,
+Gemini embeddings and Tavily replaced by local fakes of configurable latency, and reports
+latency percentiles per graph node, per tool, per LLM call and end to end, plus throughput
+and peak memory, as JSON.
+
+    python -m benchmarks.load_test --conversations 200 --concurrency 50 --chat-latency 0.8 --output run.json
+
+The knowledge base is built from a temporary copy of the vector store, so the repository's
+vector_db/ and .cache/ are never written to. Component build time is excluded from the timings.
+"""
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+import contextlib
+import subprocess
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from benchmarks.fakes import ScriptedChatModel, FakeEmbeddings, FakeSearchTool
+from metrics import get_metrics
+from rag.pipeline import peak_memory_mb
+
+SCHEMA_VERSION = 1
+CONVERSATIONS_PATH = os.path.join(os.path.dirname(__file__), "conversations.json")
+
+
+def percentile(sorted_values, q: float):
+    """Linear-interpolated percentile of an already sorted list (q in 0..100)."""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(samples) -> dict:
+    values = sorted(samples)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 4),
+        "p50": round(percentile(values, 50), 4),
+        "p95": round(percentile(values, 95), 4),
+        "p99": round(percentile(values, 99), 4),
+        "max": round(values[-1], 4),
+    }
+
+
+class TimingCallbackHandler(BaseCallbackHandler):
+    """Times graph nodes, tool calls and LLM calls from LangChain callback events."""
+
+    run_inline = True # Called on the event loop thread (not an executor), so timings are exact
+
+    def __init__(self, node_names):
+        self.node_names = set(node_names)
+        self._started = {} # run_id -> (kind, name, start)
+        self._lock = threading.Lock()
+        self.samples = {"nodes": {}, "tools": {}, "llm": {}}
+        self.errors = {"nodes": {}, "tools": {}, "llm": {}}
+
+    def _start(self, run_id, kind: str, name: str):
+        with self._lock:
+            self._started[run_id] = (kind, name, time.perf_counter())
+
+    def _end(self, run_id, error: bool = False):
+        with self._lock:
+            started = self._started.pop(run_id, None)
+            if started is None:
+                return
+            kind, name, start = started
+            bucket = self.errors if error else self.samples
+            bucket[kind].setdefault(name, []).append(time.perf_counter() - start)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, tags=None, metadata=None, **kwargs):
+        name = kwargs.get("name")
+        # Node runs carry a "graph:step:N" tag; inner runnables of the same name do not.
+        if name in self.node_names and any(tag.startswith("graph:step:") for tag in tags or []):
+            self._start(run_id, "nodes", name)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=True)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._start(run_id, "tools", kwargs.get("name") or (serialized or {}).get("name", "tool"))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=True)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, "llm", "chat_model")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=True)
+
+
+def configure_offline(args, workdir: str):
+    """Imports main.py and points every external dependency at a local fake."""
+    os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+    import main
+    from agents.llm_pool import LLMClientPool
+    from agents.search_cache import SearchCache
+    from agents.common_tools import set_global_search_cache, set_global_search_cache_factory
+
+    class OfflineLLMPool(LLMClientPool):
+        # Same limits and retry logic as production; only the client is swapped.
+        def get_chat_model(self, gemini_model: str, temperature: float):
+            return self.wrap(ScriptedChatModel(latency=args.chat_latency, multi_tool_calls=args.multi_tool))
+
+    vector_db = os.path.join(workdir, "vector_db")
+    if os.path.exists(main.VECTOR_DB_PATH):
+        shutil.copytree(main.VECTOR_DB_PATH, vector_db)
+    main.VECTOR_DB_PATH = vector_db # _build_knowledge_base reads this at build time
+    # Off by default so every turn exercises the agents; with --answer-cache it starts empty.
+    main.ANSWER_CACHE_ENABLED = args.answer_cache
+    main.PREFETCH_ENABLED = not args.no_prefetch
+    main.ORCHESTRATOR_MODE = args.orchestrator_mode
+    main.VECTOR_BACKEND = args.vector_backend
+    main.ANSWER_CACHE_PATH = os.path.join(workdir, "answers.sqlite3")
+    main.agent_registry.override("llm_pool", OfflineLLMPool(
+        google_api_key="offline", max_concurrency=args.llm_concurrency,
+        requests_per_second=args.llm_rps, burst=max(1, args.llm_concurrency)
+    ))
+    main.agent_registry.override("embeddings", FakeEmbeddings(size=768, latency=args.embedding_latency))
+    main.agent_registry.override("tavily", FakeSearchTool(latency=args.search_latency))
+    if args.search_cache:
+        main.agent_registry.override("search_cache", SearchCache(os.path.join(workdir, "search.sqlite3")))
+    else:
+        set_global_search_cache_factory(None)
+        set_global_search_cache(None)
+    return main
+
+
+def load_conversations(path: str, count: int):
+    with open(path, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+    return [corpus[i % len(corpus)] for i in range(count)]
+
+
+async def run_async(main, conversations, concurrency: int, callbacks):
+    semaphore = asyncio.Semaphore(concurrency)
+    turn_latencies, errors = [], []
+
+    async def converse(turns):
+        async with semaphore:
+            state = None
+            for user_input in turns:
+                start = time.perf_counter()
+                try:
+                    with get_metrics().turn():
+                        state = await main.app.ainvoke(main.new_conversation_state(user_input, state),
+                                                       config={"callbacks": callbacks})
+                    turn_latencies.append(time.perf_counter() - start)
+                except Exception as e:
+                    errors.append(f"{type(e).__name__}: {e}")
+                    return
+
+    await asyncio.gather(*(converse(turns) for turns in conversations))
+    return turn_latencies, errors
+
+
+def run_threads(main, conversations, concurrency: int, callbacks):
+    turn_latencies, errors = [], []
+    lock = threading.Lock()
+
+    def converse(turns):
+        state = None
+        for user_input in turns:
+            start = time.perf_counter()
+            try:
+                with get_metrics().turn():
+                    state = main.app.invoke(main.new_conversation_state(user_input, state),
+                                            config={"callbacks": callbacks})
+                with lock:
+                    turn_latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                with lock:
+                    errors.append(f"{type(e).__name__}: {e}")
+                return
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(converse, conversations))
+    return turn_latencies, errors
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmark(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="diet-chatbot-bench-")
+    log = io.StringIO()
+    try:
+        # The agents log every step with print(); keep stdout clean for the JSON report.
+        with contextlib.redirect_stdout(sys.stderr if args.verbose else log):
+            main = configure_offline(args, workdir)
+            # Sessions are saved by main.py/server.py, not by the graph, so the SQLite store is never built.
+            skipped = {"session_store"} | ({"search_cache"} if not args.search_cache else set()) \
+                | ({"answer_cache"} if not args.answer_cache else set()) | ({"prefetcher"} if args.no_prefetch else set())
+            build_seconds = main.warmup([name for name in main.agent_registry.names() if name not in skipped])
+            for name in main.SPECIALIST_NODES:
+                main.agent_registry.get(name).agent_executor.verbose = args.verbose
+
+            get_metrics().reset() # Drop anything recorded while building components
+            conversations = load_conversations(args.corpus, args.conversations)
+            timing = TimingCallbackHandler(("orchestrator",) + main.SPECIALIST_NODES + (main.MEAL_PLAN_NODE,))
+            if args.trace_memory:
+                tracemalloc.start()
+            start = time.perf_counter()
+            if args.mode == "async":
+                turn_latencies, errors = asyncio.run(run_async(main, conversations, args.concurrency, [timing]))
+            else:
+                turn_latencies, errors = run_threads(main, conversations, args.concurrency, [timing])
+            wall_seconds = time.perf_counter() - start
+            heap_peak = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+            if args.trace_memory:
+                tracemalloc.stop()
+
+        registry = main.agent_registry
+        return {
+            "schema_version": SCHEMA_VERSION,
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "verbose")},
+            "build_seconds": {name: round(seconds, 3) for name, seconds in build_seconds.items()},
+            "wall_seconds": round(wall_seconds, 3),
+            "turns": len(turn_latencies),
+            "errors": len(errors),
+            "error_samples": errors[:5],
+            "throughput_turns_per_s": round(len(turn_latencies) / wall_seconds, 3) if wall_seconds else None,
+            "end_to_end": summarize(turn_latencies),
+            "nodes": {name: summarize(values) for name, values in sorted(timing.samples["nodes"].items())},
+            "tools": {name: summarize(values) for name, values in sorted(timing.samples["tools"].items())},
+            "llm_calls": summarize(timing.samples["llm"].get("chat_model", [])),
+            "failed": {kind: {name: len(values) for name, values in by_name.items()}
+                       for kind, by_name in timing.errors.items() if by_name},
+            "memory": {
+                "peak_rss_mb": peak_memory_mb(), # null where the platform can't tell
+                "peak_python_heap_mb": round(heap_peak / (1024 * 1024), 1) if heap_peak is not None else None,
+            },
+            "caches": {
+                "retrieval": main.get_retrieval_cache().stats(),
+                "search": registry.get("search_cache").stats() if registry.is_built("search_cache") else None,
+                "answer": registry.get("answer_cache").stats() if registry.is_built("answer_cache") else None,
+                "prefetch": registry.get("prefetcher").stats() if registry.is_built("prefetcher") else None,
+                "fast_path_router": registry.get("fast_path_router").stats()
+                if registry.is_built("fast_path_router") else None,
+                "llm_retries": registry.get("llm_pool").retries,
+            },
+            # Counters and histograms from metrics.py: routing sources, parse failures, tokens per turn, etc.
+            "metrics": get_metrics().snapshot(),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=50, help="Conversations to replay (the corpus is cycled)")
+    parser.add_argument("--concurrency", type=int, default=10, help="Conversations in flight at once")
+    parser.add_argument("--mode", choices=["async", "threads"], default="async",
+                        help="app.ainvoke on one event loop, or app.invoke on a thread pool")
+    parser.add_argument("--corpus", default=CONVERSATIONS_PATH, help="JSON list of conversations (lists of user turns)")
+    parser.add_argument("--chat-latency", type=float, default=0.5, help="Seconds per fake Gemini chat call")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="Seconds per fake embedding request")
+    parser.add_argument("--search-latency", type=float, default=0.8, help="Seconds per fake Tavily search")
+    parser.add_argument("--llm-concurrency", type=int, default=64, help="LLM pool concurrency limit")
+    parser.add_argument("--llm-rps", type=float, default=0.0, help="LLM pool requests/second (0 = unlimited)")
+    parser.add_argument("--search-cache", action="store_true", help="Put the on-disk search cache in front of the fake")
+    parser.add_argument("--orchestrator-mode", choices=["structured", "agent"], default="structured",
+                        help="Route with one schema-constrained call or with the tool-calling agent loop")
+    parser.add_argument("--vector-backend", choices=["chroma", "mmap"], default="chroma",
+                        help="Serve dense search from Chroma or from the memory-mapped NumPy index")
+    parser.add_argument("--no-prefetch", action="store_true",
+                        help="Disable speculative retrieval, so specialists always call the tool themselves")
+    parser.add_argument("--multi-tool", action="store_true",
+                        help="Specialists request a retrieval and a web search in the same step")
+    parser.add_argument("--answer-cache", action="store_true",
+                        help="Serve repeated questions from the semantic answer cache (starts empty)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Also report the peak Python heap via tracemalloc (slows the run)")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--verbose", action="store_true", help="Show the agents' logs on stderr")
+    args = parser.parse_args()
+
+    report = json.dumps(run_benchmark(args), indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+        print(f"Wrote {args.output}", file=sys.stderr)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# E:\Diet Chatbot\benchmarks\vector_index.py
+"""
+Compares dense search through Chroma with the memory-mapped NumPy index (rag/vector_index.py):
+query latency, recall@k against exact search, and the cost of opening the store and
+answering the first query in a fresh process.
+
+    python -m benchmarks.vector_index --queries 500 --k 20
+    python -m benchmarks.vector_index --synthetic-rows 100000 --dtype float16
+
+Queries are stored vectors plus Gaussian noise, so no embedding API is needed. By default
+the partitions come from a temporary copy of vector_db/; `--synthetic-rows` fills temporary
+partitions with random vectors instead, to see how both backends scale.
+"""
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+import subprocess
+
+import numpy as np
+import chromadb
+
+from app_config import VECTOR_DB_PATH
+from benchmarks.fakes import FakeEmbeddings
+from benchmarks.load_test import summarize
+from rag.knowledge_base import KnowledgeBase, DIETARY_TYPES
+from rag.partitions import COLLECTION_PREFIX
+from rag.lexical_index import matches_filter
+from rag.vector_index import VECTOR_INDEX_DIR
+
+FILTER = {"doc_type": "recipe_book_pdf"} # What retrieve_from_knowledge_base always sends
+
+
+def fill_synthetic(vector_db: str, rows: int, dimension: int, seed: int):
+    """Random unit vectors spread over the diet partitions, with the metadata ingestion writes."""
+    rng = np.random.default_rng(seed)
+    client = chromadb.PersistentClient(path=vector_db)
+    per_partition = rows // len(DIETARY_TYPES)
+    for diet_type in DIETARY_TYPES:
+        collection = client.get_or_create_collection(COLLECTION_PREFIX + diet_type)
+        for start in range(0, per_partition, 2000):
+            count = min(2000, per_partition - start)
+            vectors = rng.standard_normal((count, dimension)).astype(np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            ids = [f"{diet_type}-{start + i}" for i in range(count)]
+            collection.upsert(
+                ids=ids, embeddings=vectors.tolist(), documents=[f"synthetic chunk {i}" for i in ids],
+                metadatas=[{"dietary_type": diet_type, "source_file": f"book_{(start + i) % 20}.pdf",
+                            "doc_type": "recipe_book_pdf" if (start + i) % 10 else "notes"}
+                           for i in range(count)]
+            )
+
+
+def make_queries(partition, count: int, noise: float, seed: int):
+    """(vector, filter) pairs: stored vectors perturbed by noise, half of them filtered."""
+    rng = np.random.default_rng(seed)
+    index = partition.vector_index
+    vectors = np.asarray(index._snapshot.vectors[rng.integers(0, len(index), count)], dtype=np.float32)
+    vectors += rng.standard_normal(vectors.shape).astype(np.float32) * noise * np.abs(vectors).mean()
+    return [(vector, FILTER if i % 2 else None) for i, vector in enumerate(vectors)]
+
+
+class ExactSearch:
+    """Ground truth: float32 brute force over everything the Chroma collection stores."""
+
+    def __init__(self, collection):
+        stored = collection.get(include=["embeddings", "metadatas"])
+        self.ids = stored["ids"]
+        self.matrix = np.asarray(stored["embeddings"], dtype=np.float32)
+        self.metadatas = stored["metadatas"]
+
+    def top_k(self, vector, k: int, filter):
+        distances = ((self.matrix - vector) ** 2).sum(axis=1)
+        if filter:
+            allowed = np.array([matches_filter(metadata or {}, filter) for metadata in self.metadatas])
+            distances = np.where(allowed, distances, np.inf)
+        order = np.argsort(distances, kind="stable")[:k]
+        return [self.ids[i] for i in order if np.isfinite(distances[i])]
+
+
+def recall(found, expected) -> float:
+    return len(set(found) & set(expected)) / len(expected) if expected else 1.0
+
+
+def probe_first_query(vector_db: str, backend: str, diet_type: str, dimension: int, k: int) -> float:
+    """Seconds to open one partition and answer one query, measured in a fresh process."""
+    code = (
+        "import sys, time, numpy as np, chromadb\n"
+        "from rag.vector_index import MmapVectorIndex\n"
+        "path, backend, diet, index_dir = sys.argv[1:5]\n"
+        "dimension, k = int(sys.argv[5]), int(sys.argv[6])\n"
+        "start = time.perf_counter()\n"
+        "if backend == 'chroma':\n"
+        "    collection = chromadb.PersistentClient(path=path).get_collection('" + COLLECTION_PREFIX + "' + diet)\n"
+        "    collection.query(query_embeddings=[np.ones(dimension).tolist()], n_results=k)\n"
+        "else:\n"
+        "    MmapVectorIndex(index_dir, diet).search(np.ones(dimension, dtype=np.float32), k)\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code, vector_db, backend, diet_type, os.path.join(vector_db, VECTOR_INDEX_DIR),
+         str(dimension), str(k)],
+        capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    return round(float(result.stdout.strip().splitlines()[-1]), 4)
+
+
+def run_benchmark(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="diet-chatbot-vector-bench-")
+    vector_db = os.path.join(workdir, "vector_db")
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(sys.stderr if args.verbose else log):
+            if args.synthetic_rows:
+                fill_synthetic(vector_db, args.synthetic_rows, args.dimension, args.seed)
+            elif os.path.exists(args.vector_db):
+                shutil.copytree(args.vector_db, vector_db)
+            knowledge_base = KnowledgeBase(
+                embedding_model_name="benchmark", google_api_key="offline", vector_db_path=vector_db,
+                pdf_base_dir=os.path.join(workdir, "pdfs"), sync_on_startup=False,
+                embeddings=FakeEmbeddings(size=args.dimension, latency=0.0),
+                vector_backend="mmap", vector_index_dtype=args.dtype
+            )
+            build_start = time.perf_counter()
+            for partition in knowledge_base.partitions.values():
+                partition.rebuild_vector_index()
+            build_seconds = time.perf_counter() - build_start
+
+        partitions = [p for p in knowledge_base.partitions.values() if len(p.vector_index)]
+        if not partitions:
+            raise SystemExit("The knowledge base is empty; ingest some PDFs or pass --synthetic-rows.")
+        latencies = {"chroma": [], "mmap": []}
+        recalls = {"chroma": [], "mmap": []}
+        for offset, partition in enumerate(partitions):
+            collection = partition.vectorstore._collection
+            k = min(args.k, len(partition.vector_index))
+            exact = ExactSearch(collection)
+            queries = make_queries(partition, max(1, args.queries // len(partitions)), args.noise, args.seed + offset)
+            for vector, filter in queries:
+                expected = exact.top_k(vector, k, filter)
+                start = time.perf_counter()
+                result = collection.query(query_embeddings=[vector.tolist()], n_results=k, include=["distances"],
+                                          **({"where": filter} if filter else {}))
+                latencies["chroma"].append(time.perf_counter() - start)
+                recalls["chroma"].append(recall(result["ids"][0], expected))
+                start = time.perf_counter()
+                result = partition.vector_index.search(vector, k, filter)
+                latencies["mmap"].append(time.perf_counter() - start)
+                recalls["mmap"].append(recall([chunk_id for chunk_id, _ in result], expected))
+
+        index_dir = os.path.join(vector_db, VECTOR_INDEX_DIR)
+        largest = max(partitions, key=lambda partition: len(partition.vector_index))
+        dimension = int(largest.vector_index._snapshot.vectors.shape[1])
+        return {
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "verbose")},
+            "rows": sum(len(p.vector_index) for p in partitions),
+            "dimension": dimension,
+            "index_build_seconds": round(build_seconds, 3),
+            "index_megabytes": round(sum(os.path.getsize(os.path.join(index_dir, name))
+                                         for name in os.listdir(index_dir)) / (1024 * 1024), 2),
+            "query_seconds": {backend: summarize(values) for backend, values in latencies.items()},
+            "recall_at_k": {backend: round(float(np.mean(values)), 4) for backend, values in recalls.items()},
+            # Opening the store and answering one query in a new process, on the largest partition.
+            "first_query_seconds": {backend: probe_first_query(vector_db, backend, largest.diet_type, dimension, args.k)
+                                    for backend in ("chroma", "mmap")},
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chroma vs memory-mapped NumPy dense search")
+    parser.add_argument("--vector-db", default=VECTOR_DB_PATH, help="Store to copy (ignored with --synthetic-rows)")
+    parser.add_argument("--synthetic-rows", type=int, default=0, help="Benchmark random vectors instead")
+    parser.add_argument("--dimension", type=int, default=768, help="Vector size for --synthetic-rows and the fake embedder")
+    parser.add_argument("--dtype", choices=["float16", "float32"], default="float16")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=20, help="Neighbours per query (HYBRID_FETCH_K in the app)")
+    parser.add_argument("--noise", type=float, default=0.3, help="Query perturbation, relative to the mean |component|")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--verbose", action="store_true", help="Show the knowledge base logs on stderr")
+    args = parser.parse_args()
+
+    report = json.dumps(run_benchmark(args), indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
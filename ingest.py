@@ -0,0 +1,89 @@
+# E:\Diet Chatbot\ingest.py
+"""
+Builds or updates the knowledge base from the recipe PDFs, without starting the chatbot.
+
+    python ingest.py                     # sync every diet with data/recipe_pdfs
+    python ingest.py --diet vegan        # only the vegan partition
+    python ingest.py --rebuild vegan     # drop the vegan partition and re-ingest it
+
+PDFs stream through parse -> split -> embed -> write with bounded look-ahead, so memory
+stays flat for large libraries. Progress is printed every --progress-seconds and saved
+every --checkpoint-seconds. Rerunning after a crash or Ctrl+C resumes where it stopped
+without re-embedding chunks that were already written.
+"""
+import sys
+import json
+import argparse
+
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+from app_config import GOOGLE_API_KEY, VECTOR_DB_PATH, RECIPE_PDF_PATH, INGEST_WORKERS
+from app_config import EMBEDDING_MODEL, EMBEDDING_CACHE_PATH, EMBEDDING_BATCH_SIZE
+from app_config import INGEST_BATCH_SIZE, INGEST_MAX_PENDING_FILES, INGEST_CHECKPOINT_SECONDS, INGEST_PROGRESS_SECONDS
+from app_config import VECTOR_BACKEND, VECTOR_INDEX_DTYPE
+from rag.knowledge_base import KnowledgeBase, DIETARY_TYPES, VECTOR_BACKENDS
+from rag.embedding_cache import CachedEmbeddings
+
+
+def build_knowledge_base(args, embeddings=None) -> KnowledgeBase:
+    if embeddings is None:
+        # Same cached embeddings as the chatbot, so vectors computed here are reused there.
+        embeddings = CachedEmbeddings(
+            GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL, google_api_key=GOOGLE_API_KEY),
+            model_name=EMBEDDING_MODEL, cache_path=EMBEDDING_CACHE_PATH, batch_size=EMBEDDING_BATCH_SIZE
+        )
+    return KnowledgeBase(
+        embedding_model_name=EMBEDDING_MODEL,
+        google_api_key=GOOGLE_API_KEY,
+        vector_db_path=args.vector_db,
+        pdf_base_dir=args.pdf_dir,
+        sync_on_startup=False,
+        ingest_workers=args.workers,
+        embeddings=embeddings,
+        ingest_batch_size=args.batch_size,
+        ingest_max_pending_files=args.max_pending_files,
+        checkpoint_seconds=args.checkpoint_seconds,
+        progress_seconds=args.progress_seconds,
+        vector_backend=args.vector_backend,
+        vector_index_dtype=VECTOR_INDEX_DTYPE
+    )
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Index recipe PDFs into the Diet Chatbot knowledge base")
+    parser.add_argument("--diet", action="append", choices=DIETARY_TYPES,
+                        help="Only sync this dietary type (repeatable); default: all")
+    parser.add_argument("--rebuild", choices=DIETARY_TYPES, default=None,
+                        help="Drop this partition and re-ingest its PDFs")
+    parser.add_argument("--pdf-dir", default=RECIPE_PDF_PATH)
+    parser.add_argument("--vector-db", default=VECTOR_DB_PATH)
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="PDF parsing processes")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE,
+                        help="Chunks per embedding call and vector store write")
+    parser.add_argument("--max-pending-files", type=int, default=INGEST_MAX_PENDING_FILES,
+                        help="PDFs parsed ahead of the embedding stage")
+    parser.add_argument("--checkpoint-seconds", type=float, default=INGEST_CHECKPOINT_SECONDS)
+    parser.add_argument("--progress-seconds", type=float, default=INGEST_PROGRESS_SECONDS)
+    parser.add_argument("--vector-backend", choices=VECTOR_BACKENDS, default=VECTOR_BACKEND,
+                        help="'mmap' also refreshes the memory-mapped vector index after the sync")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    knowledge_base = build_knowledge_base(args)
+    try:
+        if args.rebuild:
+            stats = knowledge_base.rebuild_partition(args.rebuild)
+        else:
+            stats = knowledge_base.sync(diet_types=args.diet)
+    except KeyboardInterrupt:
+        knowledge_base.checkpoint()
+        print("Interrupted; progress saved. Run the same command again to resume.")
+        return 130
+    print(json.dumps({"stats": stats, "progress": knowledge_base.last_sync_progress}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
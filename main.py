@@ -1,8 +1,12 @@
 # E:\Diet Chatbot\main.py
 import json
+import asyncio
 import operator
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Tuple, Annotated, TypedDict
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from langchain_core.runnables import RunnableLambda
 
 # Import from your top-level app_config
 from app_config import GOOGLE_API_KEY, GEMINI_MODEL, TEMPERATURE, VECTOR_DB_PATH, TAVILY_API_KEY
@@ -14,10 +18,13 @@ from agents.non_vegetarian import NonVegetarianDietAgent
 from agents.vegan import VeganDietAgent
 from agents.base_agent import BaseDietAgent # Used for the general agent
 from agents.common_tools import tavily_search, retrieve_from_knowledge_base
+from agents.router import FastPathRouter, likely_diets, detect_allergies, follow_up_signals
 
 # Import RAG components
 from rag.knowledge_base import KnowledgeBase # <--- ADDED: Need to import KnowledgeBase here to initialize it
 from rag.retriever import set_rag_retriever # Only need set_rag_retriever here
+from rag.embedding_cache import CachedEmbeddings
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
 
 from langgraph.graph import StateGraph, END
 import os
@@ -28,32 +35,38 @@ import os
 # ... (other imports) ...
 
 # Import common_tools setters
-from agents.common_tools import set_global_rag_retriever, set_global_tavily_tool # <--- ADD THIS IMPORT
+from agents.common_tools import set_global_rag_retriever, set_global_tavily_tool, get_retrieval_cache # <--- ADD THIS IMPORT
+from agents.common_tools import set_global_rag_retriever_factory, set_global_tavily_tool_factory
+from agents.common_tools import retrieval_exclusions, set_global_search_cache, set_global_search_cache_factory
+from agents.search_cache import SearchCache
+from agents.answer_cache import SemanticAnswerCache, is_context_dependent
+from agents.prefetch import RetrievalPrefetcher, PREFETCHED_CONTEXT_HEADER
+from agents.meal_plan import MealPlanner, parse_meal_plan_request
+from agents.common_tools import retrieve_for_prefetch, format_retrieved_docs, exclusion_key
+from agents.registry import AgentRegistry
+from agents.llm_pool import LLMClientPool
+from agents.history import HistoryManager, make_llm_summarizer, ROUTING_MESSAGE_NAME
+from session_store import SessionStore
 
 # Import TavilySearchResults here to initialize it
 from langchain_community.tools.tavily_search import TavilySearchResults # <--- ADD THIS IMPORT
-from app_config import GOOGLE_API_KEY, GEMINI_MODEL, TEMPERATURE, VECTOR_DB_PATH, TAVILY_API_KEY
-
-
-# --- Initialize RAG Knowledge Base and Retriever ---
-print("Initializing knowledge base (this may take a while the first time)...")
-knowledge_base_instance = KnowledgeBase(
-    embedding_model_name="models/embedding-001",
-    google_api_key=GOOGLE_API_KEY,
-    vector_db_path=VECTOR_DB_PATH
-)
-# Set the RAG retriever for common_tools
-set_global_rag_retriever(knowledge_base_instance.get_retriever()) # <--- ADD THIS LINE
-print("Knowledge base ready!")
-
-# --- Initialize Tavily Tool ---
-if TAVILY_API_KEY:
-    tavily_tool_instance = TavilySearchResults(api_key=TAVILY_API_KEY)
-    set_global_tavily_tool(tavily_tool_instance) # <--- ADD THIS LINE
-    print("Tavily search tool ready!")
-else:
-    print("TAVILY_API_KEY not set. Tavily search will not be available.")
-
+from app_config import GOOGLE_API_KEY, GEMINI_MODEL, TEMPERATURE, VECTOR_DB_PATH, TAVILY_API_KEY, RECIPE_PDF_PATH, INGEST_WORKERS
+from app_config import EMBEDDING_MODEL, EMBEDDING_CACHE_PATH, EMBEDDING_BATCH_SIZE
+from app_config import INGEST_BATCH_SIZE, INGEST_MAX_PENDING_FILES, INGEST_CHECKPOINT_SECONDS, INGEST_PROGRESS_SECONDS
+from app_config import VECTOR_BACKEND, VECTOR_INDEX_DTYPE
+from app_config import HYBRID_SEARCH_ENABLED, RETRIEVER_K, HYBRID_FETCH_K, HYBRID_RRF_K
+from app_config import FAST_PATH_ROUTER_ENABLED, FAST_PATH_MIN_SIMILARITY, FAST_PATH_MIN_MARGIN
+from app_config import ORCHESTRATOR_MODE, ORCHESTRATOR_REPAIR_ATTEMPTS
+from app_config import LLM_MAX_CONCURRENCY, LLM_REQUESTS_PER_SECOND, LLM_BURST, LLM_MAX_RETRIES
+from app_config import HISTORY_MAX_TURNS, HISTORY_MAX_TOKENS, HISTORY_SUMMARY_MAX_TOKENS
+from app_config import SESSION_DB_PATH, SESSION_FLUSH_INTERVAL_SECONDS, SESSION_CACHE_SIZE
+from app_config import SEARCH_CACHE_ENABLED, SEARCH_CACHE_PATH, SEARCH_CACHE_TTL_SECONDS
+from app_config import ANSWER_CACHE_ENABLED, ANSWER_CACHE_PATH, ANSWER_CACHE_SIZE, ANSWER_CACHE_MIN_SIMILARITY
+from app_config import ANSWER_CACHE_TTL_SECONDS
+from app_config import PREFETCH_ENABLED, PREFETCH_MAX_ROUTES, PREFETCH_WORKERS, PREFETCH_WAIT_SECONDS
+from app_config import MEAL_PLAN_ENABLED, MEAL_PLAN_MAX_DAYS, MEAL_PLAN_MAX_CONCURRENCY, MEAL_PLAN_DEDUPE_ATTEMPTS
+from app_config import METRICS_ENABLED, METRICS_SAMPLE_RATE, METRICS_MAX_TRACES, METRICS_LOG_SPANS, AGENT_VERBOSE
+from metrics import MetricsRegistry, set_global_metrics, get_metrics, traced
 
 
 # Define the state for LangGraph
@@ -65,43 +78,336 @@ class AgentState(TypedDict):
     meal_type: str
     next_agent_route: str
     query_for_next_agent: str
+    prefetch_id: str # Batch of speculative retrievals started for this turn (see agents/prefetch.py)
+    meal_plan_request: dict # {"days", "meal_types"} when the turn asks for a multi-day plan (see agents/meal_plan.py)
+    route_source: str # How the route was decided: "session", "fast_path" or "llm"
+
+# Node, tool and LLM timings, token counts and routing outcomes (see metrics.py)
+set_global_metrics(MetricsRegistry(enabled=METRICS_ENABLED, sample_rate=METRICS_SAMPLE_RATE,
+                                   max_traces=METRICS_MAX_TRACES, log_spans=METRICS_LOG_SPANS))
+
+# --- Component registry ---
+# Nothing below is built at import time. Each factory runs once, the first time its component is
+# needed (or from warmup()), so agents that are never routed to cost nothing.
+agent_registry = AgentRegistry()
+
+
+def _build_embeddings():
+    backend = GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL, google_api_key=GOOGLE_API_KEY)
+    return CachedEmbeddings(backend, model_name=EMBEDDING_MODEL, cache_path=EMBEDDING_CACHE_PATH,
+                            batch_size=EMBEDDING_BATCH_SIZE)
+
+
+def _build_knowledge_base():
+    print("Initializing knowledge base (this may take a while the first time)...")
+    knowledge_base_instance = KnowledgeBase(
+        embedding_model_name=EMBEDDING_MODEL,
+        google_api_key=GOOGLE_API_KEY,
+        vector_db_path=VECTOR_DB_PATH,
+        pdf_base_dir=RECIPE_PDF_PATH,
+        ingest_workers=INGEST_WORKERS,
+        embeddings=agent_registry.get("embeddings"), # Already cached on disk, so no embedding_cache_path here
+        hybrid_search=HYBRID_SEARCH_ENABLED,
+        retriever_k=RETRIEVER_K,
+        hybrid_fetch_k=HYBRID_FETCH_K,
+        rrf_k=HYBRID_RRF_K,
+        ingest_batch_size=INGEST_BATCH_SIZE,
+        ingest_max_pending_files=INGEST_MAX_PENDING_FILES,
+        checkpoint_seconds=INGEST_CHECKPOINT_SECONDS,
+        progress_seconds=INGEST_PROGRESS_SECONDS,
+        vector_backend=VECTOR_BACKEND,
+        vector_index_dtype=VECTOR_INDEX_DTYPE
+    )
+    # Drop cached retrievals whenever a re-ingest changes the store
+    knowledge_base_instance.add_change_listener(get_retrieval_cache().clear)
+    print("Knowledge base ready!")
+    return knowledge_base_instance
+
+
+def _build_tavily_tool():
+    if not TAVILY_API_KEY:
+        print("TAVILY_API_KEY not set. Tavily search will not be available.")
+        return None
+    print("Tavily search tool ready!")
+    return TavilySearchResults(api_key=TAVILY_API_KEY)
+
+
+def _build_search_cache():
+    return SearchCache(SEARCH_CACHE_PATH, ttl_seconds=SEARCH_CACHE_TTL_SECONDS)
+
+
+def _build_answer_cache():
+    knowledge_base = agent_registry.get("knowledge_base")
+    answer_cache = SemanticAnswerCache(
+        embeddings=agent_registry.get("embeddings"),
+        cache_path=ANSWER_CACHE_PATH,
+        max_entries=ANSWER_CACHE_SIZE,
+        min_similarity=ANSWER_CACHE_MIN_SIMILARITY,
+        ttl_seconds=ANSWER_CACHE_TTL_SECONDS
+    )
+    # Answers from before a re-ingest (in this process or an earlier one) are dropped.
+    answer_cache.set_knowledge_version(knowledge_base.version())
+    knowledge_base.add_change_listener(lambda: answer_cache.set_knowledge_version(knowledge_base.version()))
+    return answer_cache
+
+
+# Knowledge base partition each route retrieves from; the general agent searches them all.
+ROUTE_DIETARY_FILTERS = {"vegetarian": "vegetarian", "non_vegetarian": "non_vegetarian", "vegan": "vegan",
+                         "general": ""}
+
+
+# The general agent answers from live web search, which the answer cache would serve for days.
+UNCACHED_ANSWER_ROUTES = {"general"}
+
+
+# Agent class behind each route, for what is known about it before it is built.
+ROUTE_AGENT_CLASSES = {"vegetarian": VegetarianDietAgent, "non_vegetarian": NonVegetarianDietAgent,
+                       "vegan": VeganDietAgent, "general": BaseDietAgent}
+
+
+def _prefetch_retrieve(query: str, route: str, allergies):
+    # Filtered exactly as the route's specialist will be, so the result can be handed over as is,
+    # but from the class: building up to four agents just to speculate would cost more than it saves.
+    exclusions = ROUTE_AGENT_CLASSES[route].default_exclusions({"allergies": allergies})
+    return retrieve_for_prefetch(query, ROUTE_DIETARY_FILTERS[route], exclusions)
 
-# Initialize agents, PASSING CONFIG VARIABLES
-orchestrator = OrchestratorAgent(
-    google_api_key=GOOGLE_API_KEY, gemini_model=GEMINI_MODEL, temperature=TEMPERATURE
-)
-vegetarian_agent = VegetarianDietAgent(
-    google_api_key=GOOGLE_API_KEY, gemini_model=GEMINI_MODEL, temperature=TEMPERATURE
-)
-non_vegetarian_agent = NonVegetarianDietAgent(
-    google_api_key=GOOGLE_API_KEY, gemini_model=GEMINI_MODEL, temperature=TEMPERATURE
-)
-vegan_agent = VeganDietAgent(
-    google_api_key=GOOGLE_API_KEY, gemini_model=GEMINI_MODEL, temperature=TEMPERATURE
-)
 
+def _build_prefetcher():
+    return RetrievalPrefetcher(
+        retrieve=_prefetch_retrieve,
+        warm=agent_registry.get("embeddings").embed_query, # Embedded once, then cached for every route
+        max_workers=PREFETCH_WORKERS,
+        wait_seconds=PREFETCH_WAIT_SECONDS
+    )
+
+
+def _build_meal_planner():
+    return MealPlanner(max_concurrency=MEAL_PLAN_MAX_CONCURRENCY, dedupe_attempts=MEAL_PLAN_DEDUPE_ATTEMPTS)
+
+
+def _build_fast_path_router():
+    # Clear-cut queries ("vegan dinner for weight loss", "chicken recipes") are routed locally and
+    # skip the orchestrator LLM. It shares the knowledge base's (cached) embeddings.
+    return FastPathRouter(
+        embeddings=agent_registry.get("embeddings"),
+        min_similarity=FAST_PATH_MIN_SIMILARITY,
+        min_margin=FAST_PATH_MIN_MARGIN
+    )
+
+
+def _build_llm_pool():
+    return LLMClientPool(
+        google_api_key=GOOGLE_API_KEY,
+        max_concurrency=LLM_MAX_CONCURRENCY,
+        requests_per_second=LLM_REQUESTS_PER_SECOND,
+        burst=LLM_BURST,
+        max_retries=LLM_MAX_RETRIES
+    )
+
+
+def _shared_llm():
+    # Every agent borrows the same pooled client instead of opening its own.
+    return agent_registry.get("llm_pool").get_chat_model(GEMINI_MODEL, TEMPERATURE)
+
+
+def _build_history_manager():
+    return HistoryManager(
+        summarizer=make_llm_summarizer(_shared_llm(), max_tokens=HISTORY_SUMMARY_MAX_TOKENS),
+        max_turns=HISTORY_MAX_TURNS,
+        max_tokens=HISTORY_MAX_TOKENS
+    )
+
+
+def _build_session_store():
+    return SessionStore(SESSION_DB_PATH, flush_interval=SESSION_FLUSH_INTERVAL_SECONDS,
+                        max_cached_sessions=SESSION_CACHE_SIZE)
+
+
+agent_registry.register("llm_pool", _build_llm_pool)
+agent_registry.register("session_store", _build_session_store)
+agent_registry.register("history_manager", _build_history_manager)
+agent_registry.register("embeddings", _build_embeddings)
+agent_registry.register("knowledge_base", _build_knowledge_base)
+agent_registry.register("tavily", _build_tavily_tool)
+agent_registry.register("search_cache", _build_search_cache)
+agent_registry.register("answer_cache", _build_answer_cache)
+agent_registry.register("fast_path_router", _build_fast_path_router)
+agent_registry.register("prefetcher", _build_prefetcher)
+agent_registry.register("meal_planner", _build_meal_planner)
+
+# Initialize agents, PASSING CONFIG VARIABLES
+agent_registry.register("orchestrator", lambda: OrchestratorAgent(
+    google_api_key=GOOGLE_API_KEY, gemini_model=GEMINI_MODEL, temperature=TEMPERATURE, llm=_shared_llm(),
+    verbose=AGENT_VERBOSE, mode=ORCHESTRATOR_MODE, repair_attempts=ORCHESTRATOR_REPAIR_ATTEMPTS
+))
+agent_registry.register("vegetarian", lambda: VegetarianDietAgent(
+    google_api_key=GOOGLE_API_KEY, gemini_model=GEMINI_MODEL, temperature=TEMPERATURE, llm=_shared_llm(),
+    verbose=AGENT_VERBOSE
+))
+agent_registry.register("non_vegetarian", lambda: NonVegetarianDietAgent(
+    google_api_key=GOOGLE_API_KEY, gemini_model=GEMINI_MODEL, temperature=TEMPERATURE, llm=_shared_llm(),
+    verbose=AGENT_VERBOSE
+))
+agent_registry.register("vegan", lambda: VeganDietAgent(
+    google_api_key=GOOGLE_API_KEY, gemini_model=GEMINI_MODEL, temperature=TEMPERATURE, llm=_shared_llm(),
+    verbose=AGENT_VERBOSE
+))
 # A "general" agent for fallback or general queries
-general_agent = BaseDietAgent(
+agent_registry.register("general", lambda: BaseDietAgent(
     name="General Diet Agent",
     system_message="You are a helpful diet assistant providing general information and advice. Use your tools to find answers.",
     tools=[tavily_search, retrieve_from_knowledge_base],
-    google_api_key=GOOGLE_API_KEY, gemini_model=GEMINI_MODEL, temperature=TEMPERATURE # Pass configs here too
-)
+    google_api_key=GOOGLE_API_KEY, gemini_model=GEMINI_MODEL, temperature=TEMPERATURE, # Pass configs here too
+    llm=_shared_llm(), verbose=AGENT_VERBOSE
+))
+
+# The shared tools pull the retriever and Tavily client from the registry on first use
+set_global_rag_retriever_factory(lambda: agent_registry.get("knowledge_base").get_retriever())
+set_global_tavily_tool_factory(lambda: agent_registry.get("tavily"))
+if SEARCH_CACHE_ENABLED:
+    set_global_search_cache_factory(lambda: agent_registry.get("search_cache"))
+
+
+async def _aget_component(name: str):
+    # The first build constructs LLM clients (and possibly the knowledge base); keep it off the event loop.
+    if agent_registry.is_built(name):
+        return agent_registry.get(name)
+    return await asyncio.to_thread(agent_registry.get, name)
+
+
+def get_fast_path_router():
+    return agent_registry.get("fast_path_router") if FAST_PATH_ROUTER_ENABLED else None
+
+
+def warmup(names=None):
+    """Builds registered components ahead of the first request. Returns seconds spent per component."""
+    build_seconds = agent_registry.warmup(names)
+    # Resolve the tools' lazy factories too, so the first retrieval doesn't pay for them.
+    if names is None or "knowledge_base" in names:
+        set_global_rag_retriever(agent_registry.get("knowledge_base").get_retriever())
+    if names is None or "tavily" in names:
+        set_global_tavily_tool(agent_registry.get("tavily"))
+    if SEARCH_CACHE_ENABLED and (names is None or "search_cache" in names):
+        set_global_search_cache(agent_registry.get("search_cache"))
+    return build_seconds
+
 
 # E:\Diet Chatbot\main.py
 
 
 # --- Define Nodes ---
+def _prefetch_plan(state: AgentState, user_message: str):
+    """Routes worth retrieving for before routing is decided, most likely first, and the allergies to filter by."""
+    routes = likely_diets(user_message)
+    if state.get("dietary_preference") in ROUTE_DIETARY_FILTERS:
+        routes.append(state["dietary_preference"])
+    if not routes:
+        # No hint at all: the orchestrator may pick anything, starting with a general answer.
+        routes = ["general", "vegetarian", "vegan", "non_vegetarian"]
+    # Same rule as _route_to_agent(): allergies stated now add to the ones known from earlier turns.
+    allergies = _merge_allergies(state.get("allergies"), detect_allergies(user_message.lower()))
+    return list(dict.fromkeys(routes))[:PREFETCH_MAX_ROUTES], allergies
+
+
+def _start_prefetch(prefetcher, state: AgentState) -> str:
+    user_message = state["messages"][-1].content
+    routes, allergies = _prefetch_plan(state, user_message)
+    return prefetcher.start(user_message, routes, allergies)
+
+
+def _detect_meal_plan(state: AgentState, routed: dict):
+    # The orchestrator still picks the specialist; a plan request only changes how it is run.
+    # It needs a settled diet: a turn routed to "general" without a preference is the orchestrator
+    # asking which diet (the clarification branch never returns one), and a plan must not replace that.
+    if not MEAL_PLAN_ENABLED:
+        return {}
+    if routed.get("next_agent_route") not in ("vegetarian", "vegan", "non_vegetarian") \
+            and not routed.get("dietary_preference"):
+        return {}
+    return parse_meal_plan_request(state["messages"][-1].content, max_days=MEAL_PLAN_MAX_DAYS) or {}
+
+
+@traced("node", node="orchestrator")
 def call_orchestrator(state: AgentState):
-    print("\n--- Calling Orchestrator ---")
+    # Retrieval for the likely routes runs in the background while the route is decided.
+    prefetch_id = _start_prefetch(agent_registry.get("prefetcher"), state) if PREFETCH_ENABLED else ""
+    routed = _route_turn(state)
+    return {**routed, "prefetch_id": prefetch_id, "meal_plan_request": _detect_meal_plan(state, routed)}
+
+
+@traced("node", node="orchestrator")
+async def acall_orchestrator(state: AgentState):
+    prefetch_id = _start_prefetch(await _aget_component("prefetcher"), state) if PREFETCH_ENABLED else ""
+    routed = await _aroute_turn(state)
+    return {**routed, "prefetch_id": prefetch_id, "meal_plan_request": _detect_meal_plan(state, routed)}
+
+
+def _route_turn(state: AgentState):
     user_message = state["messages"][-1].content
-    orchestrator_input_state = {"input": user_message, "chat_history": state["messages"][:-1]}
 
+    # The stored preference goes first, so a vague follow-up can't be re-routed by a weak match.
+    known_decision = _known_preference_decision(state, user_message)
+    if known_decision is not None:
+        get_metrics().incr("route_decisions_total", source="session")
+        return {**_route_to_agent(state, known_decision), "route_source": "session"}
+
+    fast_path_router = get_fast_path_router()
+    if fast_path_router is not None:
+        fast_decision = fast_path_router.route(user_message, explicit_only=_has_known_preference(state))
+        if fast_decision is not None:
+            get_metrics().incr("route_decisions_total", source="fast_path")
+            return {**_route_to_agent(state, fast_decision), "route_source": "fast_path"}
+
+    chat_history = agent_registry.get("history_manager").window(state["messages"][:-1])
+    orchestrator = agent_registry.get("orchestrator")
+    get_metrics().incr("route_decisions_total", source="llm")
+    if orchestrator.structured:
+        # One schema-constrained call; the decision arrives validated.
+        decision = orchestrator.route(user_message, chat_history)
+        return {**_apply_route_decision(state, decision), "route_source": "llm"}
+
+    orchestrator_input_state = {"input": user_message, "chat_history": chat_history}
     orchestrator_result = orchestrator.agent_executor.invoke(orchestrator_input_state)
-    raw_llm_output_content = orchestrator_result['output'] # This can be a dict, string with JSON, or plain string
+    return {**_handle_orchestrator_output(state, orchestrator_result['output']), "route_source": "llm"}
+
+
+async def _aroute_turn(state: AgentState):
+    user_message = state["messages"][-1].content
 
+    known_decision = _known_preference_decision(state, user_message)
+    if known_decision is not None:
+        get_metrics().incr("route_decisions_total", source="session")
+        return {**_route_to_agent(state, known_decision), "route_source": "session"}
+
+    fast_path_router = await _aget_component("fast_path_router") if FAST_PATH_ROUTER_ENABLED else None
+    if fast_path_router is not None:
+        # The lexicon path is pure Python, but the embedding fallback may hit the network.
+        fast_decision = await asyncio.to_thread(fast_path_router.route, user_message,
+                                                _has_known_preference(state))
+        if fast_decision is not None:
+            get_metrics().incr("route_decisions_total", source="fast_path")
+            return {**_route_to_agent(state, fast_decision), "route_source": "fast_path"}
+
+    history_manager = await _aget_component("history_manager")
+    # Windowing may call the summarizer LLM, which is sync; run it off the event loop.
+    chat_history = await asyncio.to_thread(history_manager.window, state["messages"][:-1])
+    orchestrator = await _aget_component("orchestrator")
+    get_metrics().incr("route_decisions_total", source="llm")
+    if orchestrator.structured:
+        decision = await orchestrator.aroute(user_message, chat_history)
+        return {**_apply_route_decision(state, decision), "route_source": "llm"}
+
+    orchestrator_input_state = {"input": user_message, "chat_history": chat_history}
+    orchestrator_result = await orchestrator.agent_executor.ainvoke(orchestrator_input_state)
+    return {**_handle_orchestrator_output(state, orchestrator_result['output']), "route_source": "llm"}
+
+
+def _handle_orchestrator_output(state: AgentState, raw_llm_output_content):
+    # Only used in the "agent" orchestrator mode; "structured" mode returns a RouteDecision directly.
+    # raw_llm_output_content can be a dict, string with JSON, or plain string
     decision = None
     parsed_successfully = False
+    metrics = get_metrics()
 
     # First, try to parse it directly as JSON if it's a string, removing markdown wrappers
     if isinstance(raw_llm_output_content, str):
@@ -117,13 +423,13 @@ def call_orchestrator(state: AgentState):
             raw_output_dict = json.loads(json_string)
             decision = RouteDecision(**raw_output_dict)
             parsed_successfully = True
-            print(f"Orchestrator parsed decision (from string JSON): {decision}")
         except json.JSONDecodeError:
             # If it's a string but not valid JSON after stripping, treat as plain text
-            print(f"Orchestrator returned plain string (not valid JSON): {raw_llm_output_content}")
+            metrics.incr("orchestrator_parse_failures_total", kind="not_json")
             decision = RouteDecision(next_agent="general", query_for_agent=raw_llm_output_content)
             parsed_successfully = True # Successfully handled as plain string
         except Exception as e: # Catch Pydantic errors if they still happen here
+            metrics.incr("orchestrator_parse_failures_total", kind="invalid_decision")
             print(f"Orchestrator string output could not be parsed into RouteDecision: {e}. Output was: {raw_llm_output_content}")
             # Fallback to general agent with the raw output if Pydantic parsing fails
             decision = RouteDecision(next_agent="general", query_for_agent=raw_llm_output_content)
@@ -134,8 +440,8 @@ def call_orchestrator(state: AgentState):
         try:
             decision = RouteDecision(**raw_llm_output_content)
             parsed_successfully = True
-            print(f"Orchestrator parsed decision (from dict): {decision}")
         except Exception as e:
+            metrics.incr("orchestrator_parse_failures_total", kind="invalid_dict")
             print(f"Orchestrator output dict could not be parsed into RouteDecision: {e}. Output was: {raw_llm_output_content}")
             # Fallback to general agent if Pydantic parsing fails from dict
             decision = RouteDecision(next_agent="general", query_for_agent=str(raw_llm_output_content))
@@ -143,9 +449,14 @@ def call_orchestrator(state: AgentState):
 
     if not parsed_successfully or decision is None:
         # Final fallback if none of the above worked
+        metrics.incr("orchestrator_parse_failures_total", kind="unexpected_type")
         print(f"Orchestrator returned unexpected type or failed final parsing: {type(raw_llm_output_content)}. Output: {raw_llm_output_content}")
         decision = RouteDecision(next_agent="general", query_for_agent="I'm sorry, I encountered an unexpected routing error.")
 
+    return _apply_route_decision(state, decision)
+
+
+def _apply_route_decision(state: AgentState, decision: RouteDecision):
     # --- Refined Routing Logic ---
     # Only route to "general" if the decision explicitly says "general"
     # AND the query_for_agent is clearly a greeting/clarification.
@@ -160,7 +471,7 @@ def call_orchestrator(state: AgentState):
         # ensure we present a friendly, generic message.
         if "next_agent" in display_message and "query_for_agent" in display_message:
              display_message = "What can I help you with today?" # Default friendly greeting
-        print(f"Orchestrator issued a general greeting/clarification: {display_message}")
+        get_metrics().incr("route_fallbacks_total", reason="clarification")
         return {
             "messages": [AIMessage(content=display_message)],
             "next_agent_route": "general",
@@ -169,86 +480,307 @@ def call_orchestrator(state: AgentState):
     else:
         # If the orchestrator provided a specific agent (e.g., "vegan", "non_vegetarian")
         # or a specific, non-greeting query for the general agent, route accordingly.
-        print(f"Orchestrator Decision: {decision}")
-        state["dietary_preference"] = decision.dietary_preference
-        state["dietary_goal"] = decision.dietary_goal
-        state["allergies"] = [a.strip() for a in decision.allergies.split(',')] if decision.allergies else []
-        state["meal_type"] = decision.meal_type
-
-        # The message content should be user-friendly, not the raw routing decision.
-        # It's good practice to provide feedback to the user about routing.
-        response_message = f"Routing you to the {decision.next_agent} agent for '{decision.query_for_agent}'."
-        if decision.next_agent == "general":
-            # If it's general but not a greeting, just use the query itself
-            response_message = f"Processing your general query: '{decision.query_for_agent}'."
+        return _route_to_agent(state, decision)
 
-        return {
-            "messages": [AIMessage(content=response_message)],
-            "next_agent_route": decision.next_agent,
-            "query_for_next_agent": decision.query_for_agent
-        }
 
+def _merge_allergies(known, stated):
+    """Allergies from earlier turns followed by any new ones, in order and without repeats."""
+    # Never a replacement: "I'm also allergic to nuts" must not drop the gluten from an earlier turn.
+    merged = [a for a in list(known or []) + list(stated or []) if a and a.lower() != "none"]
+    return list(dict.fromkeys(merged))
 
 
-def call_vegetarian_agent(state: AgentState):
-    print("\n--- Calling Vegetarian Agent ---")
-    query = state.get("query_for_next_agent", state["messages"][-1].content)
-    agent_input_state = {
-        "input": query,
-        "chat_history": state["messages"]
+def _route_to_agent(state: AgentState, decision: RouteDecision):
+    # Anything the decision didn't extract falls back to what earlier turns of this session knew,
+    # and is returned (not just assigned) so LangGraph keeps it and the session store persists it.
+    allergies = [a.strip() for a in decision.allergies.split(',')] if decision.allergies else []
+    known = {
+        "dietary_preference": decision.dietary_preference or state.get("dietary_preference") or "",
+        "dietary_goal": decision.dietary_goal or state.get("dietary_goal") or "",
+        "allergies": _merge_allergies(state.get("allergies"), allergies),
+        "meal_type": decision.meal_type or state.get("meal_type") or "",
+    }
+    state.update(known)
+
+    # The message content should be user-friendly, not the raw routing decision.
+    # It's good practice to provide feedback to the user about routing.
+    response_message = f"Routing you to the {decision.next_agent} agent for '{decision.query_for_agent}'."
+    if decision.next_agent == "general":
+        # If it's general but not a greeting, just use the query itself
+        response_message = f"Processing your general query: '{decision.query_for_agent}'."
+
+    return {
+        # Tagged so HistoryManager can keep it out of later prompts
+        "messages": [AIMessage(content=response_message, name=ROUTING_MESSAGE_NAME)],
+        "next_agent_route": decision.next_agent,
+        "query_for_next_agent": decision.query_for_agent,
+        **known
     }
-    response = vegetarian_agent.agent_executor.invoke(agent_input_state)["output"]
-    return {"messages": [AIMessage(content=response)]}
 
-def call_non_vegetarian_agent(state: AgentState):
-    print("\n--- Calling Non-Vegetarian Agent ---")
+
+def _has_known_preference(state: AgentState) -> bool:
+    return state.get("dietary_preference") in ("vegetarian", "vegan", "non_vegetarian")
+
+
+def _known_preference_decision(state: AgentState, user_message: str):
+    """
+    Routes straight to the specialist for a dietary preference stored from an earlier turn, with
+    the goal, meal type and allergies the lexicon finds in the message. Messages that name a diet,
+    negate something or ask a general question still go to the orchestrator (see follow_up_signals).
+    """
+    if not _has_known_preference(state):
+        return None
+    preference = state["dietary_preference"]
+    signals = follow_up_signals(user_message)
+    if signals is None:
+        return None
+    return RouteDecision(
+        next_agent=preference,
+        dietary_preference=preference,
+        dietary_goal=signals["dietary_goal"],
+        # Same rule as the other routes: allergies stated now add to the ones known from earlier turns.
+        allergies=",".join(_merge_allergies(state.get("allergies"), signals["allergies"])) or None,
+        meal_type=signals["meal_type"],
+        query_for_agent=user_message
+    )
+
+
+
+def _agent_input(state: AgentState, chat_history=None, prefetched_docs=None):
     query = state.get("query_for_next_agent", state["messages"][-1].content)
-    agent_input_state = {
+    if chat_history is None:
+        # Last N turns verbatim plus a rolling summary, without the routing chatter
+        chat_history = agent_registry.get("history_manager").window(state["messages"])
+    if prefetched_docs is not None:
+        query = _with_retrieved_docs(query, prefetched_docs)
+    return {
         "input": query,
-        "chat_history": state["messages"]
+        "chat_history": chat_history
     }
-    response = non_vegetarian_agent.agent_executor.invoke(agent_input_state)["output"]
+
+def _with_retrieved_docs(query: str, docs):
+    # Usually lets the specialist answer in one LLM call instead of calling the tool first.
+    return f"{query}\n\n{PREFETCHED_CONTEXT_HEADER}\n{format_retrieved_docs(docs)}"
+
+async def _aagent_input(state: AgentState, prefetched_docs=None):
+    history_manager = await _aget_component("history_manager")
+    chat_history = await asyncio.to_thread(history_manager.window, state["messages"])
+    return _agent_input(state, chat_history, prefetched_docs)
+
+def _user_message(state: AgentState) -> str:
+    # By the time a specialist runs, the routing message has been appended after it.
+    return next((m.content for m in reversed(state["messages"]) if isinstance(m, HumanMessage)), "")
+
+def _answer_cache_key(name: str, state: AgentState):
+    """(scope, query) to cache this turn's answer under, or None if it must not be cached."""
+    if name in UNCACHED_ANSWER_ROUTES:
+        return None
+    # A session route hands the raw follow-up to an agent that answers it from the chat history,
+    # and "it"/"that" in the user's own words mean the same even when the query was rewritten.
+    if state.get("route_source") == "session" or is_context_dependent(_user_message(state)):
+        return None
+    query = state.get("query_for_next_agent") or _user_message(state)
+    scope = SemanticAnswerCache.make_scope(name, state.get("dietary_preference"), state.get("dietary_goal"),
+                                           state.get("allergies"), state.get("meal_type"))
+    return scope, query
+
+def _run_specialist(name: str, state: AgentState):
+    agent = agent_registry.get(name)
+    prefetcher = agent_registry.get("prefetcher") if PREFETCH_ENABLED else None
+    cache_key = _answer_cache_key(name, state) if ANSWER_CACHE_ENABLED else None
+    answer_cache = agent_registry.get("answer_cache") if cache_key is not None else None
+    if answer_cache is not None:
+        scope, query = cache_key
+        cached, vector = answer_cache.lookup(scope, query)
+        get_metrics().incr("answer_cache_total", agent=name, result="miss" if cached is None else "hit")
+        if cached is not None:
+            if prefetcher is not None:
+                prefetcher.discard(state.get("prefetch_id"))
+            return {"messages": [AIMessage(content=cached)]}
+    exclusions = agent.exclusions_for(state)
+    prefetched_docs = None
+    if prefetcher is not None:
+        prefetched_docs = prefetcher.take(state.get("prefetch_id"), name, exclusion_key(exclusions))
+    with retrieval_exclusions(exclusions):
+        response = agent.agent_executor.invoke(_agent_input(state, prefetched_docs=prefetched_docs))["output"]
+    if answer_cache is not None:
+        answer_cache.store(scope, query, response, vector)
     return {"messages": [AIMessage(content=response)]}
 
-def call_vegan_agent(state: AgentState):
-    print("\n--- Calling Vegan Agent ---")
-    query = state.get("query_for_next_agent", state["messages"][-1].content)
-    agent_input_state = {
-        "input": query,
-        "chat_history": state["messages"]
-    }
-    response = vegan_agent.agent_executor.invoke(agent_input_state)["output"]
+async def _arun_specialist(name: str, state: AgentState):
+    agent = await _aget_component(name)
+    prefetcher = await _aget_component("prefetcher") if PREFETCH_ENABLED else None
+    cache_key = _answer_cache_key(name, state) if ANSWER_CACHE_ENABLED else None
+    answer_cache = await _aget_component("answer_cache") if cache_key is not None else None
+    if answer_cache is not None:
+        scope, query = cache_key
+        # A miss may embed the question, which can hit the network.
+        cached, vector = await asyncio.to_thread(answer_cache.lookup, scope, query)
+        get_metrics().incr("answer_cache_total", agent=name, result="miss" if cached is None else "hit")
+        if cached is not None:
+            if prefetcher is not None:
+                prefetcher.discard(state.get("prefetch_id"))
+            return {"messages": [AIMessage(content=cached)]}
+    exclusions = agent.exclusions_for(state)
+    prefetched_docs = None
+    if prefetcher is not None:
+        prefetched_docs = await prefetcher.atake(state.get("prefetch_id"), name, exclusion_key(exclusions))
+    with retrieval_exclusions(exclusions):
+        agent_input = await _aagent_input(state, prefetched_docs)
+        response = (await agent.agent_executor.ainvoke(agent_input))["output"]
+    if answer_cache is not None:
+        await asyncio.to_thread(answer_cache.store, scope, query, response, vector)
     return {"messages": [AIMessage(content=response)]}
 
+@traced("node", node="vegetarian")
+def call_vegetarian_agent(state: AgentState):
+    return _run_specialist("vegetarian", state)
+
+@traced("node", node="vegetarian")
+async def acall_vegetarian_agent(state: AgentState):
+    return await _arun_specialist("vegetarian", state)
+
+@traced("node", node="non_vegetarian")
+def call_non_vegetarian_agent(state: AgentState):
+    return _run_specialist("non_vegetarian", state)
+
+@traced("node", node="non_vegetarian")
+async def acall_non_vegetarian_agent(state: AgentState):
+    return await _arun_specialist("non_vegetarian", state)
+
+@traced("node", node="vegan")
+def call_vegan_agent(state: AgentState):
+    return _run_specialist("vegan", state)
+
+@traced("node", node="vegan")
+async def acall_vegan_agent(state: AgentState):
+    return await _arun_specialist("vegan", state)
+
+@traced("node", node="general")
 def call_general_agent(state: AgentState):
-    print("\n--- Calling General Agent ---")
-    query = state.get("query_for_next_agent", state["messages"][-1].content)
-    agent_input_state = {
-        "input": query,
-        "chat_history": state["messages"]
-    }
-    response = general_agent.agent_executor.invoke(agent_input_state)["output"]
-    return {"messages": [AIMessage(content=response)]}
+    return _run_specialist("general", state)
+
+@traced("node", node="general")
+async def acall_general_agent(state: AgentState):
+    return await _arun_specialist("general", state)
+
+
+# --- Meal plans ---
+# "A 7-day vegan meal plan" runs as one small specialist call per day and meal instead of one long
+# agent run; see agents/meal_plan.py for the fan-out and the merge.
+def _meal_plan_profile(name: str, state: AgentState) -> str:
+    preference = state.get("dietary_preference") or (name if name != "general" else "")
+    parts = [preference.replace("_", "-") or "any diet"]
+    if state.get("dietary_goal"):
+        parts.append(f"goal: {state['dietary_goal']}")
+    if state.get("allergies"):
+        parts.append(f"free of: {', '.join(state['allergies'])}")
+    return "; ".join(parts)
+
+
+def _meal_context_query(meal_type: str, state: AgentState) -> str:
+    return " ".join(part for part in (state.get("dietary_goal"), meal_type, "recipes") if part)
+
+
+def _slot_input(contexts: dict, slot, prompt: str):
+    # Every day shares its meal type's passages, each day starting from a different one for variety.
+    # No chat history: the slot prompt carries the diet, goal and allergies.
+    day, meal_type = slot
+    docs = contexts.get(meal_type) or []
+    if not docs:
+        return {"input": prompt, "chat_history": []} # The specialist can still call the retrieval tool
+    shift = (day - 1) % len(docs)
+    return {"input": _with_retrieved_docs(prompt, docs[shift:] + docs[:shift]), "chat_history": []}
+
+
+def _meal_plan_start(state: AgentState, prefetcher):
+    if prefetcher is not None:
+        prefetcher.discard(state.get("prefetch_id")) # Retrieval happens per meal type below
+    name = state.get("next_agent_route")
+    return name if name in ROUTE_DIETARY_FILTERS else "general"
+
+
+def _run_meal_plan(state: AgentState):
+    name = _meal_plan_start(state, agent_registry.get("prefetcher") if PREFETCH_ENABLED else None)
+    agent = agent_registry.get(name)
+    planner = agent_registry.get("meal_planner")
+    plan = state["meal_plan_request"]
+    exclusions = agent.exclusions_for(state)
+
+    # One retrieval per meal type, run together and shared by every day of the plan.
+    with ThreadPoolExecutor(max_workers=len(plan["meal_types"]), thread_name_prefix="meal-plan-context") as pool:
+        futures = {meal_type: pool.submit(contextvars.copy_context().run, retrieve_for_prefetch,
+                                          _meal_context_query(meal_type, state), ROUTE_DIETARY_FILTERS[name],
+                                          exclusions)
+                   for meal_type in plan["meal_types"]}
+        contexts = {meal_type: future.result()[0] for meal_type, future in futures.items()}
+
+    def solve(slot, prompt):
+        with retrieval_exclusions(exclusions):
+            return agent.agent_executor.invoke(_slot_input(contexts, slot, prompt))["output"]
+
+    profile = _meal_plan_profile(name, state)
+    answers = planner.run(plan, profile, solve)
+    return {"messages": [AIMessage(content=planner.format_plan(plan, profile, answers))]}
+
+
+async def _arun_meal_plan(state: AgentState):
+    name = _meal_plan_start(state, await _aget_component("prefetcher") if PREFETCH_ENABLED else None)
+    agent = await _aget_component(name)
+    planner = await _aget_component("meal_planner")
+    plan = state["meal_plan_request"]
+    exclusions = agent.exclusions_for(state)
+
+    results = await asyncio.gather(*(
+        asyncio.to_thread(retrieve_for_prefetch, _meal_context_query(meal_type, state),
+                          ROUTE_DIETARY_FILTERS[name], exclusions)
+        for meal_type in plan["meal_types"]
+    ))
+    contexts = {meal_type: docs for meal_type, (docs, _) in zip(plan["meal_types"], results)}
+
+    async def asolve(slot, prompt):
+        with retrieval_exclusions(exclusions):
+            result = await agent.agent_executor.ainvoke(_slot_input(contexts, slot, prompt))
+        return result["output"]
+
+    profile = _meal_plan_profile(name, state)
+    answers = await planner.arun(plan, profile, asolve)
+    return {"messages": [AIMessage(content=planner.format_plan(plan, profile, answers))]}
+
+@traced("node", node="meal_plan")
+def call_meal_plan(state: AgentState):
+    return _run_meal_plan(state)
+
+@traced("node", node="meal_plan")
+async def acall_meal_plan(state: AgentState):
+    return await _arun_meal_plan(state)
 
 
 # --- Define Router ---
 def route_agent(state: AgentState):
     next_agent_route = state.get("next_agent_route")
+    if state.get("meal_plan_request"): # Only set once the turn resolved to a diet, see _detect_meal_plan()
+        get_metrics().incr("routes_total", agent=MEAL_PLAN_NODE)
+        return MEAL_PLAN_NODE
     if next_agent_route:
-        print(f"Routing to: {next_agent_route}")
+        get_metrics().incr("routes_total", agent=next_agent_route)
         return next_agent_route
     else:
-        print("No routing decision made by orchestrator, falling back to general.")
+        get_metrics().incr("route_fallbacks_total", reason="no_decision")
+        get_metrics().incr("routes_total", agent="general")
         return "general"
 
 # --- Build the LangGraph ---
 workflow = StateGraph(AgentState)
 
-workflow.add_node("orchestrator", call_orchestrator)
-workflow.add_node("vegetarian", call_vegetarian_agent)
-workflow.add_node("non_vegetarian", call_non_vegetarian_agent)
-workflow.add_node("vegan", call_vegan_agent)
-workflow.add_node("general", call_general_agent)
+# Each node carries a sync and an async implementation: app.invoke() uses the former,
+# app.ainvoke()/app.astream() the latter, so one event loop can multiplex many sessions.
+workflow.add_node("orchestrator", RunnableLambda(call_orchestrator, afunc=acall_orchestrator))
+workflow.add_node("vegetarian", RunnableLambda(call_vegetarian_agent, afunc=acall_vegetarian_agent))
+workflow.add_node("non_vegetarian", RunnableLambda(call_non_vegetarian_agent, afunc=acall_non_vegetarian_agent))
+workflow.add_node("vegan", RunnableLambda(call_vegan_agent, afunc=acall_vegan_agent))
+workflow.add_node("general", RunnableLambda(call_general_agent, afunc=acall_general_agent))
+workflow.add_node("meal_plan", RunnableLambda(call_meal_plan, afunc=acall_meal_plan))
 
 workflow.set_entry_point("orchestrator")
 
@@ -259,7 +791,8 @@ workflow.add_conditional_edges(
         "vegetarian": "vegetarian",
         "non_vegetarian": "non_vegetarian",
         "vegan": "vegan",
-        "general": "general"
+        "general": "general",
+        "meal_plan": "meal_plan"
     }
 )
 
@@ -267,12 +800,60 @@ workflow.add_edge("vegetarian", END)
 workflow.add_edge("non_vegetarian", END)
 workflow.add_edge("vegan", END)
 workflow.add_edge("general", END)
+workflow.add_edge("meal_plan", END)
 
 app = workflow.compile()
 
+SPECIALIST_NODES = ("vegetarian", "non_vegetarian", "vegan", "general")
+MEAL_PLAN_NODE = "meal_plan" # Answers through a specialist, but as many parallel calls
+
+
+def new_conversation_state(user_input: str, previous_state=None):
+    """
+    AgentState for one user turn. Pass the state saved after the previous turn to carry the
+    conversation and the extracted preference, goal, allergies and meal type forward.
+    """
+    previous_state = previous_state or {}
+    return {"messages": list(previous_state.get("messages", [])) + [HumanMessage(content=user_input)],
+            "dietary_preference": previous_state.get("dietary_preference") or "",
+            "dietary_goal": previous_state.get("dietary_goal") or "",
+            "allergies": list(previous_state.get("allergies") or []),
+            "meal_type": previous_state.get("meal_type") or "",
+            "next_agent_route": "",
+            "query_for_next_agent": "",
+            "prefetch_id": "",
+            "meal_plan_request": {},
+            "route_source": ""}
+
+
+def run_turn(conversation_id: str, user_input: str):
+    """Runs one turn of a persisted conversation and returns the final state."""
+    session_store = agent_registry.get("session_store")
+    with get_metrics().turn():
+        final_state = app.invoke(new_conversation_state(user_input, session_store.load(conversation_id)))
+    session_store.save(conversation_id, final_state)
+    return final_state
+
 # --- Example Usage ---
 if __name__ == "__main__":
-    print("Diet Chatbot started. Type 'exit' to quit.")
+    import sys
+    import uuid
+    import argparse
+    parser = argparse.ArgumentParser(description="Diet Chatbot")
+    parser.add_argument("command", nargs="?", default="chat", choices=["chat", "warmup"])
+    parser.add_argument("--metrics", choices=["text", "json"], default=None,
+                        help="Print the collected metrics in this format on exit")
+    parser.add_argument("--session", default=None, help="Conversation ID to resume (a new one is created otherwise)")
+    args = parser.parse_args()
+
+    if args.command == "warmup":
+        # Pre-build every agent and the knowledge base, e.g. from a deploy script.
+        for name, seconds in warmup().items():
+            print(f"Built {name} in {seconds:.2f}s")
+        sys.exit(0)
+
+    conversation_id = args.session or uuid.uuid4().hex
+    print(f"Diet Chatbot started (session {conversation_id}). Type 'exit' to quit.")
 
     # Removed the get_rag_retriever call here, as it's now initialized above.
     # The get_rag_retriever call in common_tools.py will now correctly fetch the initialized retriever.
@@ -280,21 +861,27 @@ if __name__ == "__main__":
     while True:
         user_input = input("\nYou: ")
         if user_input.lower() == 'exit':
+            if agent_registry.is_built("fast_path_router"):
+                print(f"Fast-path router stats: {agent_registry.get('fast_path_router').stats()}")
+            if agent_registry.is_built("search_cache"):
+                print(f"Web search cache stats: {agent_registry.get('search_cache').stats()}")
+            if agent_registry.is_built("answer_cache"):
+                print(f"Answer cache stats: {agent_registry.get('answer_cache').stats()}")
+            if agent_registry.is_built("prefetcher"):
+                print(f"Retrieval prefetch stats: {agent_registry.get('prefetcher').stats()}")
+            if args.metrics == "json":
+                print(get_metrics().export_json(include_traces=True))
+            elif args.metrics == "text":
+                print(get_metrics().export_text())
+            print(f"Resume this conversation with: python main.py --session {conversation_id}")
             break
 
-        initial_state = {"messages": [HumanMessage(content=user_input)],
-                         "dietary_preference": "",
-                         "dietary_goal": "",
-                         "allergies": [],
-                         "meal_type": "",
-                         "next_agent_route": "",
-                         "query_for_next_agent": ""}
         try:
-            final_state = app.invoke(initial_state)
+            final_state = run_turn(conversation_id, user_input)
             ai_response = final_state["messages"][-1].content
             print(f"Bot: {ai_response}")
         except Exception as e:
             print(f"An error occurred: {e}")
             import traceback
             traceback.print_exc()
-            print("Bot: I'm sorry, I couldn't process that request right now. Please try again or rephrase.")
\ No newline at end of file
+            print("Bot: I'm sorry, I couldn't process that request right now. Please try again or rephrase.")
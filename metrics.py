@@ -0,0 +1,333 @@
+# E:\Diet Chatbot\metrics.py
+import json
+import time
+import random
+import inspect
+import functools
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+METRIC_PREFIX = "diet_chatbot_"
+
+# The turn being served by this thread/task. Copied into LangGraph node threads, agent tool
+# threads and asyncio tasks along with the rest of the context, so every span and LLM call
+# lands on the turn that caused it.
+_current_turn = contextvars.ContextVar("current_turn", default=None)
+
+
+def _label_key(labels: dict):
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+
+def _percentile(sorted_values, q: float):
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class _Histogram:
+    """Count/sum/min/max plus a fixed-size uniform reservoir for percentiles."""
+
+    def __init__(self, max_samples: int):
+        self.max_samples = max_samples
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.samples = []
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self.samples) < self.max_samples:
+            self.samples.append(value)
+        else:
+            slot = random.randrange(self.count)
+            if slot < self.max_samples:
+                self.samples[slot] = value
+
+    def summary(self) -> dict:
+        values = sorted(self.samples)
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "mean": round(self.total / self.count, 6) if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": _percentile(values, 0.50),
+            "p95": _percentile(values, 0.95),
+            "p99": _percentile(values, 0.99),
+        }
+
+
+class TurnTrace:
+    """Spans and LLM usage for one user turn (or one ad-hoc request)."""
+
+    def __init__(self, labels: dict, sampled: bool):
+        self.labels = labels
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.seconds = None
+        self.error = None
+        self.spans = []
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock() # Tools of one turn may run in parallel threads
+
+    def add_span(self, name: str, labels: dict, start: float, seconds: float, error: str = None):
+        with self._lock:
+            self.spans.append({
+                "name": name,
+                **labels,
+                "offset": round(start - self.started, 6),
+                "seconds": round(seconds, 6),
+                **({"error": error} if error else {}),
+            })
+
+    def add_llm_call(self, prompt_tokens: int, completion_tokens: int):
+        with self._lock:
+            self.llm_calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                **self.labels,
+                "started_at": self.started_at,
+                "seconds": round(self.seconds, 6) if self.seconds is not None else None,
+                "error": self.error,
+                "llm_calls": self.llm_calls,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "spans": sorted(self.spans, key=lambda span: span["offset"]),
+            }
+
+
+class MetricsRegistry:
+    """
+    In-process counters, latency histograms and per-turn traces for the chatbot.
+
+    Nodes, tools and LLM calls report into one registry (see `get_metrics()`): `span()` times a
+    block (`traced()` decorates a function), `incr()` counts an event and `observe()` records a
+    value such as a hit count. Wrap a user turn in `turn()` to also get LLM calls and tokens per
+    turn and a trace of where the turn's time went; the last `max_traces` sampled traces are kept.
+
+    Sampling keeps the overhead low under load: counters are always kept, but timings, token
+    usage and traces are only recorded for a `sample_rate` fraction of turns (decided once per
+    turn, so a sampled trace is complete). Export with `export_text()` (Prometheus text format)
+    or `export_json()`.
+    """
+
+    def __init__(self, enabled: bool = True, sample_rate: float = 1.0, max_samples: int = 1024,
+                 max_traces: int = 50, log_spans: bool = False):
+        self.enabled = enabled
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.max_samples = max_samples
+        self.log_spans = log_spans # Print each span as it finishes, for local debugging
+        self._lock = threading.Lock()
+        self._counters = {} # (name, label key) -> float
+        self._histograms = {} # (name, label key) -> _Histogram
+        self._traces = deque(maxlen=max_traces)
+
+    # --- recording ---
+    def incr(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled or not self.sampled():
+            return
+        self._record(name, value, labels)
+
+    def _record(self, name: str, value: float, labels: dict):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self.max_samples)
+            histogram.observe(value)
+
+    def sampled(self) -> bool:
+        """Whether timings are recorded right now: the current turn's decision, or a fresh draw outside a turn."""
+        turn = _current_turn.get()
+        if turn is not None:
+            return turn.sampled
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    @contextmanager
+    def span(self, name: str, **labels):
+        """Counts `<name>_total` (and `<name>_errors_total`) and, when sampled, times the block into `<name>_seconds`."""
+        if not self.enabled:
+            yield
+            return
+        self.incr(f"{name}_total", **labels)
+        timed = self.sampled()
+        start = time.perf_counter() if timed else 0.0
+        error = None
+        try:
+            yield
+        except GeneratorExit:
+            raise # A stream closed early by its consumer is not a failure
+        except BaseException as e:
+            error = type(e).__name__
+            self.incr(f"{name}_errors_total", **labels)
+            raise
+        finally:
+            if timed:
+                seconds = time.perf_counter() - start
+                self._record(f"{name}_seconds", seconds, labels)
+                turn = _current_turn.get()
+                if turn is not None:
+                    turn.add_span(name, labels, start, seconds, error)
+                if self.log_spans:
+                    label_text = " ".join(f"{key}={value}" for key, value in labels.items())
+                    print(f"[metrics] {name} {label_text} {seconds:.3f}s" + (f" error={error}" if error else ""))
+
+    def record_llm_call(self, prompt_tokens: int = 0, completion_tokens: int = 0, **labels):
+        """Counts one model call and its token usage, globally and on the current turn."""
+        if not self.enabled:
+            return
+        if self.sampled():
+            self.incr("llm_prompt_tokens_total", prompt_tokens, **labels)
+            self.incr("llm_completion_tokens_total", completion_tokens, **labels)
+            turn = _current_turn.get()
+            if turn is not None:
+                turn.add_llm_call(prompt_tokens, completion_tokens)
+
+    @contextmanager
+    def turn(self, **labels):
+        """Scopes one user turn; yields its TurnTrace (None when metrics are disabled)."""
+        if not self.enabled:
+            yield None
+            return
+        trace = TurnTrace(labels, sampled=self.sample_rate >= 1.0 or random.random() < self.sample_rate)
+        previous = _current_turn.get()
+        # set() rather than reset(token): a streaming generator may be resumed from another context.
+        _current_turn.set(trace)
+        try:
+            with self.span("turn", **labels):
+                yield trace
+        except GeneratorExit:
+            raise
+        except BaseException as e:
+            trace.error = type(e).__name__
+            raise
+        finally:
+            _current_turn.set(previous)
+            trace.seconds = time.perf_counter() - trace.started
+            if trace.sampled:
+                self._observe_turn(trace)
+
+    def _observe_turn(self, trace: TurnTrace):
+        with self._lock:
+            self._traces.append(trace)
+        self._record("turn_llm_calls", trace.llm_calls, trace.labels)
+        self._record("turn_prompt_tokens", trace.prompt_tokens, trace.labels)
+        self._record("turn_completion_tokens", trace.completion_tokens, trace.labels)
+
+    # --- reading ---
+    def counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get((name, _label_key(labels)), 0)
+
+    def recent_traces(self, limit: int = None):
+        with self._lock:
+            traces = list(self._traces)
+        return [trace.to_dict() for trace in traces[-limit if limit else 0:]]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self._counters.items())]
+            histograms = [{"name": name, "labels": dict(labels), **histogram.summary()}
+                          for (name, labels), histogram in sorted(self._histograms.items())]
+        return {"sample_rate": self.sample_rate, "counters": counters, "histograms": histograms}
+
+    def export_json(self, include_traces: bool = False, indent: int = 2) -> str:
+        snapshot = self.snapshot()
+        if include_traces:
+            snapshot["traces"] = self.recent_traces()
+        return json.dumps(snapshot, indent=indent)
+
+    def export_text(self) -> str:
+        """Prometheus text exposition format; histograms are exported as summaries."""
+        snapshot = self.snapshot()
+        lines = []
+
+        def render(name, labels, value, extra=None):
+            pairs = list(labels.items()) + list((extra or {}).items())
+            label_text = "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}" if pairs else ""
+            lines.append(f"{METRIC_PREFIX}{name}{label_text} {value}")
+
+        typed = set()
+        for counter in snapshot["counters"]:
+            if counter["name"] not in typed:
+                typed.add(counter["name"])
+                lines.append(f"# TYPE {METRIC_PREFIX}{counter['name']} counter")
+            render(counter["name"], counter["labels"], counter["value"])
+        for histogram in snapshot["histograms"]:
+            if histogram["name"] not in typed:
+                typed.add(histogram["name"])
+                lines.append(f"# TYPE {METRIC_PREFIX}{histogram['name']} summary")
+            for quantile in ("p50", "p95", "p99"):
+                render(histogram["name"], histogram["labels"], histogram[quantile],
+                       {"quantile": f"0.{quantile[1:]}"})
+            render(f"{histogram['name']}_sum", histogram["labels"], histogram["sum"])
+            render(f"{histogram['name']}_count", histogram["labels"], histogram["count"])
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._traces.clear()
+
+
+# --- Global registry ---
+# main.py replaces it with one configured from app_config; modules call get_metrics() at use time.
+_metrics = MetricsRegistry()
+
+
+def set_global_metrics(registry: MetricsRegistry):
+    global _metrics
+    _metrics = registry
+
+
+def get_metrics() -> MetricsRegistry:
+    return _metrics
+
+
+def span(name: str, **labels):
+    """Shorthand for get_metrics().span(); resolves the registry at call time."""
+    return get_metrics().span(name, **labels)
+
+
+def traced(name: str, **labels):
+    """Decorator form of span() for sync and async functions (graph nodes, tool bodies)."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with get_metrics().span(name, **labels):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with get_metrics().span(name, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,137 @@
+# E:\Diet Chatbot\rag\context_packer.py
+from typing import List
+
+from langchain_core.documents import Document
+
+from .lexical_index import tokenize
+
+CHARS_PER_TOKEN = 4 # Same estimate HistoryManager uses
+MIN_OVERLAP_CHARS = 40 # Shorter shared edges are coincidence, not splitter overlap
+MIN_PASSAGE_TOKENS = 40 # Don't spend the tail of the budget on a sliver of a passage
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _overlap(first: str, second: str, max_overlap: int) -> int:
+    """Length of the longest suffix of `first` that is a prefix of `second` (0 if under MIN_OVERLAP_CHARS)."""
+    limit = min(len(first), len(second), max_overlap)
+    probe = second[:MIN_OVERLAP_CHARS]
+    if limit < MIN_OVERLAP_CHARS:
+        return 0
+    # The splitter's overlap starts somewhere in the last `limit` characters of the previous chunk.
+    start = first.find(probe, len(first) - limit)
+    while start != -1:
+        length = len(first) - start
+        if second.startswith(first[start:]):
+            return length
+        start = first.find(probe, start + 1)
+    return 0
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    tokens = tokenize(text)
+    if len(tokens) < size:
+        return {tuple(tokens)} if tokens else set()
+    return {tuple(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _trim_to_tokens(text: str, max_tokens: int) -> str:
+    """Cuts text to about max_tokens, at the last sentence (or word) boundary, marking the cut."""
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    boundary = max(cut.rfind(". "), cut.rfind("\n"))
+    if boundary < limit // 2:
+        boundary = cut.rfind(" ")
+    return (cut[:boundary + 1] if boundary > 0 else cut).rstrip() + " …"
+
+
+def _citation(doc: Document) -> str:
+    metadata = doc.metadata or {}
+    parts = [metadata.get("source_file") or metadata.get("source") or "knowledge base"]
+    page = metadata.get("page_label") or (metadata["page"] + 1 if isinstance(metadata.get("page"), int) else None)
+    if page is not None:
+        parts.append(f"p. {page}")
+    citation = ", ".join(str(part) for part in parts)
+    if metadata.get("recipes"):
+        citation += f" — {metadata['recipes']}"
+    return citation
+
+
+def pack_context(docs: List[Document], token_budget: int = 1200, mmr_lambda: float = 0.7,
+                 duplicate_threshold: float = 0.8, max_overlap_chars: int = 400) -> str:
+    """
+    Turns ranked retrieval results into a compact, cited context block for the agent.
+
+    1. Text a chunk shares with another returned chunk of the same file (the splitter's
+       `chunk_overlap`) is cut from whichever chunk comes second in the book.
+    2. Passages whose word 3-grams mostly repeat a better-ranked passage
+       (Jaccard >= `duplicate_threshold`) are dropped.
+    3. The rest are ordered by maximal marginal relevance: relevance is the retriever's
+       rank, redundancy is 3-gram overlap with passages already picked, traded off by `mmr_lambda`.
+    4. Passages are added until `token_budget` (estimated at ~4 characters per token) is
+       spent; the last one may be cut at a sentence boundary.
+
+    Each passage is numbered and cited with its source file, page and recipe, e.g.
+    "[1] vegan_meal_guide.pdf, p. 12 — Chickpea Curry".
+    """
+    if not docs:
+        return ""
+    texts = [doc.page_content.strip() for doc in docs]
+
+    # 1. Splitter overlap between chunks of the same file, trimmed off the later chunk.
+    for i, doc in enumerate(docs):
+        for j, other in enumerate(docs):
+            if i == j or not texts[i] or not texts[j]:
+                continue
+            if (doc.metadata or {}).get("source_file") != (other.metadata or {}).get("source_file"):
+                continue
+            shared = _overlap(texts[i], texts[j], max_overlap_chars)
+            if shared:
+                texts[j] = texts[j][shared:].lstrip()
+
+    # 2. Near-duplicates, keeping the better-ranked copy.
+    candidates = []
+    for rank, text in enumerate(texts):
+        if not text:
+            continue
+        shingles = _shingles(text)
+        if any(_jaccard(shingles, kept[2]) >= duplicate_threshold for kept in candidates):
+            continue
+        candidates.append((rank, text, shingles))
+
+    # 3. Maximal marginal relevance over the retriever's ranking.
+    ordered = []
+    remaining = list(candidates)
+    while remaining:
+        def mmr_score(candidate):
+            relevance = 1.0 - candidate[0] / len(docs)
+            redundancy = max((_jaccard(candidate[2], picked[2]) for picked in ordered), default=0.0)
+            return mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+        best = max(remaining, key=mmr_score)
+        ordered.append(best)
+        remaining.remove(best)
+
+    # 4. Token budget.
+    passages = []
+    used = 0
+    for rank, text, _ in ordered:
+        header = f"[{len(passages) + 1}] {_citation(docs[rank])}"
+        cost = estimate_tokens(header) + estimate_tokens(text) + 1
+        if used + cost > token_budget:
+            room = token_budget - used - estimate_tokens(header) - 1
+            if room >= MIN_PASSAGE_TOKENS:
+                passages.append(f"{header}\n{_trim_to_tokens(text, room)}")
+            break
+        passages.append(f"{header}\n{text}")
+        used += cost
+    return "\n\n".join(passages)
@@ -0,0 +1,99 @@
+# E:\Diet Chatbot\rag\embedding_cache.py
+import os
+import sqlite3
+import hashlib
+import threading
+from array import array
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Content-addressed, on-disk cache in front of any LangChain Embeddings backend.
+
+    Vectors are keyed by sha256(model name, kind, text) and stored as float32 blobs in SQLite,
+    so rebuilding the vector store or repeating a query never pays for the same text twice.
+    `kind` separates documents from queries because Gemini embeds them with different task
+    types. Cache misses are de-duplicated and sent to the backend in batches of `batch_size`.
+
+    Any Embeddings implementation can be the backend; for tests and offline runs use
+    langchain_core.embeddings.DeterministicFakeEmbedding.
+    """
+
+    def __init__(self, backend: Embeddings, model_name: str, cache_path: str, batch_size: int = 100):
+        self.backend = backend
+        self.model_name = model_name
+        self.cache_path = cache_path
+        self.batch_size = max(1, batch_size)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+
+    def _key(self, kind: str, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> dict:
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        # Stay well below SQLite's bound-parameter limit.
+        for start in range(0, len(unique_keys), 500):
+            batch = unique_keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+            for key, blob in rows:
+                found[key] = array("f", blob).tolist()
+        return found
+
+    def _store(self, items):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, array("f", vector).tobytes()) for key, vector in items]
+            )
+            self._conn.commit()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key("document", text) for text in texts]
+        cached = self._lookup(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        self.hits += sum(1 for key in keys if key in cached)
+        self.misses += len(missing)
+
+        missing_items = list(missing.items())
+        for start in range(0, len(missing_items), self.batch_size):
+            batch = missing_items[start:start + self.batch_size]
+            vectors = self.backend.embed_documents([text for _, text in batch])
+            fresh = [(key, vector) for (key, _), vector in zip(batch, vectors)]
+            self._store(fresh)
+            cached.update(fresh)
+
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key("query", text)
+        cached = self._lookup([key])
+        if key in cached:
+            self.hits += 1
+            return cached[key]
+        self.misses += 1
+        vector = self.backend.embed_query(text)
+        self._store([(key, vector)])
+        return vector
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": (self.hits / total) if total else 0.0}
@@ -1,66 +1,469 @@
 # E:\Diet Chatbot\rag\knowledge_base.py
 import os
 import json
+import time
+import itertools
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import chromadb
 from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from .manifest import IngestionManifest, hash_file, hash_chunk, make_chunk_id
+from .embedding_cache import CachedEmbeddings
+from .partitions import DietPartition, PartitionedRetriever
+from .vector_index import MmapVectorIndex, VECTOR_INDEX_DIR
+from .recipes import RecipeIndex, segment_recipes, map_chunks_to_recipes
+from .pipeline import IngestProgress, batched, read_ahead
+
+DIETARY_TYPES = ["vegetarian", "vegan", "non_vegetarian"]
+VECTOR_BACKENDS = ("chroma", "mmap")
+LEGACY_COLLECTION_NAME = "langchain" # The single shared collection used before per-diet partitions
+MIGRATION_BATCH_SIZE = 500
+CHUNK_SIZE = 1500
+CHUNK_OVERLAP = 200
+
+
+def load_and_split_pdf(pdf_path: str, filename: str, diet_type: str):
+    """
+    Loads one PDF, tags every page with our metadata and splits it into chunks. Also
+    segments the pages into recipe records; returns (splits, recipes, chunk_recipe_ids)
+    where chunk_recipe_ids[i] lists the recipes splits[i] overlaps.
+    """
+    loader = PyPDFLoader(pdf_path)
+    pdf_docs = loader.load()
+    for doc in pdf_docs:
+        doc.metadata["source_file"] = filename
+        doc.metadata["dietary_type"] = diet_type
+        doc.metadata["doc_type"] = "recipe_book_pdf"
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    splits = text_splitter.split_documents(pdf_docs)
+    recipes = segment_recipes(pdf_docs, filename, diet_type)
+    return splits, recipes, map_chunks_to_recipes(pdf_docs, splits, recipes)
+
+
+def _load_and_split_job(job):
+    # Top-level so it can be pickled into worker processes. Errors are returned, not raised,
+    # so one broken PDF doesn't take the rest of the batch down with it.
+    pdf_path, filename, diet_type = job
+    try:
+        return load_and_split_pdf(pdf_path, filename, diet_type), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def iter_load_and_split_pdfs(items, max_workers: int = None, max_pending: int = None):
+    """
+    Streaming form of load_and_split_pdfs(). `items` is an iterable of (context, job) pairs,
+    consumed lazily; yields (context, (parsed, error)) in input order, so the merge is
+    deterministic no matter which worker finishes first. At most `max_pending` files
+    (default: twice the workers) are queued or parsed ahead of the consumer, which bounds
+    memory however many PDFs there are.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    items = iter(items)
+    head = list(itertools.islice(items, 2))
+    if max_workers <= 1 or len(head) < 2:
+        # Not worth spawning a pool for a single file.
+        for context, job in itertools.chain(head, items):
+            yield context, _load_and_split_job(job)
+        return
+    max_pending = max(1, max_pending or 2 * max_workers)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for context, job in itertools.chain(head, items):
+            pending.append((context, executor.submit(_load_and_split_job, job)))
+            if len(pending) >= max_pending:
+                context, future = pending.popleft()
+                yield context, future.result()
+        while pending:
+            context, future = pending.popleft()
+            yield context, future.result()
+
+
+def load_and_split_pdfs(jobs, max_workers: int = None):
+    """
+    Parses and splits (pdf_path, filename, diet_type) jobs across worker processes.
+    Returns [((splits, recipes, chunk_recipe_ids), error), ...] in the same order as `jobs`.
+    """
+    jobs = list(jobs)
+    return [result for _, result in iter_load_and_split_pdfs(((None, job) for job in jobs), max_workers,
+                                                             max_pending=len(jobs))]
+
 
 class KnowledgeBase:
-    def __init__(self, embedding_model_name: str, google_api_key: str, vector_db_path: str = "./vector_db"):
+    def __init__(self, embedding_model_name: str, google_api_key: str, vector_db_path: str = "./vector_db",
+                 pdf_base_dir: str = "./data/recipe_pdfs", sync_on_startup: bool = True,
+                 ingest_workers: int = None, embedding_cache_path: str = None,
+                 embedding_batch_size: int = 100, embeddings: Embeddings = None,
+                 hybrid_search: bool = True, retriever_k: int = 4, hybrid_fetch_k: int = 20, rrf_k: int = 60,
+                 ingest_batch_size: int = 100, ingest_max_pending_files: int = None,
+                 checkpoint_seconds: float = 30.0, progress_seconds: float = 10.0,
+                 vector_backend: str = "chroma", vector_index_dtype: str = "float16"):
+        if vector_backend not in VECTOR_BACKENDS:
+            raise ValueError(f"Unknown vector backend '{vector_backend}'; expected one of {VECTOR_BACKENDS}")
         self.vector_db_path = vector_db_path
-        self.embeddings = GoogleGenerativeAIEmbeddings(model=embedding_model_name, google_api_key=google_api_key)
-        self.vectorstore = self._get_or_create_vectorstore()
+        self.pdf_base_dir = pdf_base_dir
+        self.ingest_workers = ingest_workers # None = one worker process per CPU
+        self.ingest_batch_size = ingest_batch_size # Chunks per embedding call and vector store write
+        self.ingest_max_pending_files = ingest_max_pending_files # None = twice the workers
+        self.checkpoint_seconds = checkpoint_seconds # How often sync() saves the manifest and recipe index
+        self.progress_seconds = progress_seconds # How often sync() prints a progress line
+        self._last_checkpoint = time.monotonic()
+        self.hybrid_search = hybrid_search
+        self.retriever_k = retriever_k
+        self.hybrid_fetch_k = hybrid_fetch_k
+        self.rrf_k = rrf_k
+        self.vector_backend = vector_backend # "mmap" serves dense search from rag/vector_index.py
+        # `embeddings` lets tests and offline runs plug in a local fake instead of Gemini.
+        backend = embeddings or GoogleGenerativeAIEmbeddings(model=embedding_model_name, google_api_key=google_api_key)
+        if embedding_cache_path:
+            self.embeddings = CachedEmbeddings(
+                backend, model_name=embedding_model_name, cache_path=embedding_cache_path,
+                batch_size=embedding_batch_size
+            )
+        else:
+            self.embeddings = backend
+        self.manifest = IngestionManifest.for_vector_db(vector_db_path)
+        self.recipe_index = RecipeIndex.for_vector_db(vector_db_path)
+        self._change_listeners = []
+        self.last_sync_progress = None # IngestProgress.summary() of the last sync()
+        self._client = self._get_or_create_client()
+        # One collection + BM25 index (+ optional mmap vector index) per dietary type; see rag/partitions.py.
+        self.partitions = {
+            diet_type: DietPartition(diet_type, self._client, vector_db_path, self.embeddings,
+                                     vector_index=self._vector_index_for(diet_type, vector_index_dtype))
+            for diet_type in DIETARY_TYPES
+        }
+        self._migrate_legacy_collection()
+        # With the "spawn" start method (Windows/macOS) ingest workers re-import the __main__
+        # module; if that module builds a KnowledgeBase, only the parent process may sync.
+        if sync_on_startup and multiprocessing.parent_process() is None:
+            self.sync()
+
+    def add_change_listener(self, callback):
+        """Registers a no-argument callable that is invoked whenever sync() changes the store."""
+        self._change_listeners.append(callback)
+
+    def version(self) -> str:
+        """Identifies the indexed content; caches built from answers can compare it across restarts."""
+        return self.manifest.fingerprint()
 
-    def _get_or_create_vectorstore(self):
+    def _notify_changed(self):
+        for callback in self._change_listeners:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Knowledge base change listener failed: {e}")
+
+    def _vector_index_for(self, diet_type: str, dtype: str):
+        if self.vector_backend != "mmap":
+            return None
+        return MmapVectorIndex(os.path.join(self.vector_db_path, VECTOR_INDEX_DIR), diet_type, dtype=dtype)
+
+    def _get_or_create_client(self):
         if os.path.exists(self.vector_db_path) and len(os.listdir(self.vector_db_path)) > 0:
             print(f"Loading existing vector store from {self.vector_db_path}")
-            return Chroma(
-                persist_directory=self.vector_db_path,
-                embedding_function=self.embeddings
-            )
         else:
             print(f"Creating new vector store at {self.vector_db_path}")
-            docs = []
-
-            base_pdf_dir = "./data/recipe_pdfs"
-            dietary_types = ["vegetarian", "vegan", "non_vegetarian"]
-
-            for diet_type in dietary_types:
-                pdf_dir = os.path.join(base_pdf_dir, diet_type)
-                if os.path.exists(pdf_dir):
-                    for filename in os.listdir(pdf_dir):
-                        if filename.endswith(".pdf"):
-                            pdf_path = os.path.join(pdf_dir, filename)
-                            print(f"Loading PDF: {pdf_path} (Type: {diet_type})")
-                            try:
-                                loader = PyPDFLoader(pdf_path)
-                                pdf_docs = loader.load()
-                                for doc in pdf_docs:
-                                    doc.metadata["source_file"] = filename
-                                    doc.metadata["dietary_type"] = diet_type
-                                    doc.metadata["doc_type"] = "recipe_book_pdf"
-                                docs.extend(pdf_docs)
-                            except Exception as e:
-                                print(f"Error loading PDF {filename}: {e}")
-                else:
-                    print(f"Warning: {pdf_dir} not found. Skipping PDF loading for {diet_type}.")
-
-            if not docs:
-                print("No documents loaded for the vector store. Ensure your data directories exist and contain files.")
-                return Chroma(embedding_function=self.embeddings, persist_directory=self.vector_db_path)
-
-            text_splitter = RecursiveCharacterTextSplitter(chunk_size=1500, chunk_overlap=200)
-            splits = text_splitter.split_documents(docs)
-
-            print(f"Adding {len(splits)} chunks to the vector store.")
-            vectorstore = Chroma.from_documents(
-                documents=splits,
-                embedding=self.embeddings,
-                persist_directory=self.vector_db_path
-            )
-            return vectorstore
+        return chromadb.PersistentClient(path=self.vector_db_path)
+
+    def _migrate_legacy_collection(self):
+        """
+        Moves chunks from the old single collection into the per-diet partitions, reusing
+        their stored vectors and ids so nothing is re-embedded and the manifest stays valid.
+        The old collection is dropped only once every chunk has a home.
+        """
+        try:
+            legacy = self._client.get_collection(LEGACY_COLLECTION_NAME)
+        except Exception:
+            return # Nothing to migrate
+        total = legacy.count()
+        print(f"Migrating {total} chunks from the shared collection into per-diet partitions.")
+        unassigned = 0
+        for offset in range(0, total, MIGRATION_BATCH_SIZE):
+            batch = legacy.get(include=["embeddings", "documents", "metadatas"],
+                               limit=MIGRATION_BATCH_SIZE, offset=offset)
+            grouped = {}
+            for chunk_id, vector, text, metadata in zip(batch["ids"], batch["embeddings"],
+                                                         batch["documents"], batch["metadatas"]):
+                partition = self.partitions.get((metadata or {}).get("dietary_type"))
+                if partition is None:
+                    unassigned += 1
+                    continue
+                group = grouped.setdefault(partition.diet_type, ([], [], [], []))
+                for column, value in zip(group, (chunk_id, vector, text, metadata)):
+                    column.append(value)
+            for diet_type, (ids, vectors, texts, metadatas) in grouped.items():
+                self.partitions[diet_type].upsert_embedded(ids, vectors, texts, metadatas)
+        for partition in self.partitions.values():
+            partition.lexical_index.save()
+        if unassigned:
+            print(f"Warning: {unassigned} chunks have no known dietary_type; keeping '{LEGACY_COLLECTION_NAME}'.")
+            return
+        self._client.delete_collection(LEGACY_COLLECTION_NAME)
+        print("Migration to per-diet partitions complete.")
+
+    def _partition_for(self, diet_type: str) -> DietPartition:
+        partition = self.partitions.get(diet_type)
+        if partition is None:
+            raise ValueError(f"Unknown dietary type '{diet_type}'. Expected one of {DIETARY_TYPES}.")
+        return partition
+
+    def _discover_pdfs(self, diet_types=None):
+        """
+        Returns (rel_path, pdf_path, filename, diet_type) for every PDF on disk in a stable
+        order, plus the set of diet directories that were actually scanned.
+        """
+        found = []
+        scanned_diets = set()
+        for diet_type in (diet_types or DIETARY_TYPES):
+            pdf_dir = os.path.join(self.pdf_base_dir, diet_type)
+            if not os.path.exists(pdf_dir):
+                print(f"Warning: {pdf_dir} not found. Skipping PDF loading for {diet_type}.")
+                continue
+            scanned_diets.add(diet_type)
+            for filename in sorted(os.listdir(pdf_dir)):
+                if filename.endswith(".pdf"):
+                    found.append((f"{diet_type}/{filename}", os.path.join(pdf_dir, filename), filename, diet_type))
+        return found, scanned_diets
+
+    def _adopt_existing_store(self):
+        """
+        Builds a manifest from a store that was created before manifests existed, so its
+        chunks are matched by content hash instead of being embedded a second time.
+        """
+        chunks = []
+        for partition in self.partitions.values():
+            existing = partition.vectorstore.get(include=["documents", "metadatas"])
+            chunks.extend(zip(existing.get("ids") or [], existing["documents"], existing["metadatas"]))
+        if not chunks:
+            return
+        print(f"No ingest manifest found. Indexing {len(chunks)} existing chunks so they are not re-embedded.")
+        for chunk_id, text, metadata in chunks:
+            metadata = metadata or {}
+            diet_type = metadata.get("dietary_type")
+            filename = metadata.get("source_file")
+            if not diet_type or not filename:
+                continue
+            rel_path = f"{diet_type}/{filename}"
+            entry = self.manifest.get(rel_path)
+            if entry is None:
+                # sha256=None forces the file to be re-split and diffed on the next sync.
+                self.manifest.set_file(rel_path, None, diet_type, {})
+                entry = self.manifest.get(rel_path)
+            entry["chunks"][chunk_id] = hash_chunk(text, metadata)
+        self.manifest.save()
+
+    def _checkpoint_due(self) -> bool:
+        return time.monotonic() - self._last_checkpoint >= self.checkpoint_seconds
+
+    def checkpoint(self):
+        """Persists the manifest and recipe index; after a crash or Ctrl+C, sync() resumes from here."""
+        self.manifest.save()
+        self.recipe_index.save()
+        self._last_checkpoint = time.monotonic()
+
+    def _embedded_batches(self, ids, docs):
+        for batch in batched(zip(ids, docs), self.ingest_batch_size):
+            yield batch, self.embeddings.embed_documents([doc.page_content for _, doc in batch])
+
+    def _apply_file_chunks(self, rel_path: str, file_hash: str, diet_type: str, splits, previous_entry,
+                           recipes=None, chunk_recipe_ids=None, progress: IngestProgress = None):
+        """Diffs a file's fresh chunks against the manifest. Returns (added, removed) chunk counts."""
+        ids_by_hash = {}
+        previous_ids = set((previous_entry or {}).get("chunks", {}))
+        for chunk_id, chunk_hash in (previous_entry or {}).get("chunks", {}).items():
+            ids_by_hash.setdefault(chunk_hash, []).append(chunk_id)
+
+        new_chunks = {}
+        occurrences = {}
+        docs_to_add, ids_to_add = [], []
+        split_ids = []
+        for doc in splits:
+            chunk_hash = hash_chunk(doc.page_content, doc.metadata)
+            reusable_ids = ids_by_hash.get(chunk_hash)
+            if reusable_ids:
+                chunk_id = reusable_ids.pop()
+            else:
+                # A repeated chunk (the same paragraph twice on a page) gets the next free occurrence:
+                # one of the file's previous ids would be overwritten, or deleted below as stale.
+                occurrence = occurrences.get(chunk_hash, 0)
+                chunk_id = make_chunk_id(rel_path, chunk_hash, occurrence)
+                while chunk_id in previous_ids or chunk_id in new_chunks:
+                    occurrence += 1
+                    chunk_id = make_chunk_id(rel_path, chunk_hash, occurrence)
+                occurrences[chunk_hash] = occurrence + 1
+                docs_to_add.append(doc)
+                ids_to_add.append(chunk_id)
+            new_chunks[chunk_id] = chunk_hash
+            split_ids.append(chunk_id)
+        stale_ids = [chunk_id for ids in ids_by_hash.values() for chunk_id in ids]
+
+        # Add before deleting: if we crash in between, the old chunks are still searchable
+        # and the deterministic ids make the retry an upsert.
+        partition = self._partition_for(diet_type)
+        previous_chunks = dict((previous_entry or {}).get("chunks", {}))
+        written = {}
+        # Batches are embedded one ahead of the write, so the embedding calls overlap the
+        # vector store writes and at most two batches of vectors are held at a time.
+        for batch, vectors in read_ahead(self._embedded_batches(ids_to_add, docs_to_add), depth=2,
+                                         name="ingest-embed"):
+            partition.upsert_embedded([chunk_id for chunk_id, _ in batch], vectors,
+                                      [doc.page_content for _, doc in batch], [doc.metadata for _, doc in batch])
+            written.update((chunk_id, new_chunks[chunk_id]) for chunk_id, _ in batch)
+            if progress is not None:
+                progress.chunks_written(embedded=len(batch))
+            if self._checkpoint_due():
+                # sha256=None keeps the file marked as changed; a resumed sync re-splits it and
+                # finds the chunks written so far by hash, so they are not embedded again.
+                self.manifest.set_file(rel_path, None, diet_type, {**previous_chunks, **written})
+                self.checkpoint()
+        if progress is not None:
+            progress.chunks_written(reused=len(splits) - len(docs_to_add))
+        # Stale chunks go before the manifest stops listing them, so none is ever orphaned.
+        partition.delete(stale_ids)
+        self.manifest.set_file(rel_path, file_hash, diet_type, new_chunks)
+        if recipes is not None:
+            self.recipe_index.set_file(rel_path, recipes, dict(zip(split_ids, chunk_recipe_ids)))
+        if self._checkpoint_due():
+            self.checkpoint()
+        return len(docs_to_add), len(stale_ids)
+
+    def _remove_file(self, rel_path: str):
+        entry = self.manifest.remove_file(rel_path)
+        chunk_ids = list((entry or {}).get("chunks", {}).keys())
+        if chunk_ids:
+            self._partition_for(entry["dietary_type"]).delete(chunk_ids)
+        self.manifest.save()
+        self.recipe_index.remove_file(rel_path)
+        self.recipe_index.save()
+        return len(chunk_ids)
+
+    def _changed_files(self, pdfs, seen: set, stats: dict, progress: IngestProgress):
+        """Hashes the discovered PDFs one by one and yields ((rel_path, ...), job) for those that need parsing."""
+        for rel_path, pdf_path, filename, diet_type in pdfs:
+            seen.add(rel_path)
+            try:
+                file_hash = hash_file(pdf_path)
+            except OSError as e:
+                print(f"Error reading PDF {filename}: {e}")
+                progress.file_done(failed=True)
+                continue
+            entry = self.manifest.get(rel_path)
+            # Files indexed before recipe extraction existed are re-parsed once; their chunks
+            # all match by hash, so nothing is re-embedded.
+            if entry and entry.get("sha256") == file_hash and self.recipe_index.has_file(rel_path):
+                stats["unchanged_files"] += 1
+                progress.file_done(skipped=True)
+                continue
+            print(f"Loading PDF: {pdf_path} (Type: {diet_type})")
+            progress.file_queued()
+            yield (rel_path, filename, diet_type, file_hash, entry), (pdf_path, filename, diet_type)
+
+    def sync(self, diet_types=None):
+        """
+        Brings the vector store in line with the PDFs under pdf_base_dir. Only new or changed
+        files are parsed, only chunks with a new content hash are embedded, and chunks from
+        deleted files are removed. Safe to call again at any time (e.g. after dropping in a PDF).
+        `diet_types` limits the sync to those partitions.
+
+        Files stream through hash -> parse/split (worker processes, a bounded number of files
+        ahead) -> embed (batches of `ingest_batch_size`, one batch ahead) -> vector store write,
+        so memory stays flat however large the library is. Progress is saved every
+        `checkpoint_seconds`, and an interrupted sync picks up where it stopped, down to the
+        batch: chunks already written are found by hash and not embedded again.
+        """
+        if not self.manifest.exists():
+            self._adopt_existing_store()
+
+        stats = {"added_chunks": 0, "removed_chunks": 0, "unchanged_files": 0,
+                 "changed_files": 0, "deleted_files": 0}
+        seen = set()
+        pdfs, scanned_diets = self._discover_pdfs(diet_types)
+        progress = IngestProgress(total_files=len(pdfs), interval_seconds=self.progress_seconds)
+        self._last_checkpoint = time.monotonic()
+
+        # Parsing and splitting is CPU-bound, so fan it out; applying the diffs stays sequential
+        # and in discovery order so the store and manifest end up the same on every run.
+        parsed_files = iter_load_and_split_pdfs(self._changed_files(pdfs, seen, stats, progress),
+                                                max_workers=self.ingest_workers,
+                                                max_pending=self.ingest_max_pending_files)
+        for (rel_path, filename, diet_type, file_hash, entry), (parsed, error) in parsed_files:
+            if error is not None:
+                # Keep whatever we had indexed for this file rather than dropping it.
+                print(f"Error loading PDF {filename}: {error}")
+                progress.file_done(failed=True)
+                continue
+            splits, recipes, chunk_recipe_ids = parsed
+            added, removed = self._apply_file_chunks(rel_path, file_hash, diet_type, splits, entry,
+                                                     recipes, chunk_recipe_ids, progress)
+            stats["changed_files"] += 1
+            stats["added_chunks"] += added
+            stats["removed_chunks"] += removed
+            progress.file_done()
+
+        for rel_path in self.manifest.tracked_files():
+            # A whole missing diet directory is more likely a moved data folder than a deletion,
+            # so only drop files from directories we actually scanned.
+            diet_type = self.manifest.get(rel_path).get("dietary_type")
+            if rel_path not in seen and diet_type in scanned_diets:
+                print(f"PDF removed from disk, dropping its chunks: {rel_path}")
+                stats["removed_chunks"] += self._remove_file(rel_path)
+                stats["deleted_files"] += 1
+
+        self.checkpoint()
+        # The BM25 files are written after the manifest, so after a crash (or for a store built
+        # before they existed) they may lag behind; the collections are the source of truth.
+        for diet_type in (diet_types or DIETARY_TYPES):
+            partition = self.partitions[diet_type]
+            chunk_ids = partition.ids()
+            if partition.lexical_index_in_sync(chunk_ids):
+                partition.lexical_index.save()
+            else:
+                partition.rebuild_lexical_index()
+            if not partition.vector_index_in_sync(chunk_ids):
+                partition.rebuild_vector_index()
+        if stats["changed_files"]:
+            progress.maybe_report(force=True)
+        self.last_sync_progress = progress.summary()
+        print(f"Knowledge base sync complete: {json.dumps(stats)}")
+        if stats["added_chunks"] or stats["removed_chunks"]:
+            self._notify_changed()
+        return stats
+
+    def rebuild_partition(self, diet_type: str):
+        """
+        Drops one diet's collection and BM25 index and re-ingests its PDFs; the other
+        partitions are not touched. Vectors come back from the embedding cache when enabled.
+        """
+        partition = self._partition_for(diet_type)
+        if not os.path.exists(os.path.join(self.pdf_base_dir, diet_type)):
+            raise FileNotFoundError(f"No PDFs for '{diet_type}' under {self.pdf_base_dir}; refusing to drop its partition.")
+        print(f"Rebuilding the {diet_type} partition.")
+        for rel_path in self.manifest.tracked_files():
+            if self.manifest.get(rel_path).get("dietary_type") == diet_type:
+                self.manifest.remove_file(rel_path)
+        self.manifest.save()
+        partition.reset()
+        stats = self.sync(diet_types=[diet_type])
+        if not (stats["added_chunks"] or stats["removed_chunks"]):
+            self._notify_changed() # An empty partition was reset, which still invalidates caches
+        return stats
 
     def get_retriever(self):
-        return self.vectorstore.as_retriever()
\ No newline at end of file
+        for partition in self.partitions.values():
+            if self.hybrid_search and not partition.lexical_index.exists():
+                # sync_on_startup=False on a store that has never been indexed lexically.
+                partition.rebuild_lexical_index()
+            if partition.vector_index is not None and not partition.vector_index.exists():
+                partition.rebuild_vector_index()
+        return PartitionedRetriever(
+            partitions=self.partitions, recipe_index=self.recipe_index, hybrid=self.hybrid_search,
+            k=self.retriever_k, fetch_k=self.hybrid_fetch_k, rrf_k=self.rrf_k
+        )
@@ -0,0 +1,202 @@
+# E:\Diet Chatbot\rag\lexical_index.py
+import os
+import re
+import json
+import math
+import threading
+from collections import Counter
+
+from langchain_core.documents import Document
+
+LEXICAL_INDEX_VERSION = 1
+
+# Small on purpose: ingredient names must never be dropped.
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on",
+    "or", "that", "the", "to", "with", "me", "my", "i", "some", "any", "recipe", "recipes",
+}
+
+
+def tokenize(text: str):
+    """Lowercased word tokens with a light plural strip, so "tomatoes" finds "tomato"."""
+    tokens = []
+    for token in re.findall(r"[a-z0-9]+", (text or "").lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 4 and token.endswith("oes"):
+            token = token[:-2]
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def matches_filter(metadata: dict, where: dict) -> bool:
+    """Evaluates the subset of Chroma's `where` syntax the tools use ($and/$or/$eq/$ne/$in)."""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, operand in condition.items():
+                if op == "$eq" and value != operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index over the knowledge base chunks, kept in step with the vector
+    store by KnowledgeBase.sync() and stored as JSON next to the Chroma files (one per diet partition).
+
+    Dense search misses exact dish and ingredient names ("paneer tikka", "tahini"); this
+    index catches them without any network call. Chunks are keyed by their vector store id
+    so results from both indexes can be fused.
+
+    The file is read on first use rather than when the index is created: re-tokenizing the
+    corpus is the slow part of startup, and a knowledge base that never searches lexically
+    (hybrid search off) never pays for it.
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._docs = {} # chunk id -> {"text", "metadata", "length"}
+        self._postings = {} # term -> {chunk id: term frequency}
+        self._total_length = 0
+        self._lock = threading.RLock()
+        self._loaded = False
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def __len__(self):
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._docs)
+
+    def ids(self):
+        with self._lock:
+            self._ensure_loaded()
+            return set(self._docs.keys())
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    def load(self):
+        with self._lock:
+            self._docs, self._postings, self._total_length = {}, {}, 0
+            self._loaded = True
+            if not self.exists():
+                return
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Could not read lexical index {self.path}: {e}. It will be rebuilt.")
+                return
+            if data.get("version") != LEXICAL_INDEX_VERSION:
+                print(f"Ignoring lexical index with unknown version: {data.get('version')}")
+                return
+            # Postings are derived data, so only the chunks are stored and the index is rebuilt on load.
+            for chunk_id, doc in data.get("docs", {}).items():
+                self._index(chunk_id, doc["text"], doc.get("metadata") or {})
+
+    def save(self):
+        with self._lock:
+            self._ensure_loaded()
+            payload = {
+                "version": LEXICAL_INDEX_VERSION,
+                "docs": {chunk_id: {"text": doc["text"], "metadata": doc["metadata"]}
+                         for chunk_id, doc in self._docs.items()},
+            }
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, self.path)
+
+    def _index(self, chunk_id: str, text: str, metadata: dict):
+        self._unindex(chunk_id)
+        counts = Counter(tokenize(text))
+        length = sum(counts.values())
+        self._docs[chunk_id] = {"text": text, "metadata": metadata, "length": length}
+        self._total_length += length
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[chunk_id] = tf
+
+    def _unindex(self, chunk_id: str):
+        doc = self._docs.pop(chunk_id, None)
+        if doc is None:
+            return
+        self._total_length -= doc["length"]
+        for term in set(tokenize(doc["text"])):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def add(self, ids, documents):
+        """Adds or replaces chunks (same ids as the vector store)."""
+        with self._lock:
+            self._ensure_loaded()
+            for chunk_id, doc in zip(ids, documents):
+                self._index(chunk_id, doc.page_content, dict(doc.metadata or {}))
+
+    def delete(self, ids):
+        with self._lock:
+            self._ensure_loaded()
+            for chunk_id in ids:
+                self._unindex(chunk_id)
+
+    def clear(self):
+        with self._lock:
+            self._docs, self._postings, self._total_length = {}, {}, 0
+            self._loaded = True
+
+    def search(self, query: str, k: int = 4, filter: dict = None):
+        """Returns up to k (Document, score) pairs, best first, honouring a Chroma-style filter."""
+        terms = set(tokenize(query))
+        with self._lock:
+            self._ensure_loaded()
+            n_docs = len(self._docs)
+            if not terms or not n_docs:
+                return []
+            avg_length = self._total_length / n_docs or 1.0
+            scores = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, tf in postings.items():
+                    length = self._docs[chunk_id]["length"]
+                    denominator = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / denominator
+
+            results = []
+            for chunk_id, score in sorted(scores.items(), key=lambda item: (-item[1], item[0])):
+                doc = self._docs[chunk_id]
+                if not matches_filter(doc["metadata"], filter):
+                    continue
+                results.append((Document(page_content=doc["text"], metadata=dict(doc["metadata"]), id=chunk_id), score))
+                if len(results) >= k:
+                    break
+            return results
@@ -0,0 +1,106 @@
+# E:\Diet Chatbot\rag\manifest.py
+import os
+import json
+import hashlib
+
+MANIFEST_FILENAME = "ingest_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def hash_file(path: str) -> str:
+    """sha256 of a file's bytes, read in blocks so large PDFs don't sit in memory."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_chunk(page_content: str, metadata: dict) -> str:
+    """sha256 of a chunk's text plus its metadata (page numbers etc. count as content)."""
+    payload = json.dumps({"text": page_content, "metadata": metadata}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class IngestionManifest:
+    """
+    Records what has already been embedded into the vector store.
+
+    Layout on disk (JSON):
+        {"version": 1,
+         "files": {"vegan/vegan_meal_guide.pdf": {"sha256": "...",
+                                                  "dietary_type": "vegan",
+                                                  "chunks": {"<vector store id>": "<chunk sha256>", ...}}}}
+
+    A file whose sha256 matches is skipped entirely. A changed file is re-split and diffed
+    chunk by chunk, so only chunks whose hash is new get embedded.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files = {}
+        self.load()
+
+    @classmethod
+    def for_vector_db(cls, vector_db_path: str):
+        return cls(os.path.join(vector_db_path, MANIFEST_FILENAME))
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def load(self):
+        if not self.exists():
+            self.files = {}
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != MANIFEST_VERSION:
+                print(f"Ignoring ingest manifest with unknown version: {data.get('version')}")
+                self.files = {}
+            else:
+                self.files = data.get("files", {})
+        except (OSError, ValueError) as e:
+            print(f"Could not read ingest manifest {self.path}: {e}. Starting from an empty manifest.")
+            self.files = {}
+
+    def save(self):
+        # Write to a temp file and rename so a crash never leaves a half-written manifest.
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "files": self.files}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def get(self, rel_path: str):
+        return self.files.get(rel_path)
+
+    def set_file(self, rel_path: str, file_hash, dietary_type: str, chunks: dict):
+        self.files[rel_path] = {
+            "sha256": file_hash,
+            "dietary_type": dietary_type,
+            "chunks": chunks,
+        }
+
+    def remove_file(self, rel_path: str):
+        return self.files.pop(rel_path, None)
+
+    def tracked_files(self):
+        return list(self.files.keys())
+
+    def fingerprint(self) -> str:
+        """sha256 over every tracked chunk id and hash; changes whenever the indexed content does."""
+        digest = hashlib.sha256()
+        for rel_path in sorted(self.files):
+            digest.update(rel_path.encode("utf-8"))
+            for chunk_id, chunk_hash in sorted((self.files[rel_path].get("chunks") or {}).items()):
+                digest.update(f"\0{chunk_id}\0{chunk_hash}".encode("utf-8"))
+        return digest.hexdigest()
+
+
+def make_chunk_id(rel_path: str, chunk_hash: str, occurrence: int = 0) -> str:
+    """
+    Deterministic vector store id for a chunk. Re-adding the same chunk after a crash
+    upserts onto the same id instead of leaving an orphaned duplicate behind.
+    """
+    return hashlib.sha256(f"{rel_path}\0{chunk_hash}\0{occurrence}".encode("utf-8")).hexdigest()
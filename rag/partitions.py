@@ -0,0 +1,189 @@
+# E:\Diet Chatbot\rag\partitions.py
+import os
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from langchain_chroma import Chroma
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from metrics import get_metrics
+
+from .lexical_index import BM25Index
+from .vector_index import MmapVectorIndex, UnsupportedFilter
+from .rank_fusion import reciprocal_rank_fusion
+
+COLLECTION_PREFIX = "recipes_"
+
+
+class DietPartition:
+    """
+    One dietary type's slice of the knowledge base: its own Chroma collection (own HNSW
+    graph) and its own BM25 index, so a filtered query only searches the chunks it can
+    return and a partition can be dropped and rebuilt without touching the others.
+    With a `vector_index` (see rag/vector_index.py), dense search reads that memory-mapped
+    copy of the collection's vectors instead; Chroma stays the store that sync() writes to.
+    """
+
+    def __init__(self, diet_type: str, client, vector_db_path: str, embeddings,
+                 vector_index: Optional[MmapVectorIndex] = None):
+        self.diet_type = diet_type
+        self.embeddings = embeddings
+        self.vector_index = vector_index
+        self.collection_name = COLLECTION_PREFIX + diet_type
+        self.vectorstore = Chroma(
+            client=client,
+            collection_name=self.collection_name,
+            embedding_function=embeddings
+        )
+        self.lexical_index = BM25Index(os.path.join(vector_db_path, f"bm25_{diet_type}.json"))
+
+    def count(self) -> int:
+        return self.vectorstore._collection.count()
+
+    def ids(self):
+        return set(self.vectorstore.get(include=[]).get("ids") or [])
+
+    def add(self, ids, documents):
+        self.vectorstore.add_documents(documents, ids=ids)
+        self.lexical_index.add(ids, documents)
+
+    def upsert_embedded(self, ids, embeddings, documents, metadatas):
+        """Adds chunks whose vectors are already known (migration), without calling the embedder."""
+        self.vectorstore._collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        self.lexical_index.add(ids, [Document(page_content=text, metadata=metadata or {})
+                                     for text, metadata in zip(documents, metadatas)])
+
+    def delete(self, ids):
+        if ids:
+            self.vectorstore.delete(ids=list(ids))
+            self.lexical_index.delete(ids)
+
+    def reset(self):
+        self.vectorstore.reset_collection()
+        self.lexical_index.clear()
+        self.lexical_index.save()
+
+    def lexical_index_in_sync(self, ids=None) -> bool:
+        return self.lexical_index.exists() and self.lexical_index.ids() == (self.ids() if ids is None else ids)
+
+    def rebuild_lexical_index(self):
+        """Rebuilds the BM25 index from the chunks already in the collection (no embedding calls)."""
+        existing = self.vectorstore.get(include=["documents", "metadatas"])
+        ids = existing.get("ids") or []
+        self.lexical_index.clear()
+        self.lexical_index.add(ids, [
+            Document(page_content=text, metadata=metadata or {})
+            for text, metadata in zip(existing["documents"], existing["metadatas"])
+        ])
+        self.lexical_index.save()
+        print(f"Rebuilt BM25 index for {self.diet_type} over {len(ids)} chunks.")
+
+    def vector_index_in_sync(self, ids=None) -> bool:
+        if self.vector_index is None:
+            return True
+        return self.vector_index.exists() and self.vector_index.ids() == (self.ids() if ids is None else ids)
+
+    def rebuild_vector_index(self):
+        """Re-exports the collection's stored vectors into the memory-mapped index (no embedding calls)."""
+        if self.vector_index is not None:
+            self.vector_index.rebuild_from(self.vectorstore._collection)
+
+    def dense_search(self, query: str, k: int, filter: Optional[dict] = None):
+        if self.vector_index is not None and self.vector_index.exists():
+            try:
+                return self.vector_index.search_documents(self.embeddings.embed_query(query), k, filter)
+            except UnsupportedFilter:
+                pass # Filters on other metadata keys still go to Chroma
+        k = min(k, self.count())
+        if k <= 0:
+            return []
+        return self.vectorstore.similarity_search_with_score(query, k=k, **({"filter": filter} if filter else {}))
+
+    def lexical_search(self, query: str, k: int, filter: Optional[dict] = None):
+        return self.lexical_index.search(query, k=k, filter=filter)
+
+
+class PartitionedRetriever(BaseRetriever):
+    """
+    Retriever over the per-diet partitions. `dietary_type=` picks one partition directly;
+    without it, every partition is searched and the results merged (the combined view used
+    for general queries). With `hybrid` on, each search fuses vector and BM25 rankings with
+    reciprocal rank fusion. Still accepts a Chroma-style `filter=` for other metadata.
+    `exclude=` (allergens or ingredients) drops every chunk of a recipe that contains one,
+    using the RecipeIndex, before the top k are picked.
+    """
+
+    partitions: Dict[str, Any]
+    recipe_index: Any = None
+    hybrid: bool = True
+    k: int = 4
+    fetch_k: int = 20 # Candidates taken from each index before fusion
+    rrf_k: int = 60
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def _select(self, dietary_type: Optional[str]) -> List[DietPartition]:
+        if not dietary_type:
+            return list(self.partitions.values())
+        partition = self.partitions.get(dietary_type)
+        if partition is None:
+            print(f"No knowledge base partition for dietary type '{dietary_type}'.")
+            return []
+        return [partition]
+
+    def _allowed(self, docs: List[Document], exclude) -> List[Document]:
+        if not exclude or self.recipe_index is None:
+            return docs
+        allowed = [doc for doc in docs if not self.recipe_index.is_excluded(doc.id, doc.page_content, exclude)]
+        if len(allowed) < len(docs):
+            get_metrics().incr("retrieval_excluded_chunks_total", value=len(docs) - len(allowed))
+        return allowed
+
+    def _with_recipe_titles(self, docs: List[Document]) -> List[Document]:
+        # Lets the context packer cite "vegan_meal_guide.pdf, p. 12 — Chickpea Curry".
+        if self.recipe_index is not None:
+            for doc in docs:
+                titles = self.recipe_index.titles_for(doc.id)
+                if titles:
+                    doc.metadata["recipes"] = ", ".join(titles)
+        return docs
+
+    def _fuse(self, dense_results, lexical_results, exclude=None) -> List[Document]:
+        # Chroma returns distances (lower is better); BM25 returns scores (higher is better).
+        dense = sorted((pair for pairs in dense_results for pair in pairs), key=lambda pair: pair[1])
+        dense_docs = self._allowed([doc for doc, _ in dense[:self.fetch_k]], exclude)
+        if not self.hybrid:
+            return self._with_recipe_titles(dense_docs[:self.k])
+        lexical = sorted((pair for pairs in lexical_results for pair in pairs), key=lambda pair: -pair[1])
+        lexical_docs = self._allowed([doc for doc, _ in lexical[:self.fetch_k]], exclude)
+        return self._with_recipe_titles(
+            reciprocal_rank_fusion([dense_docs, lexical_docs], k=self.k, rrf_k=self.rrf_k)
+        )
+
+    def _lexical(self, partitions, query: str, filter: Optional[dict]):
+        if not self.hybrid:
+            return []
+        return [partition.lexical_search(query, self.fetch_k, filter) for partition in partitions]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                dietary_type: Optional[str] = None, filter: Optional[dict] = None,
+                                exclude: Optional[List[str]] = None) -> List[Document]:
+        partitions = self._select(dietary_type)
+        dense = [partition.dense_search(query, self.fetch_k, filter) for partition in partitions]
+        return self._fuse(dense, self._lexical(partitions, query, filter), exclude)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun,
+                                       dietary_type: Optional[str] = None,
+                                       filter: Optional[dict] = None,
+                                       exclude: Optional[List[str]] = None) -> List[Document]:
+        partitions = self._select(dietary_type)
+        # Chroma's client is synchronous; fan the partition searches out over threads.
+        dense, lexical = await asyncio.gather(
+            asyncio.gather(*(asyncio.to_thread(partition.dense_search, query, self.fetch_k, filter)
+                             for partition in partitions)),
+            asyncio.to_thread(self._lexical, partitions, query, filter),
+        )
+        return self._fuse(list(dense), lexical, exclude)
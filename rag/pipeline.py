@@ -0,0 +1,153 @@
+# E:\Diet Chatbot\rag\pipeline.py
+import sys
+import time
+import queue
+import threading
+from itertools import islice
+
+try:
+    import resource # Unix only; peak memory is left out of progress lines elsewhere
+except ImportError:
+    resource = None
+
+_DONE = object()
+
+
+def batched(iterable, size: int):
+    """Yields lists of up to `size` items, without materializing the iterable."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, max(1, size)))
+        if not batch:
+            return
+        yield batch
+
+
+def read_ahead(iterable, depth: int = 2, name: str = "read-ahead"):
+    """
+    Yields the items of `iterable`, computed in a background thread at most `depth` items
+    ahead of the consumer. Use it to overlap one pipeline stage with the next (e.g. embed the
+    next batch while this one is written) without letting the producer run away with memory.
+    Errors in the producer are re-raised in the consumer; if the consumer stops early, the
+    producer stops at its next item.
+    """
+    buffer = queue.Queue(maxsize=max(1, depth))
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((_DONE, None))
+        except BaseException as e:
+            put((_DONE, e))
+
+    thread = threading.Thread(target=produce, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
+
+
+def peak_memory_mb():
+    """Peak resident memory of this process in MB (one decimal), or None where the platform can't tell."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux.
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+class IngestProgress:
+    """
+    Counts files and chunks as a sync runs and prints a progress line at most every
+    `interval_seconds`: files done out of the total, chunks embedded and reused, throughput,
+    an ETA and peak memory. `summary()` returns the same numbers as a dict.
+    """
+
+    def __init__(self, total_files: int = 0, interval_seconds: float = 10.0, label: str = "Ingest"):
+        self.total_files = total_files
+        self.interval_seconds = interval_seconds
+        self.label = label
+        self.started = time.monotonic()
+        self._last_report = self.started
+        self.files_done = 0
+        self.files_skipped = 0
+        self.files_failed = 0
+        self.files_queued = 0
+        self.chunks_embedded = 0
+        self.chunks_reused = 0
+
+    def file_done(self, skipped: bool = False, failed: bool = False):
+        self.files_done += 1
+        self.files_skipped += skipped
+        self.files_failed += failed
+        self.maybe_report()
+
+    def file_queued(self):
+        """A file was found to be new or changed and will be parsed."""
+        self.files_queued += 1
+
+    def _files_left_to_parse(self) -> float:
+        # Queued files are known to need parsing; of the files not hashed yet, assume the same
+        # share is changed as among those hashed so far.
+        parsed = self.files_done - self.files_skipped
+        hashed = self.files_queued + self.files_skipped
+        unhashed = max(self.total_files - hashed, 0)
+        changed_share = self.files_queued / hashed if hashed else 1.0
+        return max(self.files_queued - parsed, 0) + unhashed * changed_share
+
+    def chunks_written(self, embedded: int = 0, reused: int = 0):
+        self.chunks_embedded += embedded
+        self.chunks_reused += reused
+        self.maybe_report()
+
+    def summary(self) -> dict:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        parsed = self.files_done - self.files_skipped
+        return {
+            "files_done": self.files_done,
+            "files_total": self.total_files,
+            "files_skipped": self.files_skipped,
+            "files_failed": self.files_failed,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_reused": self.chunks_reused,
+            "seconds": round(elapsed, 1),
+            "chunks_per_second": round(self.chunks_embedded / elapsed, 1),
+            "files_per_second": round(parsed / elapsed, 2),
+            # Unchanged files take no time: only the files still expected to be parsed count, at
+            # the average time of those parsed so far.
+            "eta_seconds": round(self._files_left_to_parse() * elapsed / parsed) if parsed else None,
+            "peak_memory_mb": peak_memory_mb(),
+        }
+
+    def maybe_report(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_report < self.interval_seconds:
+            return
+        self._last_report = now
+        s = self.summary()
+        line = (f"{self.label}: {s['files_done']}/{s['files_total']} files, {s['chunks_embedded']} chunks embedded "
+                f"({s['chunks_reused']} reused), {s['chunks_per_second']} chunks/s, {s['files_per_second']} files/s")
+        if s["eta_seconds"] is not None and s["files_done"] < s["files_total"]:
+            line += f", ETA {s['eta_seconds']}s"
+        if s["peak_memory_mb"] is not None:
+            line += f", peak memory {s['peak_memory_mb']} MB"
+        print(line)
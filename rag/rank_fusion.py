@@ -0,0 +1,21 @@
+# E:\Diet Chatbot\rag\rank_fusion.py
+from typing import List
+
+from langchain_core.documents import Document
+
+
+def _doc_key(doc: Document):
+    # Chroma and the BM25 index both return the chunk's store id; fall back to the content.
+    return doc.id or (doc.metadata.get("source_file"), doc.metadata.get("page"), doc.page_content)
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Document]], k: int, rrf_k: int = 60) -> List[Document]:
+    """Merges ranked lists by summing 1 / (rrf_k + rank); scores from the two indexes never need comparing."""
+    scores, docs = {}, {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            key = _doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    ranked = sorted(scores.items(), key=lambda item: -item[1])
+    return [docs[key] for key, _ in ranked[:k]]
@@ -0,0 +1,354 @@
+# E:\Diet Chatbot\rag\recipes.py
+import os
+import re
+import json
+import hashlib
+import threading
+from dataclasses import dataclass, field, asdict
+from typing import List
+
+from .lexical_index import tokenize
+
+RECIPE_INDEX_FILENAME = "recipe_index.json"
+RECIPE_INDEX_VERSION = 2 # 2: book and section headings are no longer recipes
+
+# Allergen (or excluded meat) -> ingredient words that contain it. Matching is whole-word,
+# so "eggplant", "butternut" and "cornflour" do not trip "egg", "butter" and "flour".
+ALLERGEN_INGREDIENTS = {
+    "gluten": ["wheat", "flour", "maida", "atta", "bread", "breadcrumb", "pasta", "noodle", "spaghetti",
+               "barley", "rye", "semolina", "sooji", "rava", "couscous", "seitan", "soy sauce", "soya sauce",
+               "tortilla", "pita", "cracker", "biscuit", "worcestershire", "worchestershire"],
+    "dairy": ["milk", "butter", "cheese", "cream", "curd", "yogurt", "yoghurt", "ghee", "paneer", "khoa",
+              "whey", "buttermilk", "malai", "parmesan", "mozzarella"],
+    "nuts": ["almond", "cashew", "walnut", "pecan", "pistachio", "hazelnut", "peanut", "macadamia",
+             "brazil nut", "pine nut"],
+    "peanuts": ["peanut"],
+    "eggs": ["egg", "mayonnaise", "mayo"],
+    "soy": ["soy", "soya", "tofu", "tempeh", "edamame", "miso"],
+    "shellfish": ["shrimp", "prawn", "crab", "lobster", "scallop", "mussel", "clam", "oyster"],
+    "fish": ["fish", "salmon", "tuna", "cod", "sardine", "anchovy", "mackerel", "tilapia", "pomfret"],
+    "sesame": ["sesame", "tahini"],
+    "pork": ["pork", "bacon", "ham", "prosciutto", "pepperoni", "salami", "lard", "chorizo"],
+    "beef": ["beef", "veal", "steak", "brisket"],
+}
+# Phrases that look like an allergen but are not ("almond milk" is not dairy).
+ALLERGEN_EXCEPTIONS = {
+    "dairy": ["coconut milk", "almond milk", "soy milk", "soya milk", "oat milk", "cashew milk", "rice milk",
+              "hemp milk", "coconut cream", "cashew cream", "peanut butter", "almond butter", "nut butter",
+              "cashew butter", "sunflower butter", "cocoa butter", "vegan butter", "vegan cheese",
+              "dairy-free", "dairy free", "cream of tartar"],
+    "gluten": ["gluten-free", "gluten free", "rice flour", "chickpea flour", "almond flour", "coconut flour",
+               "oat flour", "buckwheat flour", "tapioca flour", "rice noodle", "rice paper"],
+    "eggs": ["vegan mayo", "vegan mayonnaise", "egg-free", "egg free", "flax egg", "chia egg"],
+}
+# How users (and the orchestrator) tend to name allergies -> our allergen keys.
+ALLERGEN_ALIASES = {
+    "lactose": "dairy", "milk": "dairy", "nut": "nuts", "tree nuts": "nuts", "tree nut": "nuts",
+    "peanut": "peanuts", "egg": "eggs", "celiac": "gluten", "coeliac": "gluten", "wheat": "gluten",
+    "soya": "soy", "seafood": "shellfish", "sesame seeds": "sesame",
+}
+
+SECTION_WORDS = {"INGREDIENTS", "METHOD", "PROCEDURE", "DIRECTIONS", "INSTRUCTIONS", "BACK", "TO", "TOP",
+                 "TOPPINGS", "FOR", "THE", "SERVES", "NOTES", "NOTE", "IN"}
+_TITLE_RE = re.compile(r"^\s*((?:[A-Z][A-Z0-9'’&\-]+[ \t]+)+[A-Z][A-Z0-9'’&\-]+)(?![a-z])")
+_STEP_RE = re.compile(r"^\s*\d+\s*\.\s*\S")
+_BULLET_RE = re.compile(r"^\s*[•\-\*]\s*")
+# An amount with a unit ("1/2 cup", "800 gms.", "1\2 tsp", "½ tsp"): the mark of an ingredient line.
+_QUANTITY_RE = re.compile(
+    r"(?:\d+(?:\s*[./\\-]\s*\d+)?|[½¼¾⅓⅔])\s*(?:cups?|tbsps?|tsps?|tablespoons?|teaspoons?|gms?|grams?|g|kg|ml|"
+    r"l|litres?|liters?|oz|ounces?|lbs?|pounds?|nos?|cloves?|pinch|inch(?:es)?)\b", re.IGNORECASE
+)
+
+
+def normalize_exclusion(term: str) -> str:
+    """"Gluten-free", "peanut allergy", "Lactose" -> "gluten", "peanuts", "dairy"; other terms are kept as ingredients."""
+    term = re.sub(r"[\s_]+", " ", (term or "").lower()).strip(" .,;")
+    term = re.sub(r"(?:[- ]?free| allerg(?:y|ies|ic)| intoleran(?:t|ce))$", "", term).strip()
+    return ALLERGEN_ALIASES.get(term, term)
+
+
+def _term_pattern(term: str):
+    words = [re.escape(word) for word in term.split()]
+    return re.compile(r"(?<![a-z])" + r"[\s\-]+".join(words) + r"(?:s|es)?(?![a-z])")
+
+
+_ALLERGEN_PATTERNS = {allergen: [_term_pattern(term) for term in terms]
+                      for allergen, terms in ALLERGEN_INGREDIENTS.items()}
+
+
+def text_mentions(text: str, term: str) -> bool:
+    """True if `text` mentions the allergen or ingredient `term` (already normalized)."""
+    text = (text or "").lower()
+    patterns = _ALLERGEN_PATTERNS.get(term)
+    if patterns is None:
+        return bool(_term_pattern(term).search(text))
+    for line in text.splitlines():
+        for exception in ALLERGEN_EXCEPTIONS.get(term, []):
+            line = line.replace(exception, " ")
+        if any(pattern.search(line) for pattern in patterns):
+            return True
+    return False
+
+
+def detect_allergens(text: str) -> List[str]:
+    return sorted(allergen for allergen in ALLERGEN_INGREDIENTS if text_mentions(text, allergen))
+
+
+@dataclass
+class RecipeRecord:
+    recipe_id: str
+    title: str
+    source_file: str
+    dietary_type: str
+    pages: List[int]
+    ingredients: List[str] = field(default_factory=list)
+    steps: List[str] = field(default_factory=list)
+    allergens: List[str] = field(default_factory=list)
+    spans: List[list] = field(default_factory=list) # [page, start, end] offsets into the page text
+
+
+def _title_of(line: str):
+    match = _TITLE_RE.match(line)
+    if not match:
+        return None
+    title = re.sub(r"\s+", " ", match.group(1)).strip()
+    words = title.split()
+    if len(words) < 2 or all(word in SECTION_WORDS for word in words):
+        return None
+    return title.title()
+
+
+def _has_recipe_body(lines: List[str]) -> bool:
+    """
+    Ingredient lines (bulleted, or an amount with a unit) or numbered steps under an
+    INGREDIENTS header. Book titles, section headings ("Light Meals"), contents lists and
+    numbered tips have neither, so they are not taken for recipes.
+    """
+    if any(line.lstrip().startswith("•") or _QUANTITY_RE.search(line) for line in lines):
+        return True
+    return any(_STEP_RE.match(line) for line in lines) and any("INGREDIENTS" in line.upper() for line in lines)
+
+
+def _split_sections(lines: List[str]):
+    """Splits a recipe's body lines into (ingredients, steps), for bulleted and column layouts."""
+    lines = [line.strip() for line in lines if line.strip()]
+    lines = [line for line in lines if not all(word in SECTION_WORDS for word in line.upper().split())]
+    if any(line.startswith("•") for line in lines):
+        ingredients, steps, in_bullet = [], [], False
+        for line in lines:
+            if line.startswith("•"):
+                ingredients.append(_BULLET_RE.sub("", line))
+                in_bullet = True
+            elif in_bullet and not _STEP_RE.match(line) and line[:1].islower():
+                ingredients[-1] += " " + line # Bullet text wrapped onto the next line
+            else:
+                in_bullet = False
+                steps.append(line)
+        return ingredients, steps
+    for i, line in enumerate(lines):
+        if _STEP_RE.match(line):
+            return lines[:i], lines[i:]
+    return lines, []
+
+
+def _running_lines(pdf_docs) -> set:
+    """Lines printed on most pages (running headers/footers); they belong to no recipe."""
+    counts = {}
+    for doc in pdf_docs:
+        for line in {line.strip() for line in doc.page_content.splitlines() if line.strip()}:
+            counts[line] = counts.get(line, 0) + 1
+    threshold = max(3, len(pdf_docs) // 2)
+    return {line for line, count in counts.items() if count >= threshold}
+
+
+def segment_recipes(pdf_docs, source_file: str, diet_type: str, rel_path: str = None) -> List[RecipeRecord]:
+    """
+    Cuts a recipe book's pages into recipe records. A recipe starts at an upper-case title
+    line (two or more capitalised words that are not section headers) and runs until the
+    next title, across page breaks. A title counts only if ingredients or steps follow it, so
+    headings like "NON-VEGETARIAN DISHES" (over a contents list naming "Beef Steaks") don't
+    become records. Best effort: books without such titles yield no records.
+    """
+    rel_path = rel_path or f"{diet_type}/{source_file}"
+    running_lines = _running_lines(pdf_docs)
+    records, current, body = [], None, []
+    occurrences = {}
+
+    def finish():
+        if current is None or not _has_recipe_body(body):
+            return
+        current.ingredients, current.steps = _split_sections(body)
+        current.allergens = detect_allergens("\n".join([current.title] + current.ingredients + current.steps))
+        records.append(current)
+
+    for doc in pdf_docs:
+        page = doc.metadata.get("page", 0)
+        text = doc.page_content
+        offset = 0
+        for line in text.splitlines(keepends=True):
+            start, offset = offset, offset + len(line)
+            if line.strip() in running_lines:
+                continue
+            title = _title_of(line)
+            if title is not None:
+                finish()
+                occurrence = occurrences.get(title, 0)
+                occurrences[title] = occurrence + 1
+                recipe_id = hashlib.sha256(f"{rel_path}\0{title}\0{occurrence}".encode("utf-8")).hexdigest()[:16]
+                current = RecipeRecord(recipe_id=recipe_id, title=title, source_file=source_file,
+                                       dietary_type=diet_type, pages=[page], spans=[[page, start, offset]])
+                body = [line[len(_TITLE_RE.match(line).group(0)):]]
+                continue
+            if current is None:
+                continue
+            if current.spans[-1][0] != page:
+                current.pages.append(page)
+                current.spans.append([page, start, offset])
+            current.spans[-1][2] = offset
+            body.append(line)
+    finish()
+    return records
+
+
+def map_chunks_to_recipes(pdf_docs, splits, recipes: List[RecipeRecord]) -> List[List[str]]:
+    """Returns, for each split, the ids of the recipes whose text it overlaps."""
+    page_texts = {doc.metadata.get("page", 0): doc.page_content for doc in pdf_docs}
+    spans_by_page = {}
+    for recipe in recipes:
+        for page, start, end in recipe.spans:
+            spans_by_page.setdefault(page, []).append((start, end, recipe.recipe_id))
+    mapping = []
+    for split in splits:
+        page = split.metadata.get("page", 0)
+        spans = spans_by_page.get(page, [])
+        start = page_texts.get(page, "").find(split.page_content)
+        if start < 0:
+            # The splitter trims whitespace, so the chunk is normally found verbatim; if not,
+            # attribute it to every recipe on its page rather than to none.
+            ids = [recipe_id for _, _, recipe_id in spans]
+        else:
+            end = start + len(split.page_content)
+            ids = [recipe_id for span_start, span_end, recipe_id in spans if span_start < end and start < span_end]
+        mapping.append(sorted(set(ids)))
+    return mapping
+
+
+class RecipeIndex:
+    """
+    Recipe records extracted at ingest time plus the inverted indexes built over them:
+    ingredient term -> recipes, allergen -> recipes and chunk id -> recipes.
+
+    Retrieval uses it to drop every chunk of a recipe that contains an excluded allergen or
+    ingredient, deterministically and before anything reaches the LLM. Stored as JSON next
+    to the vector store, per source file, so sync() can replace one file's recipes at a time.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files = {} # rel_path -> {"recipes": {recipe_id: record dict}, "chunks": {chunk_id: [recipe_id]}}
+        self._lock = threading.RLock()
+        self._recipes = {}
+        self._chunk_recipes = {}
+        self._by_allergen = {}
+        self._by_ingredient = {}
+        self.load()
+
+    @classmethod
+    def for_vector_db(cls, vector_db_path: str):
+        return cls(os.path.join(vector_db_path, RECIPE_INDEX_FILENAME))
+
+    def load(self):
+        with self._lock:
+            self.files = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                    if data.get("version") == RECIPE_INDEX_VERSION:
+                        self.files = data.get("files", {})
+                    else:
+                        print(f"Ignoring recipe index with unknown version: {data.get('version')}")
+                except (OSError, ValueError) as e:
+                    print(f"Could not read recipe index {self.path}: {e}. Recipes will be re-extracted.")
+            self._reindex()
+
+    def save(self):
+        with self._lock:
+            payload = json.dumps({"version": RECIPE_INDEX_VERSION, "files": self.files})
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp_path, self.path)
+
+    def _reindex(self):
+        self._recipes, self._chunk_recipes, self._by_allergen, self._by_ingredient = {}, {}, {}, {}
+        for entry in self.files.values():
+            for recipe_id, recipe in entry["recipes"].items():
+                self._recipes[recipe_id] = recipe
+                if not recipe["ingredients"]:
+                    continue # Nothing parsed to exclude it by; its chunks are checked by their own text
+                for allergen in recipe["allergens"]:
+                    self._by_allergen.setdefault(allergen, set()).add(recipe_id)
+                for term in set(tokenize(" ".join([recipe["title"]] + recipe["ingredients"]))):
+                    self._by_ingredient.setdefault(term, set()).add(recipe_id)
+            for chunk_id, recipe_ids in entry["chunks"].items():
+                self._chunk_recipes.setdefault(chunk_id, set()).update(recipe_ids)
+
+    def has_file(self, rel_path: str) -> bool:
+        return rel_path in self.files
+
+    def set_file(self, rel_path: str, recipes: List[RecipeRecord], chunk_recipe_ids: dict):
+        with self._lock:
+            self.files[rel_path] = {
+                "recipes": {recipe.recipe_id: asdict(recipe) for recipe in recipes},
+                "chunks": {chunk_id: ids for chunk_id, ids in chunk_recipe_ids.items() if ids},
+            }
+            self._reindex()
+
+    def remove_file(self, rel_path: str):
+        with self._lock:
+            if self.files.pop(rel_path, None) is not None:
+                self._reindex()
+
+    def get(self, recipe_id: str):
+        return self._recipes.get(recipe_id)
+
+    def titles_for(self, chunk_id: str) -> List[str]:
+        """Titles of the recipes a chunk overlaps, in page order (for citations)."""
+        with self._lock:
+            recipes = [self._recipes[recipe_id] for recipe_id in self._chunk_recipes.get(chunk_id, ())
+                       if recipe_id in self._recipes]
+        return [recipe["title"] for recipe in sorted(recipes, key=lambda recipe: recipe["pages"][:1])]
+
+    def recipes_with(self, term: str) -> set:
+        """Recipe ids that contain an allergen or ingredient (normalized via normalize_exclusion)."""
+        term = normalize_exclusion(term)
+        with self._lock:
+            if term in self._by_allergen or term in ALLERGEN_INGREDIENTS:
+                return set(self._by_allergen.get(term, ()))
+            tokens = tokenize(term)
+            if not tokens:
+                return set()
+            matches = set(self._by_ingredient.get(tokens[0], ()))
+            for token in tokens[1:]:
+                matches &= self._by_ingredient.get(token, set())
+            # The token index over-approximates multi-word terms; confirm against the text.
+            return {recipe_id for recipe_id in matches if text_mentions(
+                " ".join([self._recipes[recipe_id]["title"]] + self._recipes[recipe_id]["ingredients"]), term)}
+
+    def is_excluded(self, chunk_id: str, text: str, exclusions) -> bool:
+        """
+        True if the chunk belongs to a recipe containing any excluded term. Chunks that were
+        not mapped to a recipe with parsed ingredients (e.g. from books without recognisable
+        titles) are checked against their own text instead.
+        """
+        terms = [normalize_exclusion(term) for term in exclusions or [] if term and term.strip()]
+        if not terms:
+            return False
+        with self._lock:
+            recipe_ids = {recipe_id for recipe_id in self._chunk_recipes.get(chunk_id, ())
+                          if self._recipes.get(recipe_id, {}).get("ingredients")}
+        if not recipe_ids:
+            return any(text_mentions(text, term) for term in terms)
+        return any(recipe_ids & self.recipes_with(term) for term in terms)
@@ -0,0 +1,76 @@
+# E:\Diet Chatbot\rag\retrieval_cache.py
+import re
+import time
+import threading
+from collections import OrderedDict
+
+
+def normalize_query(query: str) -> str:
+    """Lowercases, collapses whitespace and trims punctuation so near-identical queries share a key."""
+    query = re.sub(r"\s+", " ", (query or "").lower()).strip()
+    return query.strip(" .,!?;:'\"")
+
+
+class RetrievalCache:
+    """
+    In-process LRU cache with a TTL for knowledge base retrievals.
+
+    Keys are (normalized query, dietary filter, excluded ingredients). Entries expire after
+    `ttl_seconds` and the least recently used entry is evicted once `max_size` is reached.
+    Call `clear()` whenever the knowledge base is re-ingested (KnowledgeBase.add_change_listener
+    does this for you).
+    """
+
+    def __init__(self, max_size: int = 256, ttl_seconds: float = 600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict() # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(query: str, dietary_filter: str = "", exclusions=()):
+        excluded = tuple(sorted({term.strip().lower() for term in exclusions or () if term and term.strip()}))
+        return normalize_query(query), (dietary_filter or "").strip().lower(), excluded
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
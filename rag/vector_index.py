@@ -0,0 +1,272 @@
+# E:\Diet Chatbot\rag\vector_index.py
+import os
+import json
+import uuid
+
+import numpy as np # Installed with chromadb
+from langchain_core.documents import Document
+
+VECTOR_INDEX_VERSION = 2 # 2: chunk text and metadata are stored with the vectors
+VECTOR_INDEX_DIR = "mmap_index" # Under vector_db/, next to the Chroma files
+FILTER_COLUMNS = ("dietary_type", "doc_type", "source_file")
+EXPORT_BATCH_SIZE = 500 # Chunks read from Chroma per page when (re)building
+SEARCH_BLOCK_ROWS = 65536 # Rows converted to float32 at a time, so a float16 matrix is never copied whole
+
+
+class UnsupportedFilter(ValueError):
+    """The filter uses a metadata key the index has no column for; search the vector store instead."""
+
+
+class _Snapshot:
+    """One immutable generation of the index: memory-mapped arrays plus the id and column tables."""
+
+    def __init__(self, ids, vectors, norms, codes, vocab, chunks=None, offsets=None):
+        self.ids = ids
+        self.vectors = vectors # (rows, dimension) float16/float32, memory-mapped
+        self.norms = norms # (rows,) float32 squared norms of the stored vectors
+        self.codes = codes # (rows, len(FILTER_COLUMNS)) int32 category codes
+        self.vocab = vocab # column -> list of values; a code is an index into it
+        self.chunks = chunks # memory-mapped bytes of the JSONL file: one {"text", "metadata"} line per row
+        self.offsets = offsets # (rows + 1,) int64 byte offsets of each row's line in `chunks`
+        self._masks = {} # canonical filter JSON -> boolean row mask
+
+    def document(self, row: int) -> Document:
+        # Only the lines of the rows asked for are read and parsed.
+        line = json.loads(bytes(self.chunks[self.offsets[row]:self.offsets[row + 1]]).decode("utf-8"))
+        return Document(page_content=line["text"], metadata=line["metadata"], id=self.ids[row])
+
+    def mask(self, where):
+        if not where:
+            return None
+        key = json.dumps(where, sort_keys=True)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = self._masks[key] = self._evaluate(where)
+        return mask
+
+    def _column_mask(self, column: str, condition):
+        if column not in FILTER_COLUMNS:
+            raise UnsupportedFilter(column)
+        codes = self.codes[:, FILTER_COLUMNS.index(column)]
+        values = self.vocab[column]
+
+        def code_of(value):
+            return values.index(value) if value in values else -1
+
+        if not isinstance(condition, dict):
+            return codes == code_of(condition)
+        mask = np.ones(len(self.ids), dtype=bool)
+        for op, operand in condition.items():
+            if op == "$eq":
+                mask &= codes == code_of(operand)
+            elif op == "$ne":
+                mask &= codes != code_of(operand)
+            elif op == "$in":
+                mask &= np.isin(codes, [code_of(value) for value in operand])
+            elif op == "$nin":
+                mask &= ~np.isin(codes, [code_of(value) for value in operand])
+            else:
+                raise UnsupportedFilter(op)
+        return mask
+
+    def _evaluate(self, where: dict):
+        # Same subset of Chroma's `where` syntax as lexical_index.matches_filter().
+        mask = np.ones(len(self.ids), dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._evaluate(clause)
+            elif key == "$or":
+                any_clause = np.zeros(len(self.ids), dtype=bool)
+                for clause in condition:
+                    any_clause |= self._evaluate(clause)
+                mask &= any_clause
+            else:
+                mask &= self._column_mask(key, condition)
+        return mask
+
+
+class MmapVectorIndex:
+    """
+    Exact nearest-neighbour index over one partition's chunk vectors, stored as a NumPy
+    matrix (float16 by default) that is memory-mapped rather than read. Opening it costs a
+    few milliseconds whatever the corpus size, and worker processes on the same machine
+    share the pages through the OS cache instead of each holding a copy.
+
+    Search is brute force: one matrix-vector product and an argpartition, which for a few
+    hundred thousand chunks is faster than a round trip through Chroma's SQLite and HNSW
+    layers, and returns the true top k. Distances are squared L2, like Chroma's default, so
+    the fused rankings don't change with the backend. `dietary_type`, `doc_type` and
+    `source_file` are kept as integer code columns; a filter on them becomes a boolean row
+    mask, computed once per distinct filter and reused.
+
+    Chunk text and metadata sit next to the matrix as a JSONL file plus an array of line
+    offsets, both memory-mapped too, so a search parses only the k lines it returns. The
+    index is derived data: `rebuild_from()` exports what a Chroma collection already stores
+    (no embedding calls), and KnowledgeBase.sync() does so whenever the collection changed.
+    Each rebuild writes a new generation of files and then switches the small JSON header
+    over, so readers never see a half-written matrix.
+    """
+
+    def __init__(self, directory: str, name: str, dtype: str = "float16"):
+        self.directory = directory
+        self.name = name
+        self.dtype = np.dtype(dtype)
+        self.header_path = os.path.join(directory, f"{name}.json")
+        self._snapshot = None
+        self.load()
+
+    def exists(self) -> bool:
+        """True once a readable index of the current version is loaded."""
+        return self._snapshot is not None
+
+    def __len__(self):
+        snapshot = self._snapshot
+        return len(snapshot.ids) if snapshot is not None else 0
+
+    def ids(self):
+        snapshot = self._snapshot
+        return set(snapshot.ids) if snapshot is not None else set()
+
+    def _path(self, generation: str, part: str, extension: str = "npy") -> str:
+        return os.path.join(self.directory, f"{self.name}-{generation}.{part}.{extension}")
+
+    def load(self):
+        self._snapshot = None
+        if not os.path.exists(self.header_path):
+            return
+        try:
+            with open(self.header_path, "r", encoding="utf-8") as f:
+                header = json.load(f)
+            if header.get("version") != VECTOR_INDEX_VERSION:
+                print(f"Ignoring vector index with unknown version: {header.get('version')}")
+                return
+            ids, generation = header["ids"], header["generation"]
+            if not ids:
+                self._snapshot = _Snapshot([], None, None, None, header["columns"])
+                return
+            vectors = np.load(self._path(generation, "vectors"), mmap_mode="r")
+            norms = np.load(self._path(generation, "norms"), mmap_mode="r")
+            codes = np.load(self._path(generation, "codes"), mmap_mode="r")
+            offsets = np.load(self._path(generation, "offsets"), mmap_mode="r")
+            chunks = np.memmap(self._path(generation, "chunks", "jsonl"), dtype=np.uint8, mode="r")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Could not read vector index {self.header_path}: {e}. It will be rebuilt.")
+            return
+        if not (len(ids) == vectors.shape[0] == norms.shape[0] == codes.shape[0] == offsets.shape[0] - 1) \
+                or offsets[-1] != chunks.shape[0]:
+            print(f"Vector index {self.header_path} is inconsistent. It will be rebuilt.")
+            return
+        self._snapshot = _Snapshot(ids, vectors, norms, codes, header["columns"], chunks, offsets)
+
+    def rebuild_from(self, collection):
+        """Exports every vector, chunk and filter column from a Chroma collection into a new generation."""
+        os.makedirs(self.directory, exist_ok=True)
+        generation = uuid.uuid4().hex[:12]
+        total = collection.count()
+        ids, vocab = [], {column: [] for column in FILTER_COLUMNS}
+        lookup = {column: {} for column in FILTER_COLUMNS}
+        vectors = norms = codes = None
+        offsets = [0]
+        with open(self._path(generation, "chunks", "jsonl"), "wb") as chunks_file:
+            for offset in range(0, total, EXPORT_BATCH_SIZE):
+                batch = collection.get(include=["embeddings", "metadatas", "documents"], limit=EXPORT_BATCH_SIZE,
+                                       offset=offset)
+                if not batch["ids"]:
+                    break
+                block = np.asarray(batch["embeddings"], dtype=np.float32).astype(self.dtype)
+                if vectors is None:
+                    # Written in place, page by page, so a large partition is never held in memory.
+                    vectors = np.lib.format.open_memmap(self._path(generation, "vectors"), mode="w+",
+                                                        dtype=self.dtype, shape=(total, block.shape[1]))
+                    norms = np.lib.format.open_memmap(self._path(generation, "norms"), mode="w+",
+                                                      dtype=np.float32, shape=(total,))
+                    codes = np.lib.format.open_memmap(self._path(generation, "codes"), mode="w+",
+                                                      dtype=np.int32, shape=(total, len(FILTER_COLUMNS)))
+                start, end = len(ids), len(ids) + len(batch["ids"])
+                vectors[start:end] = block
+                # Norms of the stored (possibly float16) values, so distances are self-consistent.
+                stored = block.astype(np.float32)
+                norms[start:end] = np.einsum("ij,ij->i", stored, stored)
+                for row, metadata in enumerate(batch["metadatas"], start=start):
+                    for column_index, column in enumerate(FILTER_COLUMNS):
+                        value = (metadata or {}).get(column)
+                        if value not in lookup[column]:
+                            lookup[column][value] = len(vocab[column])
+                            vocab[column].append(value)
+                        codes[row, column_index] = lookup[column][value]
+                for text, metadata in zip(batch["documents"], batch["metadatas"]):
+                    line = json.dumps({"text": text or "", "metadata": metadata or {}}).encode("utf-8") + b"\n"
+                    chunks_file.write(line)
+                    offsets.append(offsets[-1] + len(line))
+                ids.extend(batch["ids"])
+        np.save(self._path(generation, "offsets"), np.asarray(offsets, dtype=np.int64))
+        if vectors is not None:
+            rows = len(ids) # The collection may have shrunk while we paged through it
+            for array in (vectors, norms, codes):
+                array.flush()
+            del vectors, norms, codes
+            if rows < total:
+                self._truncate(generation, rows)
+
+        header = {"version": VECTOR_INDEX_VERSION, "generation": generation, "dtype": self.dtype.name,
+                  "ids": ids, "columns": vocab}
+        tmp_path = self.header_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(header, f)
+        os.replace(tmp_path, self.header_path)
+        self.load()
+        self._remove_other_generations(generation)
+        print(f"Rebuilt vector index {self.name} over {len(ids)} chunks ({self.dtype.name}).")
+
+    def _truncate(self, generation: str, rows: int):
+        for part in ("vectors", "norms", "codes"):
+            path = self._path(generation, part)
+            np.save(path + ".tmp.npy", np.load(path)[:rows])
+            os.replace(path + ".tmp.npy", path)
+
+    def _remove_other_generations(self, generation: str):
+        prefix = f"{self.name}-"
+        for filename in os.listdir(self.directory):
+            if filename.startswith(prefix) and filename.endswith((".npy", ".jsonl")) \
+                    and not filename.startswith(prefix + generation):
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    pass # Still mapped by a reader (Windows); the next rebuild removes it
+
+    def search(self, vector, k: int, filter: dict = None):
+        """
+        Returns up to k (chunk id, squared L2 distance) pairs, nearest first. Raises
+        UnsupportedFilter if `filter` needs a column the index doesn't keep.
+        """
+        snapshot = self._snapshot
+        return [(snapshot.ids[row], distance) for row, distance in self._search_rows(snapshot, vector, k, filter)]
+
+    def search_documents(self, vector, k: int, filter: dict = None):
+        """Like search(), but returns (Document, squared L2 distance) pairs read from the chunk file."""
+        snapshot = self._snapshot
+        return [(snapshot.document(row), distance) for row, distance in self._search_rows(snapshot, vector, k, filter)]
+
+    @staticmethod
+    def _search_rows(snapshot, vector, k: int, filter: dict):
+        if snapshot is None or not snapshot.ids or k <= 0:
+            return []
+        mask = snapshot.mask(filter)
+        candidates = len(snapshot.ids) if mask is None else int(np.count_nonzero(mask))
+        k = min(k, candidates)
+        if k <= 0:
+            return []
+
+        query = np.asarray(vector, dtype=np.float32)
+        rows = len(snapshot.ids)
+        dots = np.empty(rows, dtype=np.float32)
+        for start in range(0, rows, SEARCH_BLOCK_ROWS):
+            block = snapshot.vectors[start:start + SEARCH_BLOCK_ROWS]
+            dots[start:start + len(block)] = block.astype(np.float32, copy=False) @ query
+        distances = snapshot.norms - 2.0 * dots + float(query @ query)
+        if mask is not None:
+            distances = np.where(mask, distances, np.inf)
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top], kind="stable")]
+        return [(int(i), float(max(distances[i], 0.0))) for i in top]
@@ -0,0 +1,171 @@
+# E:\Diet Chatbot\server.py
+"""
+Local HTTP server with a streaming chat endpoint.
+
+    python server.py --port 8000
+    curl -N -X POST localhost:8000/chat -d '{"message": "vegan dinner for weight loss"}'
+
+POST /chat takes {"message": ..., "conversation_id": ...} (omit the ID to start a new
+conversation) and answers with Server-Sent Events:
+    event: session {"conversation_id": ...}                       first; send it back to continue
+    event: route   {"agent": ..., "query": ..., "message": ...}   once the orchestrator has decided
+    event: token   {"node": ..., "text": ...}                     specialist output as it is generated
+    event: done    {"agent": ..., "response": ...}                the complete answer
+    event: error   {"error": ...}
+
+GET /metrics returns node, tool and LLM timings and counters in Prometheus text format
+(?format=json for JSON including recent turn traces).
+"""
+import json
+import uuid
+import argparse
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.messages import AIMessageChunk
+
+from main import app, agent_registry, new_conversation_state, warmup, SPECIALIST_NODES, MEAL_PLAN_NODE
+from metrics import get_metrics
+from agents.history import NO_STREAM_TAG
+
+
+def _chunk_text(chunk) -> str:
+    # Gemini chunks carry either a plain string or a list of content parts.
+    content = getattr(chunk, "content", "")
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+
+
+def stream_chat_events(user_input: str, conversation_id: str = None):
+    """Yields (event, payload) pairs for one turn while the compiled graph runs."""
+    conversation_id = conversation_id or uuid.uuid4().hex
+    session_store = agent_registry.get("session_store")
+    yield "session", {"conversation_id": conversation_id}
+
+    route = None
+    streamed_any = False
+    final_state = None
+    initial_state = new_conversation_state(user_input, session_store.load(conversation_id))
+    with get_metrics().turn():
+        for mode, payload in app.stream(initial_state, stream_mode=["updates", "messages", "values"]):
+            if mode == "values":
+                final_state = payload
+            elif mode == "updates":
+                for node, update in payload.items():
+                    if not update:
+                        continue
+                    if node == "orchestrator":
+                        route = update.get("next_agent_route")
+                        yield "route", {
+                            "agent": route,
+                            "query": update.get("query_for_next_agent"),
+                            "message": update["messages"][-1].content if update.get("messages") else "",
+                        }
+                    elif node in SPECIALIST_NODES or node == MEAL_PLAN_NODE:
+                        response = update["messages"][-1].content
+                        if not streamed_any:
+                            # The model didn't stream (or only tool calls did); send the answer in one piece.
+                            yield "token", {"node": node, "text": response}
+                        yield "done", {"agent": node, "response": response}
+            elif mode == "messages":
+                chunk, metadata = payload
+                node = metadata.get("langgraph_node")
+                if metadata.get(NO_STREAM_TAG) or NO_STREAM_TAG in (metadata.get("tags") or ()):
+                    continue # Internal calls such as history summaries
+                # Orchestrator tokens are routing JSON, tool-call chunks have no text, and the node's
+                # final AIMessage repeats what was already streamed; skip all three.
+                if node in SPECIALIST_NODES and isinstance(chunk, AIMessageChunk) and not chunk.tool_call_chunks:
+                    text = _chunk_text(chunk)
+                    if text:
+                        streamed_any = True
+                        yield "token", {"node": node, "text": text}
+
+    if final_state is not None:
+        session_store.save(conversation_id, final_state)
+
+
+class ChatRequestHandler(BaseHTTPRequestHandler):
+    def _send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_event(self, event: str, payload: dict):
+        self.wfile.write(f"event: {event}\ndata: {json.dumps(payload)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif url.path == "/metrics":
+            if parse_qs(url.query).get("format") == ["json"]:
+                data = get_metrics().export_json(include_traces=True).encode("utf-8")
+                content_type = "application/json"
+            else:
+                data = get_metrics().export_text().encode("utf-8")
+                content_type = "text/plain; version=0.0.4"
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/chat":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            message = body.get("message", "").strip()
+            conversation_id = body.get("conversation_id") or None
+        except (ValueError, AttributeError):
+            self._send_json(400, {"error": "Body must be JSON like {\"message\": \"...\"}"})
+            return
+        if not message:
+            self._send_json(400, {"error": "message is required"})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        try:
+            for event, payload in stream_chat_events(message, conversation_id):
+                self._send_event(event, payload)
+        except (BrokenPipeError, ConnectionResetError):
+            print("Client disconnected before the answer finished streaming.")
+        except Exception as e:
+            print(f"An error occurred while streaming: {e}")
+            self._send_event("error", {"error": "I'm sorry, I couldn't process that request right now."})
+
+
+def serve(host: str = "127.0.0.1", port: int = 8000):
+    server = ThreadingHTTPServer((host, port), ChatRequestHandler)
+    print(f"Diet Chatbot HTTP server listening on http://{host}:{port} (POST /chat)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Diet Chatbot streaming HTTP server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--warmup", action="store_true",
+                        help="Build all agents and the knowledge base before accepting requests")
+    args = parser.parse_args()
+    if args.warmup:
+        warmup()
+    serve(args.host, args.port)
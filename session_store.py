@@ -0,0 +1,128 @@
+# E:\Diet Chatbot\session_store.py
+import os
+import json
+import time
+import atexit
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from langchain_core.messages import messages_from_dict, messages_to_dict
+
+
+def _serialize_state(state: dict) -> str:
+    data = dict(state)
+    data["messages"] = messages_to_dict(state.get("messages", []))
+    return json.dumps(data)
+
+
+def _deserialize_state(payload: str) -> dict:
+    data = json.loads(payload)
+    data["messages"] = messages_from_dict(data.get("messages", []))
+    return data
+
+
+class SessionStore:
+    """
+    Persists AgentState per conversation ID so multi-turn conversations survive across
+    requests and restarts.
+
+    Reads and writes hit an in-memory LRU cache. Writes are write-behind: a background thread
+    flushes dirty sessions to SQLite every `flush_interval` seconds, and `flush()`/`close()`
+    (also run at interpreter exit) write anything still pending.
+    """
+
+    def __init__(self, db_path: str, flush_interval: float = 1.0, max_cached_sessions: int = 1000):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.max_cached_sessions = max_cached_sessions
+        self._cache = OrderedDict() # conversation_id -> state
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "conversation_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="session-store-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def load(self, conversation_id: str):
+        """Returns the saved state for a conversation, or None if it is new."""
+        with self._lock:
+            state = self._cache.get(conversation_id)
+            if state is not None:
+                self._cache.move_to_end(conversation_id)
+                return state
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT state FROM sessions WHERE conversation_id = ?", (conversation_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        state = _deserialize_state(row[0])
+        with self._lock:
+            # Another thread may have saved a newer state while we were reading.
+            state = self._cache.setdefault(conversation_id, state)
+            self._evict_clean()
+        return state
+
+    def save(self, conversation_id: str, state: dict):
+        with self._lock:
+            self._cache[conversation_id] = state
+            self._cache.move_to_end(conversation_id)
+            self._dirty.add(conversation_id)
+            self._evict_clean()
+
+    def _evict_clean(self):
+        # Only clean entries can go; dirty ones stay until they have been flushed.
+        if len(self._cache) <= self.max_cached_sessions:
+            return
+        for conversation_id in list(self._cache.keys()):
+            if len(self._cache) <= self.max_cached_sessions:
+                break
+            if conversation_id not in self._dirty:
+                del self._cache[conversation_id]
+
+    def flush(self):
+        with self._lock:
+            pending = [(cid, self._cache[cid]) for cid in self._dirty if cid in self._cache]
+            self._dirty.clear()
+        if not pending:
+            return 0
+        try:
+            rows = [(cid, _serialize_state(state), time.time()) for cid, state in pending]
+            with self._db_lock:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO sessions (conversation_id, state, updated_at) VALUES (?, ?, ?)", rows
+                )
+                self._conn.commit()
+        except Exception:
+            with self._lock:
+                self._dirty.update(cid for cid, _ in pending)
+            raise
+        with self._lock:
+            self._evict_clean()
+        return len(rows)
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Session store flush failed: {e}")
+
+    def close(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        # A flush already running in the flusher holds an older snapshot; let it commit first
+        # so the final flush below is the last write.
+        self._flusher.join()
+        self.flush()
@@ -0,0 +1,57 @@
+# E:\Diet Chatbot\tests\conftest.py
+"""
+Shared fixtures. Everything runs offline: the graph gets the fakes from benchmarks/fakes.py
+(see benchmarks/load_test.configure_offline) and every store lives under a temporary directory.
+"""
+import os
+import sys
+import argparse
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def offline_args(**overrides):
+    """The load test's options, with no artificial latency."""
+    options = dict(chat_latency=0.0, embedding_latency=0.0, search_latency=0.0, llm_concurrency=16, llm_rps=0.0,
+                   search_cache=False, orchestrator_mode="structured", vector_backend="chroma", no_prefetch=False,
+                   multi_tool=False, answer_cache=False)
+    options.update(overrides)
+    return argparse.Namespace(**options)
+
+
+@pytest.fixture(scope="session")
+def offline_main(tmp_path_factory):
+    """main.py wired to fakes, with an empty knowledge base and session store under a temp dir."""
+    from benchmarks.load_test import configure_offline
+    from session_store import SessionStore
+    import main
+
+    workdir = tmp_path_factory.mktemp("offline")
+    pdf_dir = workdir / "pdfs"
+    pdf_dir.mkdir()
+    main.VECTOR_DB_PATH = str(workdir / "no-store") # Nothing to copy: start from an empty store
+    main.RECIPE_PDF_PATH = str(pdf_dir)
+    main = configure_offline(offline_args(), str(workdir))
+    main.agent_registry.override("session_store", SessionStore(str(workdir / "sessions.sqlite3")))
+    return main
+
+
+@pytest.fixture
+def override_component(offline_main):
+    """Replaces a registry component for one test and puts the original back afterwards."""
+    registry = offline_main.agent_registry
+    originals = {}
+
+    def override(name, instance):
+        if name not in originals:
+            originals[name] = registry.get(name)
+        registry.override(name, instance)
+        return instance
+
+    yield override
+    for name, instance in originals.items():
+        registry.override(name, instance)
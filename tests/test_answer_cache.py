@@ -0,0 +1,29 @@
+# E:\Diet Chatbot\tests\test_answer_cache.py
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+
+def _state(message: str, route_source: str, query: str = None):
+    return {"messages": [HumanMessage(content=message), AIMessage(content="Routing you...")],
+            "dietary_preference": "vegan", "dietary_goal": "", "allergies": [], "meal_type": "",
+            "query_for_next_agent": query or message, "route_source": route_source}
+
+
+def test_self_contained_question_is_cached(offline_main):
+    scope, query = offline_main._answer_cache_key("vegan", _state("vegan dinner ideas", "fast_path"))
+    assert scope.startswith("vegan|") and query == "vegan dinner ideas"
+
+
+def test_general_answers_are_not_cached(offline_main):
+    assert offline_main._answer_cache_key("general", _state("latest news on seed oils", "llm")) is None
+
+
+def test_session_routed_follow_ups_are_not_cached(offline_main):
+    assert offline_main._answer_cache_key("vegan", _state("lunch ideas", "session")) is None
+
+
+@pytest.mark.parametrize("route_source", ["fast_path", "llm"])
+def test_context_words_in_the_user_message_skip_the_cache(offline_main, route_source):
+    # The orchestrator may restate "make that vegan" as a self-contained query; the answer still used history.
+    state = _state("make that vegan", route_source, query="vegan curry recipe")
+    assert offline_main._answer_cache_key("vegan", state) is None
@@ -0,0 +1,56 @@
+# E:\Diet Chatbot\tests\test_context_packer.py
+import pytest
+from langchain_core.documents import Document
+
+from rag.context_packer import pack_context, estimate_tokens
+
+SOUP = ("Red lentil soup. Rinse one cup of red lentils and simmer them with cumin, turmeric and garlic "
+        "for twenty minutes. ")
+OVERLAP = "Finish the soup with lemon juice, chopped coriander and a spoon of olive oil before serving. "
+STEW = "Chickpea stew. Fry onions with smoked paprika, add tomatoes and chickpeas, and cook until thick. "
+
+
+def _doc(text: str, source_file: str = "vegan_meal_guide.pdf", page=11, **metadata):
+    metadata = {"source_file": source_file, **({"page": page} if page is not None else {}), **metadata}
+    return Document(page_content=text, metadata=metadata)
+
+
+def _passages(context: str):
+    return [block.split("\n", 1) for block in context.split("\n\n")]
+
+
+def test_splitter_overlap_is_cut_from_the_later_chunk():
+    first, second = _doc(SOUP + OVERLAP), _doc(OVERLAP + STEW, page=12)
+    passages = _passages(pack_context([second, first]))
+    texts = {header: text for header, text in passages}
+    assert texts["[1] vegan_meal_guide.pdf, p. 13"] == STEW.strip()
+    assert texts["[2] vegan_meal_guide.pdf, p. 12"] == (SOUP + OVERLAP).strip()
+
+
+def test_overlap_is_kept_across_different_files():
+    first, second = _doc(SOUP + OVERLAP), _doc(OVERLAP + STEW, source_file="other_book.pdf")
+    assert (OVERLAP + STEW).strip() in pack_context([first, second])
+
+
+def test_near_duplicate_keeps_the_better_ranked_copy():
+    better = _doc(SOUP + OVERLAP, source_file="a.pdf")
+    copy = _doc(SOUP + OVERLAP.replace("a spoon", "one spoon"), source_file="b.pdf")
+    passages = _passages(pack_context([better, _doc(STEW, source_file="c.pdf"), copy]))
+    assert [header for header, _ in passages] == ["[1] a.pdf, p. 12", "[2] c.pdf, p. 12"]
+
+
+@pytest.mark.parametrize("budget", [100, 150, 333])
+def test_budget_is_a_hard_cap_and_trims_at_a_sentence(budget):
+    long_passage = " ".join(f"Step {i}: stir the pot and taste the sauce." for i in range(200))
+    docs = [_doc(STEW, source_file="a.pdf"), _doc(long_passage, source_file="b.pdf")]
+    context = pack_context(docs, token_budget=budget)
+    assert estimate_tokens(context) <= budget
+    (_, first), (_, trimmed) = _passages(context)
+    assert first == STEW.strip()
+    assert trimmed.endswith("sauce. …") # Cut after a full sentence, and marked as cut
+
+
+def test_citation_without_page():
+    context = pack_context([_doc(STEW, page=None, recipes="Chickpea Stew")])
+    assert context.startswith("[1] vegan_meal_guide.pdf — Chickpea Stew\n")
+    assert pack_context([Document(page_content=STEW)]).startswith("[1] knowledge base\n")
@@ -0,0 +1,50 @@
+# E:\Diet Chatbot\tests\test_ingest.py
+from langchain_core.documents import Document
+
+from benchmarks.fakes import FakeEmbeddings
+from rag.knowledge_base import KnowledgeBase
+from rag.pipeline import IngestProgress
+
+REL_PATH = "vegan/guide.pdf"
+
+
+def _chunk(text: str, page: int = 0):
+    return Document(page_content=text, metadata={"page": page, "source_file": "guide.pdf", "dietary_type": "vegan"})
+
+
+def _ingest(knowledge_base, file_hash: str, splits):
+    added, removed = knowledge_base._apply_file_chunks(REL_PATH, file_hash, "vegan", splits,
+                                                       knowledge_base.manifest.get(REL_PATH))
+    return added, removed
+
+
+def test_duplicated_paragraph_gets_its_own_chunk(tmp_path):
+    knowledge_base = KnowledgeBase(
+        embedding_model_name="test", google_api_key="offline", vector_db_path=str(tmp_path / "vector_db"),
+        pdf_base_dir=str(tmp_path / "pdfs"), sync_on_startup=False, embeddings=FakeEmbeddings(size=16)
+    )
+    soup, salad = "Lentil soup with cumin and lemon.", "Quinoa salad with mint."
+    assert _ingest(knowledge_base, "v1", [_chunk(soup), _chunk(salad)]) == (2, 0)
+
+    # Re-ingested with the soup paragraph repeated on the same page.
+    assert _ingest(knowledge_base, "v2", [_chunk(soup), _chunk(salad), _chunk(soup)]) == (1, 0)
+    chunks = knowledge_base.manifest.get(REL_PATH)["chunks"]
+    partition = knowledge_base.partitions["vegan"]
+    assert len(chunks) == 3
+    assert partition.ids() == set(chunks)
+
+    # And back: the extra copy is removed, the other two stay.
+    assert _ingest(knowledge_base, "v3", [_chunk(soup), _chunk(salad)]) == (0, 1)
+    assert len(knowledge_base.manifest.get(REL_PATH)["chunks"]) == 2
+    assert partition.ids() == set(knowledge_base.manifest.get(REL_PATH)["chunks"])
+
+
+def test_eta_counts_only_files_expected_to_be_parsed():
+    progress = IngestProgress(total_files=100, interval_seconds=3600)
+    for _ in range(8):
+        progress.file_done(skipped=True)
+    progress.file_queued()
+    progress.file_queued()
+    progress.file_done()
+    # One queued file is still to be parsed, and a fifth of the 90 files not yet hashed are expected to be.
+    assert progress._files_left_to_parse() == 1 + 90 * 0.2
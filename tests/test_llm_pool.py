@@ -0,0 +1,156 @@
+# E:\Diet Chatbot\tests\test_llm_pool.py
+import time
+import asyncio
+import threading
+
+import pytest
+
+from agents.llm_pool import _ConcurrencyLimit, is_rate_limit_error
+
+
+def test_async_waiters_are_served_in_order():
+    async def scenario():
+        limit = _ConcurrencyLimit(1)
+        await limit.aacquire()
+        order = []
+
+        async def waiter(i):
+            await limit.aacquire()
+            order.append(i)
+            await asyncio.sleep(0.001)
+            limit.release()
+
+        tasks = []
+        for i in range(10):
+            tasks.append(asyncio.create_task(waiter(i)))
+            await asyncio.sleep(0) # Let each one queue before the next
+        limit.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == list(range(10))
+
+
+def test_limit_holds_across_threads_and_coroutines():
+    limit = _ConcurrencyLimit(3)
+    lock = threading.Lock()
+    active, peak = [0], [0]
+
+    def enter():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+
+    def leave():
+        with lock:
+            active[0] -= 1
+
+    def thread_worker():
+        for _ in range(20):
+            limit.acquire()
+            enter()
+            time.sleep(0.001)
+            leave()
+            limit.release()
+
+    async def coroutine_worker():
+        for _ in range(20):
+            await limit.aacquire()
+            enter()
+            await asyncio.sleep(0.001)
+            leave()
+            limit.release()
+
+    async def coroutines():
+        await asyncio.gather(*(coroutine_worker() for _ in range(5)))
+
+    threads = [threading.Thread(target=thread_worker) for _ in range(4)]
+    threads.append(threading.Thread(target=asyncio.run, args=(coroutines(),)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+    assert peak[0] == 3 and active[0] == 0
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def scenario():
+        limit = _ConcurrencyLimit(1)
+        await limit.aacquire()
+        cancelled = asyncio.create_task(limit.aacquire())
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        limit.release()
+        await asyncio.sleep(0)
+        # The slot is free again: this would hang if the cancelled waiter had kept it.
+        await asyncio.wait_for(limit.aacquire(), timeout=1)
+
+    asyncio.run(scenario())
+
+
+def test_thread_release_wakes_a_coroutine():
+    async def scenario():
+        limit = _ConcurrencyLimit(1)
+        limit.acquire()
+        threading.Timer(0.05, limit.release).start()
+        start = time.perf_counter()
+        await asyncio.wait_for(limit.aacquire(), timeout=1)
+        return time.perf_counter() - start
+
+    assert asyncio.run(scenario()) < 0.5
+
+
+class _CountingLoop(asyncio.SelectorEventLoop):
+    iterations = 0
+
+    def _run_once(self):
+        self.iterations += 1
+        super()._run_once()
+
+
+def test_waiting_coroutine_does_not_poll_the_loop():
+    limit = _ConcurrencyLimit(1)
+    limit.acquire()
+    threading.Timer(0.3, limit.release).start()
+    loop = _CountingLoop()
+    try:
+        loop.run_until_complete(asyncio.wait_for(limit.aacquire(), timeout=2))
+    finally:
+        loop.close()
+    # A few wake-ups to start, hand over and finish; sleep-and-retry needs one more per attempt.
+    assert loop.iterations < 12
+
+
+def _raised_while_handling(error, handled):
+    try:
+        try:
+            raise handled
+        except Exception:
+            raise error
+    except Exception as e:
+        return e
+
+
+def _raised_from(error, cause):
+    try:
+        raise error from cause
+    except Exception as e:
+        return e
+
+
+@pytest.mark.parametrize("error", [
+    RuntimeError("429 Too Many Requests"),
+    RuntimeError("Resource exhausted: quota exceeded"),
+    _raised_from(ValueError("model call failed"), RuntimeError("HTTP 429")),
+])
+def test_rate_limit_errors_are_recognised(error):
+    assert is_rate_limit_error(error)
+
+
+@pytest.mark.parametrize("error", [
+    ValueError("prompt is 4290 tokens, over the limit of 4096"),
+    # A bug hit while handling a 429 is not itself a 429.
+    _raised_while_handling(KeyError("usage_metadata"), RuntimeError("429 Too Many Requests")),
+])
+def test_other_errors_are_not_retried(error):
+    assert not is_rate_limit_error(error)
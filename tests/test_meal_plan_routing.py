@@ -0,0 +1,34 @@
+# E:\Diet Chatbot\tests\test_meal_plan_routing.py
+import asyncio
+
+
+def test_plan_without_a_diet_is_not_planned(offline_main):
+    state = offline_main.app.invoke(offline_main.new_conversation_state("make me a 7-day meal plan"))
+    assert state["meal_plan_request"] == {}
+    assert state["next_agent_route"] == "general"
+    assert "## Day 1" not in state["messages"][-1].content
+
+
+def test_plan_without_a_diet_is_not_planned_async(offline_main):
+    state = asyncio.run(offline_main.app.ainvoke(offline_main.new_conversation_state("make me a 7-day meal plan")))
+    assert state["meal_plan_request"] == {}
+    assert "## Day 1" not in state["messages"][-1].content
+
+
+def test_plan_with_a_diet_is_planned(offline_main):
+    state = offline_main.app.invoke(offline_main.new_conversation_state("make me a 3-day vegan meal plan"))
+    assert state["meal_plan_request"] == {"days": 3, "meal_types": ["breakfast", "lunch", "dinner"]}
+    assert "## Day 3" in state["messages"][-1].content
+
+
+def test_plan_uses_the_diet_from_an_earlier_turn(offline_main):
+    first = offline_main.app.invoke(offline_main.new_conversation_state("vegan dinner ideas"))
+    state = offline_main.app.invoke(offline_main.new_conversation_state("now a 2-day meal plan", first))
+    assert state["meal_plan_request"]["days"] == 2
+    assert "## Day 2" in state["messages"][-1].content
+
+
+def test_long_plan_is_capped_not_dropped(offline_main):
+    state = offline_main.app.invoke(offline_main.new_conversation_state("meal plan for 100 days, vegetarian"))
+    assert state["meal_plan_request"]["days"] == offline_main.MEAL_PLAN_MAX_DAYS
+    assert f"## Day {offline_main.MEAL_PLAN_MAX_DAYS}" in state["messages"][-1].content
@@ -0,0 +1,20 @@
+# E:\Diet Chatbot\tests\test_orchestrator.py
+from agents.orchestrator import OrchestratorAgent
+from benchmarks.fakes import FakeChatModel
+
+
+def _orchestrator(mode: str) -> OrchestratorAgent:
+    return OrchestratorAgent(google_api_key="", gemini_model="", temperature=0.0, llm=FakeChatModel(latency=0.0),
+                             mode=mode)
+
+
+def test_structured_mode_builds_no_tool_agent():
+    orchestrator = _orchestrator("structured")
+    assert orchestrator.agent is None and orchestrator.agent_executor is None
+    assert orchestrator.tools == [] and orchestrator.parser is None
+
+
+def test_agent_mode_keeps_the_tool_loop():
+    orchestrator = _orchestrator("agent")
+    assert orchestrator.agent_executor is not None
+    assert {tool.name for tool in orchestrator.tools} == {"tavily_search", "retrieve_from_knowledge_base"}
@@ -0,0 +1,70 @@
+# E:\Diet Chatbot\tests\test_parallel_executor.py
+import time
+import asyncio
+from typing import List
+
+from langchain.agents import create_tool_calling_agent
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.tools import tool
+
+from agents.parallel_executor import ParallelToolAgentExecutor
+from benchmarks.fakes import FakeChatModel
+
+SLOW_SECONDS = 0.4
+
+
+@tool
+def slow_lookup(query: str) -> str:
+    """Looks something up slowly."""
+    time.sleep(SLOW_SECONDS)
+    return f"slow result for {query}"
+
+
+@tool
+def quick_lookup(query: str) -> str:
+    """Looks something up a little faster."""
+    time.sleep(SLOW_SECONDS / 2)
+    return f"quick result for {query}"
+
+
+class TwoToolChatModel(FakeChatModel):
+    """Asks for both lookups in one step, then answers with their observations in the order received."""
+
+    def _respond(self, messages: List[BaseMessage]) -> AIMessage:
+        observations = [m.content for m in messages if isinstance(m, ToolMessage)]
+        if observations:
+            return AIMessage(content=" | ".join(observations))
+        return AIMessage(content="", tool_calls=[
+            {"name": "slow_lookup", "args": {"query": "tofu"}, "id": "call_slow"},
+            {"name": "quick_lookup", "args": {"query": "tempeh"}, "id": "call_quick"},
+        ])
+
+
+def _executor(**kwargs) -> ParallelToolAgentExecutor:
+    tools = [slow_lookup, quick_lookup]
+    prompt = ChatPromptTemplate.from_messages([("human", "{input}"), MessagesPlaceholder("agent_scratchpad")])
+    agent = create_tool_calling_agent(TwoToolChatModel(latency=0.0), tools, prompt)
+    return ParallelToolAgentExecutor(agent=agent, tools=tools, return_intermediate_steps=True, **kwargs)
+
+
+def test_tool_calls_of_one_step_run_concurrently_in_model_order():
+    start = time.monotonic()
+    result = _executor().invoke({"input": "protein ideas"})
+    elapsed = time.monotonic() - start
+    assert elapsed < SLOW_SECONDS * 1.4 # Back to back would take 1.5x SLOW_SECONDS
+    assert [step[0].tool for step in result["intermediate_steps"]] == ["slow_lookup", "quick_lookup"]
+    assert result["output"].strip() == "slow result for tofu | quick result for tempeh"
+
+
+def test_timed_out_tool_becomes_an_observation():
+    result = _executor(tool_timeouts={"slow_lookup": 0.05}).invoke({"input": "protein ideas"})
+    (slow_action, slow_observation), (_, quick_observation) = result["intermediate_steps"]
+    assert slow_action.tool == "slow_lookup" and "timed out" in slow_observation
+    assert quick_observation == "quick result for tempeh"
+
+
+def test_async_timed_out_tool_becomes_an_observation():
+    result = asyncio.run(_executor(tool_timeouts={"slow_lookup": 0.05}).ainvoke({"input": "protein ideas"}))
+    observations = [observation for _, observation in result["intermediate_steps"]]
+    assert "timed out" in observations[0] and observations[1] == "quick result for tempeh"
@@ -0,0 +1,28 @@
+# E:\Diet Chatbot\tests\test_prefetch.py
+import pytest
+
+
+@pytest.mark.parametrize("route", ["vegetarian", "non_vegetarian", "vegan", "general"])
+def test_prefetch_exclusions_match_the_specialist(offline_main, route):
+    state = {"allergies": ["peanut"]}
+    expected = offline_main.agent_registry.get(route).exclusions_for(state)
+    assert offline_main.ROUTE_AGENT_CLASSES[route].default_exclusions(state) == expected
+
+
+def test_non_vegetarian_prefetch_excludes_pork_and_beef(offline_main):
+    assert offline_main.ROUTE_AGENT_CLASSES["non_vegetarian"].default_exclusions({"allergies": ["dairy"]}) \
+        == ["dairy", "pork", "beef"]
+
+
+def test_prefetch_builds_no_agents(offline_main, monkeypatch):
+    registry = offline_main.agent_registry
+    get = registry.get
+
+    def get_without_agents(name):
+        if name in offline_main.ROUTE_AGENT_CLASSES:
+            raise AssertionError(f"prefetch built the {name} agent")
+        return get(name)
+
+    monkeypatch.setattr(registry, "get", get_without_agents)
+    for route in offline_main.ROUTE_AGENT_CLASSES:
+        offline_main._prefetch_retrieve("chicken curry", route, ["peanut"])
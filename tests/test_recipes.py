@@ -0,0 +1,67 @@
+# E:\Diet Chatbot\tests\test_recipes.py
+from langchain_core.documents import Document
+
+import metrics
+from rag.partitions import PartitionedRetriever
+from rag.recipes import RecipeIndex, RecipeRecord, segment_recipes, map_chunks_to_recipes
+
+COVER_PAGE = """RECIPE BOOK OF NAZISH QURESHI
+NON-VEGETARIAN DISHES
+Tandoori Chicken Chicken 65 Beef Steaks
+Fish Fry Fish Curry Egg Curry
+TANDOORI CHICKEN
+INGREDIENTS METHOD
+1 kg chicken
+1/2 cup yogurt
+2 tsp chilli powder
+1. Marinate the chicken in the yogurt and spices.
+2. Grill until cooked through.
+"""
+GUIDE_PAGE = """LIGHT MEALS
+Quick lunches for busy days, all under 30 minutes.
+BERRY COMPOTE
+INGREDIENTS
+Serves 4
+1. Simmer the berries with maple syrup.
+2. Cool before serving.
+"""
+
+
+def test_headings_are_not_recipes():
+    records = segment_recipes([Document(page_content=COVER_PAGE, metadata={"page": 0})], "book.pdf", "non_vegetarian")
+    assert [record.title for record in records] == ["Tandoori Chicken"]
+    assert "beef" not in records[0].allergens
+
+
+def test_steps_under_an_ingredients_header_make_a_recipe():
+    records = segment_recipes([Document(page_content=GUIDE_PAGE, metadata={"page": 3})], "guide.pdf", "vegan")
+    assert [record.title for record in records] == ["Berry Compote"]
+
+
+def test_contents_list_does_not_exclude_the_chunk(tmp_path):
+    pages = [Document(page_content=COVER_PAGE, metadata={"page": 0})]
+    records = segment_recipes(pages, "book.pdf", "non_vegetarian")
+    chunk = Document(page_content=COVER_PAGE.strip(), metadata={"page": 0})
+    index = RecipeIndex(str(tmp_path / "recipe_index.json"))
+    index.set_file("non_vegetarian/book.pdf", records, {"chunk-0": map_chunks_to_recipes(pages, [chunk], records)[0]})
+    assert not index.is_excluded("chunk-0", chunk.page_content, ["pork", "beef"])
+    assert index.is_excluded("chunk-0", chunk.page_content, ["dairy"])
+
+
+def test_records_without_ingredients_never_exclude(tmp_path):
+    record = RecipeRecord(recipe_id="r1", title="Non-Vegetarian Dishes", source_file="book.pdf",
+                          dietary_type="non_vegetarian", pages=[0], allergens=["beef"], spans=[[0, 0, 10]])
+    index = RecipeIndex(str(tmp_path / "recipe_index.json"))
+    index.set_file("non_vegetarian/book.pdf", [record], {"chunk-0": ["r1"]})
+    assert not index.is_excluded("chunk-0", "Chicken Tikka and Fish Fry", ["beef"])
+    # Its chunks fall back to their own text.
+    assert index.is_excluded("chunk-0", "Beef Steaks", ["beef"])
+
+
+def test_excluded_chunks_are_counted(tmp_path, monkeypatch):
+    registry = metrics.MetricsRegistry()
+    monkeypatch.setattr(metrics, "_metrics", registry)
+    retriever = PartitionedRetriever(partitions={}, recipe_index=RecipeIndex(str(tmp_path / "recipe_index.json")))
+    docs = [Document(page_content="Beef Steaks", id="chunk-0"), Document(page_content="Lentil soup", id="chunk-1")]
+    assert [doc.id for doc in retriever._allowed(docs, ["beef"])] == ["chunk-1"]
+    assert registry.counter("retrieval_excluded_chunks_total") == 1
@@ -0,0 +1,95 @@
+# E:\Diet Chatbot\tests\test_routing.py
+import pytest
+
+from agents.router import FastPathRouter
+
+VEGAN_SESSION = {"dietary_preference": "vegan", "dietary_goal": "", "allergies": ["soy"], "meal_type": "dinner"}
+
+
+def test_known_preference_extracts_new_signals(offline_main):
+    decision = offline_main._known_preference_decision(VEGAN_SESSION, "I'm gluten-free now, lunch ideas for weight loss")
+    assert decision.next_agent == "vegan"
+    assert decision.allergies == "soy,gluten" # Added to the stored allergy, not replacing it
+    assert decision.meal_type == "lunch"
+    assert decision.dietary_goal == "weight loss"
+
+
+def test_known_preference_keeps_stored_details(offline_main):
+    state = dict(VEGAN_SESSION)
+    decision = offline_main._known_preference_decision(state, "another recipe please")
+    routed = offline_main._route_to_agent(state, decision)
+    assert routed["next_agent_route"] == "vegan"
+    assert routed["allergies"] == ["soy"] and routed["meal_type"] == "dinner"
+
+
+def test_new_allergies_add_to_stored_ones(offline_main):
+    state = dict(VEGAN_SESSION)
+    decision = offline_main._known_preference_decision(state, "I'm gluten-free now, lunch ideas")
+    routed = offline_main._route_to_agent(state, decision)
+    assert routed["allergies"] == ["soy", "gluten"]
+
+
+def test_orchestrator_allergies_add_to_stored_ones(offline_main):
+    state = dict(VEGAN_SESSION)
+    decision = offline_main.RouteDecision(next_agent="vegan", allergies="nuts, soy", query_for_agent="dinner")
+    assert offline_main._route_to_agent(state, decision)["allergies"] == ["soy", "nuts"]
+
+
+def test_prefetch_filters_by_stored_and_new_allergies(offline_main):
+    _, allergies = offline_main._prefetch_plan(VEGAN_SESSION, "I'm allergic to nuts, dinner ideas")
+    assert allergies == ["soy", "nuts"]
+
+
+@pytest.mark.parametrize("message", [
+    "how much protein do I need per day?",
+    "is intermittent fasting good for me",
+    "no tofu this time",
+    "actually I eat chicken now",
+])
+def test_known_preference_defers_to_the_orchestrator(offline_main, message):
+    assert offline_main._known_preference_decision(VEGAN_SESSION, message) is None
+
+
+@pytest.mark.parametrize("query", [
+    "best meat substitutes for vegans",
+    "is fish oil healthy",
+    "vegan chicken nuggets",
+    "what do vegetarians eat instead of meat",
+])
+def test_ingredient_words_alone_do_not_route_non_vegetarian(query):
+    decision = FastPathRouter(embeddings=None).route(query)
+    assert decision is None or decision.next_agent != "non_vegetarian"
+
+
+@pytest.mark.parametrize("query", ["chicken recipes", "grilled fish for dinner", "non-veg lunch ideas"])
+def test_non_vegetarian_requests_still_take_the_fast_path(query):
+    decision = FastPathRouter(embeddings=None).route(query)
+    assert decision.next_agent == "non_vegetarian"
+
+
+class _VegetarianLeaningEmbeddings:
+    """Puts every query on the vegetarian centroid, as a weak embedding match might."""
+
+    def embed_documents(self, texts):
+        return [[1.0, 0.0] if "vegetarian" in text or "paneer" in text else [0.0, 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return [1.0, 0.0]
+
+
+@pytest.mark.parametrize("message", ["lunch ideas", "how much protein do I need per day?"])
+def test_embedding_match_does_not_replace_a_stored_preference(offline_main, override_component, message):
+    router = override_component("fast_path_router", FastPathRouter(embeddings=_VegetarianLeaningEmbeddings(),
+                                                                   min_similarity=0.5, min_margin=0.0))
+    assert router.route(message).next_agent == "vegetarian" # What a new conversation would get
+    state = dict(VEGAN_SESSION, messages=[offline_main.HumanMessage(content=message)])
+    routed = offline_main._route_turn(state)
+    assert routed["next_agent_route"] != "vegetarian"
+    assert routed["dietary_preference"] == "vegan"
+
+
+def test_explicit_diet_word_still_overrides_a_stored_preference(offline_main):
+    state = dict(VEGAN_SESSION, messages=[offline_main.HumanMessage(content="vegetarian lunch ideas")])
+    routed = offline_main._route_turn(state)
+    assert routed["next_agent_route"] == "vegetarian"
+    assert routed["dietary_preference"] == "vegetarian"
@@ -0,0 +1,99 @@
+# E:\Diet Chatbot\tests\test_search_cache.py
+import time
+import asyncio
+import threading
+
+import pytest
+
+from agents.search_cache import SearchCache, UpstreamSearchError
+
+
+class ErrorStringSearch:
+    """Fails the way TavilySearchResults does: returns repr(e) instead of raising."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def fetch(self, query):
+        self.calls += 1
+        time.sleep(self.delay)
+        return "HTTPError('429 Client Error: Too Many Requests')"
+
+    async def afetch(self, query):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return "HTTPError('429 Client Error: Too Many Requests')"
+
+
+def test_error_string_is_not_cached(tmp_path):
+    cache = SearchCache(str(tmp_path / "search.sqlite3"))
+    search = ErrorStringSearch()
+    for _ in range(2):
+        with pytest.raises(UpstreamSearchError):
+            cache.get_or_fetch("vegan protein sources", search.fetch)
+    assert search.calls == 2
+    assert cache.stats()["upstream_errors"] == 2
+    assert cache.get_or_fetch("vegan protein sources", lambda query: [{"content": "tofu"}]) == [{"content": "tofu"}]
+
+
+def test_async_error_string_is_not_cached(tmp_path):
+    cache = SearchCache(str(tmp_path / "search.sqlite3"))
+    search = ErrorStringSearch()
+
+    async def search_twice():
+        for _ in range(2):
+            with pytest.raises(UpstreamSearchError):
+                await cache.aget_or_fetch("keto snacks", search.afetch)
+
+    asyncio.run(search_twice())
+    assert search.calls == 2
+
+
+def test_coalesced_waiters_get_the_error(tmp_path):
+    cache = SearchCache(str(tmp_path / "search.sqlite3"))
+    search = ErrorStringSearch(delay=0.3)
+    outcomes = []
+
+    def lookup():
+        try:
+            outcomes.append(cache.get_or_fetch("iron rich foods", search.fetch))
+        except UpstreamSearchError as e:
+            outcomes.append(e)
+
+    threads = [threading.Thread(target=lookup) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert search.calls == 1
+    assert cache.stats()["coalesced"] == 3
+    assert len(outcomes) == 4 and all(isinstance(outcome, UpstreamSearchError) for outcome in outcomes)
+
+
+def test_no_second_fetch_when_the_leader_finishes_during_a_lookup(tmp_path):
+    cache = SearchCache(str(tmp_path / "search.sqlite3"))
+    fetching = threading.Event()
+    calls = []
+
+    def fetch(query):
+        calls.append(query)
+        fetching.set()
+        time.sleep(0.1)
+        return [{"content": "lentils"}]
+
+    leader = threading.Thread(target=cache.get_or_fetch, args=("iron rich foods", fetch))
+    leader.start()
+    fetching.wait()
+    # A lookup that misses the store just before the leader stores its result and leaves the in-flight map.
+    lookup = cache._lookup
+
+    def slow_lookup(key):
+        found = lookup(key)
+        time.sleep(0.2)
+        return found
+
+    cache._lookup = slow_lookup
+    assert cache.get_or_fetch("iron rich foods", fetch) == [{"content": "lentils"}]
+    leader.join()
+    assert len(calls) == 1
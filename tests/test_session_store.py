@@ -0,0 +1,32 @@
+# E:\Diet Chatbot\tests\test_session_store.py
+import threading
+
+import session_store
+from session_store import SessionStore
+
+
+def test_close_commits_after_an_in_flight_flush(tmp_path, monkeypatch):
+    serialize = session_store._serialize_state
+    flusher_started, release_flusher = threading.Event(), threading.Event()
+
+    def slow_in_flusher(state):
+        if threading.current_thread().name == "session-store-flusher":
+            flusher_started.set()
+            release_flusher.wait(5)
+        return serialize(state)
+
+    monkeypatch.setattr(session_store, "_serialize_state", slow_in_flusher)
+    store = SessionStore(str(tmp_path / "sessions.sqlite3"), flush_interval=0.01)
+    store.save("c1", {"messages": [], "dietary_preference": "vegan"})
+    assert flusher_started.wait(5) # The flusher now holds the "vegan" snapshot
+    store.save("c1", {"messages": [], "dietary_preference": "vegetarian"})
+
+    closer = threading.Thread(target=store.close)
+    closer.start()
+    closer.join(0.2) # close() must wait for the flusher instead of writing first
+    release_flusher.set()
+    closer.join(5)
+
+    reopened = SessionStore(str(tmp_path / "sessions.sqlite3"))
+    assert reopened.load("c1")["dietary_preference"] == "vegetarian"
+    reopened.close()
@@ -0,0 +1,23 @@
+# E:\Diet Chatbot\tests\test_streaming.py
+from agents.history import HistoryManager, make_llm_summarizer
+
+
+def _turn(server, user_input, conversation_id):
+    events = list(server.stream_chat_events(user_input, conversation_id))
+    tokens = "".join(payload["text"] for event, payload in events if event == "token")
+    done = [payload for event, payload in events if event == "done"]
+    return tokens, done
+
+
+def test_history_summary_is_not_streamed_as_answer(offline_main, override_component):
+    import server
+
+    # One verbatim turn, so from the third turn on the older ones are summarized inside the specialist node.
+    history = override_component("history_manager", HistoryManager(
+        summarizer=make_llm_summarizer(offline_main._shared_llm()), max_turns=1
+    ))
+    for user_input in ["vegan breakfast ideas", "vegan lunch with lentils", "vegan dinner for weight loss"]:
+        tokens, done = _turn(server, user_input, "summary-stream")
+        assert len(done) == 1
+        assert tokens.strip() == done[0]["response"].strip()
+    assert history.summarizer_calls >= 1
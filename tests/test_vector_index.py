@@ -0,0 +1,99 @@
+# E:\Diet Chatbot\tests\test_vector_index.py
+import os
+
+import numpy as np
+
+from rag.vector_index import MmapVectorIndex
+
+DIETS = ["vegan", "vegetarian"]
+BOOKS = ["a.pdf", "b.pdf", "c.pdf"]
+
+
+class StoredCollection:
+    """What rebuild_from() reads from a Chroma collection: count() and paged get()."""
+
+    def __init__(self, vectors, prefix: str = "chunk"):
+        self.ids = [f"{prefix}-{i}" for i in range(len(vectors))]
+        self.vectors = vectors
+        self.metadatas = [{"dietary_type": DIETS[i % 2], "source_file": BOOKS[i % 3], "doc_type": "recipe_book_pdf",
+                           "page": i} for i in range(len(vectors))]
+        self.documents = [f"Recipe text {prefix} {i}" for i in range(len(vectors))]
+
+    def count(self):
+        return len(self.ids)
+
+    def get(self, include, limit, offset):
+        rows = slice(offset, offset + limit)
+        return {"ids": self.ids[rows], "embeddings": self.vectors[rows].tolist(),
+                "metadatas": self.metadatas[rows], "documents": self.documents[rows]}
+
+
+def _vectors(rows: int = 1200, dimension: int = 16, seed: int = 7):
+    return np.random.default_rng(seed).standard_normal((rows, dimension)).astype(np.float32)
+
+
+def _index(tmp_path, collection, dtype="float32"):
+    index = MmapVectorIndex(str(tmp_path / "mmap_index"), "vegan", dtype=dtype)
+    index.rebuild_from(collection) # 1200 rows span several export pages
+    return index
+
+
+def test_search_matches_brute_force(tmp_path):
+    vectors = _vectors()
+    collection = StoredCollection(vectors)
+    index = _index(tmp_path, collection)
+    query = np.random.default_rng(1).standard_normal(vectors.shape[1]).astype(np.float32)
+
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    expected = np.argsort(distances, kind="stable")[:10]
+    results = index.search(query, 10)
+    assert [chunk_id for chunk_id, _ in results] == [collection.ids[i] for i in expected]
+    np.testing.assert_allclose([distance for _, distance in results], distances[expected], rtol=1e-4)
+
+    allowed = np.array([metadata["source_file"] == "b.pdf" for metadata in collection.metadatas])
+    expected = np.argsort(np.where(allowed, distances, np.inf), kind="stable")[:10]
+    results = index.search(query, 10, {"source_file": {"$eq": "b.pdf"}})
+    assert [chunk_id for chunk_id, _ in results] == [collection.ids[i] for i in expected]
+
+
+def test_search_documents_reads_text_and_metadata(tmp_path):
+    vectors = _vectors()
+    collection = StoredCollection(vectors)
+    index = _index(tmp_path, collection)
+    (doc, distance), = index.search_documents(vectors[42], 1)
+    assert doc.id == collection.ids[42] and distance < 1e-4
+    assert doc.page_content == collection.documents[42]
+    assert doc.metadata == collection.metadatas[42]
+
+
+def test_rebuild_switches_generation(tmp_path):
+    first = _index(tmp_path, StoredCollection(_vectors(seed=1), prefix="old"))
+    reader = MmapVectorIndex(first.directory, "vegan", dtype="float32")
+    query = _vectors(rows=1, seed=3)[0]
+
+    writer = MmapVectorIndex(first.directory, "vegan", dtype="float32")
+    writer.rebuild_from(StoredCollection(_vectors(rows=50, seed=2), prefix="new"))
+    # An open reader keeps answering from its generation until it reloads.
+    assert all(chunk_id.startswith("old-") for chunk_id, _ in reader.search(query, 5))
+    reader.load()
+    assert len(reader) == 50
+    assert all(chunk_id.startswith("new-") for chunk_id, _ in reader.search(query, 5))
+    # Only the new generation's files are left behind.
+    generations = {filename.split(".")[0] for filename in os.listdir(first.directory)
+                   if filename.endswith((".npy", ".jsonl"))}
+    assert len(generations) == 1
+
+
+def test_filter_masks_are_cached(tmp_path, monkeypatch):
+    index = _index(tmp_path, StoredCollection(_vectors()))
+    query = _vectors(rows=1, seed=3)[0]
+    first = index.search(query, 5, {"dietary_type": "vegan", "source_file": {"$in": ["a.pdf", "c.pdf"]}})
+    snapshot = index._snapshot
+
+    def evaluate_again(where):
+        raise AssertionError("the mask was evaluated again")
+
+    # The same filter with its keys in another order reuses the mask.
+    monkeypatch.setattr(snapshot, "_evaluate", evaluate_again)
+    assert index.search(query, 5, {"source_file": {"$in": ["a.pdf", "c.pdf"]}, "dietary_type": "vegan"}) == first
+    assert len(snapshot._masks) == 1